@@ -0,0 +1,132 @@
+"""
+Benchmark do caminho de requisição: vazão e latência de cauda de um /ask com busca + LLM,
+antes (handler async chamando a busca e um cliente LLM síncronos direto no event loop) e
+depois (busca no pool limitado de CPU e cliente LLM assíncrono), com 1, 8, 32 e 128 clientes.
+
+A API roda em processo: FastAPI servida pelo httpx.ASGITransport num event loop próprio, numa
+thread (o "servidor"); os clientes medem a latência do seu próprio loop, então a fila causada
+por um servidor travado entra na conta. A busca usa um índice FAISS sintético; o LLM é simulado
+por uma espera de --llm-ms (time.sleep no cliente síncrono, asyncio.sleep no assíncrono). Uma
+sonda chama /health a cada 50ms durante a carga: a sua latência mostra quanto o event loop
+fica travado para os outros usuários.
+
+Uso:
+    python benchmarks/bench_async_path.py --docs 100000 --llm-ms 300 --clients 1 8 32 128
+    python benchmarks/bench_async_path.py --cpu-workers 2 --seconds 10
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import httpx
+import numpy as np
+from fastapi import FastAPI
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+from agents.agent_manager import DEFAULT_CPU_WORKERS
+from database.sharded_store import build_shard
+from database.vector_store import FaissVectorStore
+
+def build_app(store, queries, args, non_blocking: bool, executor) -> FastAPI:
+    app = FastAPI()
+    llm_seconds = args.llm_ms / 1000
+
+    @app.post("/ask")
+    async def ask(payload: dict):
+        query = queries[payload["i"] % len(queries)]
+        if non_blocking:
+            results = await asyncio.get_running_loop().run_in_executor(executor, store.search, query, args.k, 0.0)
+            await asyncio.sleep(llm_seconds)
+        else:
+            results = store.search(query, args.k, threshold=0.0)
+            time.sleep(llm_seconds)
+        return {"sources": [doc["url"] for doc in results]}
+
+    @app.get("/health")
+    async def health():
+        return {"status": "healthy"}
+
+    return app
+
+async def run_load(app: FastAPI, clients: int, seconds: float):
+    """Clientes em laço por `seconds` + sonda do /health; retorna (QPS, p50, p99, p99 da sonda)."""
+    server_loop = asyncio.new_event_loop()
+    server = threading.Thread(target=server_loop.run_forever, daemon=True)
+    server.start()
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://lumia", timeout=None)
+
+    async def request(method: str, url: str, **kwargs):
+        # Executa no loop do servidor; este loop (dos clientes) só espera o resultado
+        call = asyncio.run_coroutine_threadsafe(client.request(method, url, **kwargs), server_loop)
+        response = await asyncio.wrap_future(call)
+        response.raise_for_status()
+
+    latencies, probe = [], []
+    deadline = time.perf_counter() + seconds
+
+    async def worker(c: int):
+        i = c
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            await request("POST", "/ask", json={"i": i})
+            latencies.append((time.perf_counter() - start) * 1000)
+            i += clients
+
+    async def prober():
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            await request("GET", "/health")
+            probe.append((time.perf_counter() - start) * 1000)
+            await asyncio.sleep(0.05)
+
+    start = time.perf_counter()
+    await asyncio.gather(prober(), *(worker(c) for c in range(clients)))
+    elapsed = time.perf_counter() - start
+    asyncio.run_coroutine_threadsafe(client.aclose(), server_loop).result()
+    server_loop.call_soon_threadsafe(server_loop.stop)
+    server.join()
+    server_loop.close()
+    return (len(latencies) / elapsed, np.percentile(latencies, 50), np.percentile(latencies, 99),
+            np.percentile(probe, 99) if probe else float("nan"))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=100_000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--index-type", default="flat")
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 8, 32, 128])
+    parser.add_argument("--llm-ms", type=float, default=300.0, help="Latência simulada da chamada ao LLM")
+    parser.add_argument("--cpu-workers", type=int, default=DEFAULT_CPU_WORKERS)
+    parser.add_argument("--seconds", type=float, default=5.0, help="Duração de cada medição")
+    parser.add_argument("--k", type=int, default=8)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    embeddings = rng.standard_normal((args.docs, args.dim)).astype(np.float32)
+    documents = [{"url": f"https://www.ufpb.br/doc/{i}", "content": f"documento {i}"} for i in range(args.docs)]
+    queries = list(rng.standard_normal((256, args.dim)).astype(np.float32))
+    print(f"{args.docs} documentos, {args.index_type}, LLM {args.llm_ms:.0f}ms, "
+          f"{args.cpu_workers} threads de CPU, {os.cpu_count()} núcleos")
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        build_shard(data_dir, documents, embeddings, args.index_type, "ip")
+        store = FaissVectorStore(data_dir)
+        store.search(queries[0], args.k, threshold=0.0)
+        executor = ThreadPoolExecutor(max_workers=args.cpu_workers)
+        apps = {
+            "bloqueante": build_app(store, queries, args, non_blocking=False, executor=None),
+            "não bloqueante": build_app(store, queries, args, non_blocking=True, executor=executor),
+        }
+        print(f"{'clientes':>8} | {'modo':<14} | {'QPS':>8} | {'p50':>10} | {'p99':>10} | {'/health p99':>11}")
+        for clients in args.clients:
+            for mode, app in apps.items():
+                qps, p50, p99, probe_p99 = asyncio.run(run_load(app, clients, args.seconds))
+                print(f"{clients:>8} | {mode:<14} | {qps:>8.1f} | {p50:>8.1f}ms | {p99:>8.1f}ms | {probe_p99:>9.1f}ms")
+        executor.shutdown()
+
+if __name__ == "__main__":
+    main()
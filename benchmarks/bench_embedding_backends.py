@@ -0,0 +1,102 @@
+"""
+Paridade e desempenho dos backends de embeddings (torch, onnx, onnx-fp32).
+
+Paridade: cosseno entre os embeddings de cada backend e os do SentenceTransformer (PyTorch)
+para as mesmas frases, mais a concordância do top-k de uma busca sobre essas frases. Sai
+com código 1 se algum backend ficar abaixo de --min-cosine (use como checagem após o export).
+
+Desempenho: tempo de carga, latência de uma consulta (p50/p99) e vazão de encode em lote.
+
+Uso:
+    python benchmarks/bench_embedding_backends.py --backends torch onnx onnx-fp32
+    python benchmarks/bench_embedding_backends.py --texts data/perguntas.txt --min-cosine 0.99
+"""
+import argparse
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+from agents.embedding_backends import EMBEDDING_BACKENDS, load_embedding_backend
+from database.content_store import open_documents
+from database.segment_store import normalize_rows
+
+QUESTIONS = [
+    "Qual o horário de funcionamento do RU?",
+    "Quando começa a matrícula do próximo semestre?",
+    "Onde encontro o calendário acadêmico da UFPB?",
+    "Como solicitar o trancamento de uma disciplina?",
+    "Quais os documentos para o auxílio moradia?",
+    "O edital de monitoria já saiu?",
+    "Como emitir o histórico escolar no SIGAA?",
+    "Qual o prazo para colação de grau?",
+]
+
+def load_texts(args):
+    if args.texts:
+        with open(args.texts, "r", encoding="utf-8") as f:
+            return [line.strip() for line in f if line.strip()]
+    texts = list(QUESTIONS)
+    documents = open_documents(args.data_dir)
+    if documents:
+        # Passagens reais do acervo: textos longos, perto do limite de tokens
+        step = max(1, len(documents) // args.passages)
+        texts += [documents[i]["content"] for i in range(0, len(documents), step)][:args.passages]
+    return texts
+
+def topk_agreement(reference: np.ndarray, candidate: np.ndarray, k: int) -> float:
+    """Fração dos k vizinhos (entre as próprias frases) que coincidem com os da referência."""
+    ref, cand = normalize_rows(reference), normalize_rows(candidate)
+    ref_top = np.argsort(-(ref @ ref.T), axis=1)[:, 1:k + 1]
+    cand_top = np.argsort(-(cand @ cand.T), axis=1)[:, 1:k + 1]
+    return float(np.mean([len(set(a) & set(b)) / k for a, b in zip(ref_top, cand_top)]))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default="paraphrase-multilingual-MiniLM-L12-v2")
+    parser.add_argument("--backends", nargs="+", choices=EMBEDDING_BACKENDS, default=list(EMBEDDING_BACKENDS))
+    parser.add_argument("--onnx-dir")
+    parser.add_argument("--threads", type=int, help="Threads do onnxruntime (padrão: todos os núcleos)")
+    parser.add_argument("--data-dir", default="data")
+    parser.add_argument("--texts", help="Arquivo com um texto por linha (padrão: perguntas + passagens do acervo)")
+    parser.add_argument("--passages", type=int, default=120)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--repeats", type=int, default=50)
+    parser.add_argument("--min-cosine", type=float, default=0.98)
+    parser.add_argument("--k", type=int, default=5)
+    args = parser.parse_args()
+
+    texts = load_texts(args)
+    print(f"{len(texts)} textos, {os.cpu_count()} núcleos")
+    reference = None
+    failed = False
+    print(f"{'backend':<10} | {'carga':>7} | {'1 consulta p50':>14} | {'p99':>8} | {'lote textos/s':>13} | "
+          f"{'cos médio':>9} | {'cos mín':>8} | {f'top{args.k}':>6}")
+    for backend in ["torch"] + [name for name in args.backends if name != "torch"]:
+        start = time.perf_counter()
+        model = load_embedding_backend(args.model, backend, onnx_dir=args.onnx_dir, threads=args.threads)
+        load_seconds = time.perf_counter() - start
+        model.encode(QUESTIONS[0], convert_to_numpy=True)
+        latencies = []
+        for i in range(args.repeats):
+            start = time.perf_counter()
+            model.encode(QUESTIONS[i % len(QUESTIONS)], convert_to_numpy=True)
+            latencies.append((time.perf_counter() - start) * 1000)
+        start = time.perf_counter()
+        embeddings = model.encode(texts, convert_to_numpy=True, batch_size=args.batch_size)
+        throughput = len(texts) / (time.perf_counter() - start)
+        if reference is None:
+            reference = embeddings
+        cosines = np.sum(normalize_rows(reference) * normalize_rows(embeddings), axis=1)
+        agreement = topk_agreement(reference, embeddings, min(args.k, len(texts) - 1))
+        failed |= backend in args.backends and float(cosines.min()) < args.min_cosine
+        print(f"{backend:<10} | {load_seconds:>6.1f}s | {np.percentile(latencies, 50):>12.2f}ms | "
+              f"{np.percentile(latencies, 99):>6.2f}ms | {throughput:>13.1f} | {cosines.mean():>9.4f} | "
+              f"{cosines.min():>8.4f} | {agreement:>6.3f}")
+    if failed:
+        print(f"⚠️ Algum backend ficou abaixo do cosseno mínimo {args.min_cosine} em relação ao PyTorch.")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Benchmark do roteador de intenção local (agents/intent_router.py) contra o roteamento pelo LLM
+(reflector_agent.decidir_fluxo_llm).
+
+Acurácia: leave-one-out sobre os exemplos rotulados (cada exemplo classificado pelos centroides
+calculados sem ele), no total, por intenção e, para cada --thresholds, a cobertura (fração
+decidida localmente) e a acurácia dentro dela; o resto iria para o LLM.
+
+Latência: encode de uma pergunta + centroide mais próximo, contra uma chamada de roteamento ao
+LLM. Com --llm-samples N, N exemplos passam pelo LLM configurado (LUMIA_LLM_*/GROQ_API_KEY) e a
+acurácia e a latência dele também são medidas; sem isso, a economia usa --llm-ms como estimativa.
+
+Uso:
+    python benchmarks/bench_intent_router.py
+    python benchmarks/bench_intent_router.py --backend onnx --onnx-dir models/onnx --thresholds 0.5 0.6 0.7
+    python benchmarks/bench_intent_router.py --llm-samples 40
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+from agents.embedding_backends import EMBEDDING_BACKENDS, load_embedding_backend
+from agents.intent_router import (DEFAULT_MIN_CONFIDENCE, DEFAULT_TEMPERATURE, EXAMPLES_PATH, INTENTS, IntentRouter,
+                                  cross_validate, load_examples)
+
+async def llm_routing(examples, samples: int):
+    from api.llm_client import close_llm_client
+    from api.reflector_agent import decidir_fluxo_llm
+    rng = np.random.default_rng(0)
+    chosen = rng.choice(len(examples), size=min(samples, len(examples)), replace=False)
+    correct, latencies = 0, []
+    try:
+        for i in chosen:
+            text, label = examples[i]
+            start = time.perf_counter()
+            correct += await decidir_fluxo_llm(text) == label
+            latencies.append((time.perf_counter() - start) * 1000)
+    finally:
+        await close_llm_client()
+    return correct / len(chosen), latencies
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default="paraphrase-multilingual-MiniLM-L12-v2")
+    parser.add_argument("--backend", choices=EMBEDDING_BACKENDS, default="torch")
+    parser.add_argument("--onnx-dir")
+    parser.add_argument("--examples", default=EXAMPLES_PATH)
+    parser.add_argument("--temperature", type=float, default=DEFAULT_TEMPERATURE)
+    parser.add_argument("--thresholds", type=float, nargs="+", default=[0.4, 0.5, DEFAULT_MIN_CONFIDENCE, 0.7, 0.8])
+    parser.add_argument("--llm-samples", type=int, default=0, help="Exemplos roteados também pelo LLM real")
+    parser.add_argument("--llm-ms", type=float, default=400.0, help="Latência estimada do LLM sem --llm-samples")
+    args = parser.parse_args()
+
+    examples = load_examples(args.examples)
+    labels = np.array([intent for _, intent in examples])
+    model = load_embedding_backend(args.model, args.backend, onnx_dir=args.onnx_dir)
+
+    def encode(texts):
+        return model.encode(texts, convert_to_numpy=True)
+
+    start = time.perf_counter()
+    embeddings = encode([text for text, _ in examples])
+    print(f"{len(examples)} exemplos codificados em {time.perf_counter() - start:.2f}s ({args.model}, {args.backend})")
+
+    predicted, confidences = cross_validate(examples, embeddings, temperature=args.temperature)
+    predicted = np.array(predicted)
+    hits = predicted == labels
+    print(f"\nAcurácia leave-one-out (sem fallback): {hits.mean():.1%}")
+    intents = [intent for intent in INTENTS if intent in labels]
+    print(f"{'real/previsto':<16}" + "".join(f"{intent:>8}" for intent in intents) + f"{'acerto':>9}")
+    for intent in intents:
+        rows = labels == intent
+        counts = [int((predicted[rows] == other).sum()) for other in intents]
+        print(f"{intent:<16}" + "".join(f"{count:>8}" for count in counts) + f"{hits[rows].mean():>9.1%}")
+
+    print(f"\n{'threshold':>9} | {'cobertura local':>15} | {'acurácia local':>14} | {'vão ao LLM':>10}")
+    for threshold in args.thresholds:
+        covered = confidences >= threshold
+        accuracy = hits[covered].mean() if covered.any() else float("nan")
+        print(f"{threshold:>9.2f} | {covered.mean():>15.1%} | {accuracy:>14.1%} | {(~covered).mean():>10.1%}")
+
+    router = IntentRouter(examples, temperature=args.temperature).fit(encode)
+    local = []
+    for text, _ in examples:
+        start = time.perf_counter()
+        router.route(text, encode)
+        local.append((time.perf_counter() - start) * 1000)
+    local_ms = float(np.percentile(local, 50))
+    print(f"\nRoteador local: p50 {local_ms:.1f}ms, p99 {np.percentile(local, 99):.1f}ms por pergunta "
+          f"(encode + centroides; na API o encode é reaproveitado pela busca)")
+
+    if args.llm_samples > 0:
+        llm_accuracy, llm_latencies = asyncio.run(llm_routing(examples, args.llm_samples))
+        llm_ms = float(np.percentile(llm_latencies, 50))
+        print(f"Roteamento pelo LLM: acurácia {llm_accuracy:.1%}, p50 {llm_ms:.0f}ms, "
+              f"p99 {np.percentile(llm_latencies, 99):.0f}ms ({len(llm_latencies)} perguntas)")
+    else:
+        llm_ms = args.llm_ms
+        print(f"Roteamento pelo LLM: {llm_ms:.0f}ms estimados (--llm-samples N para medir)")
+
+    coverage = (confidences >= DEFAULT_MIN_CONFIDENCE).mean()
+    # Toda pergunta paga o roteador local; as cobertas deixam de pagar o LLM
+    print(f"Latência poupada por requisição com threshold {DEFAULT_MIN_CONFIDENCE:.2f}: "
+          f"{coverage * llm_ms - local_ms:.0f}ms ({coverage:.0%} decididas localmente)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Benchmark do cliente LLM: um cliente novo por chamada (o padrão antigo, que abre conexão e
+negocia TLS a cada requisição) contra o LLMClient compartilhado (pool com keep-alive), com
+--concurrency chamadas simultâneas. Reporta p50/p99, vazão, retentativas e falhas.
+
+Sem --base-url, o stub (benchmarks/llm_stub_server.py) roda no próprio processo pelo
+httpx.ASGITransport: não há rede, então a diferença medida é só o custo de criar o cliente.
+Com --base-url apontando para o stub via HTTP, ou para um provedor real com HTTPS, entram
+também as conexões e os handshakes.
+
+Uso:
+    python benchmarks/bench_llm_client.py --calls 200 --concurrency 16 --error-rate 0.05
+    python benchmarks/bench_llm_client.py --base-url http://127.0.0.1:8001 --provider openai
+    python benchmarks/bench_llm_client.py --base-url https://api.groq.com --provider groq --calls 50
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+import httpx
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from api.llm_client import LLMClient
+from llm_stub_server import create_app
+
+MESSAGES = [{"role": "user", "content": "Qual o horário de funcionamento do RU?"}]
+
+async def run(args, shared: bool):
+    stub = None if args.base_url else create_app(args.latency_ms, args.jitter_ms, args.error_rate)
+    base_url = args.base_url or "http://stub"
+    api_key = os.getenv("GROQ_API_KEY") if args.provider == "groq" else None
+
+    def new_client() -> LLMClient:
+        http_client = httpx.AsyncClient(transport=httpx.ASGITransport(app=stub)) if stub else None
+        return LLMClient(args.provider, api_key=api_key, base_url=base_url, timeout=args.timeout,
+                         budget=args.budget, retries=args.retries, http_client=http_client)
+
+    client = new_client() if shared else None
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies, failures, retries = [], 0, 0
+
+    async def call():
+        nonlocal failures, retries
+        async with semaphore:
+            own = client or new_client()
+            start = time.perf_counter()
+            try:
+                await own.chat(MESSAGES, max_tokens=20)
+                latencies.append((time.perf_counter() - start) * 1000)
+            except Exception:
+                failures += 1
+            finally:
+                if own is not client:
+                    retries += own.retried
+                    await own.aclose()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(call() for _ in range(args.calls)))
+    elapsed = time.perf_counter() - start
+    if client is not None:
+        retries = client.retried
+        await client.aclose()
+    return latencies, elapsed, retries, failures
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", help="Servidor LLM real ou o stub via HTTP (padrão: stub em processo)")
+    parser.add_argument("--provider", choices=["groq", "openai"], default="openai")
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--latency-ms", type=float, default=100.0, help="Latência do stub em processo")
+    parser.add_argument("--jitter-ms", type=float, default=20.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fração de 503 do stub em processo")
+    parser.add_argument("--timeout", type=float, default=10.0)
+    parser.add_argument("--budget", type=float, default=20.0)
+    parser.add_argument("--retries", type=int, default=2)
+    args = parser.parse_args()
+
+    print(f"{args.calls} chamadas, {args.concurrency} simultâneas, "
+          f"{args.base_url or f'stub em processo ({args.latency_ms:.0f}ms, {args.error_rate:.0%} de 503)'}")
+    print(f"{'cliente':<13} | {'p50':>9} | {'p99':>9} | {'chamadas/s':>10} | {'retentativas':>12} | {'falhas':>6}")
+    for name, shared in (("por chamada", False), ("compartilhado", True)):
+        latencies, elapsed, retries, failures = asyncio.run(run(args, shared))
+        p50, p99 = (np.percentile(latencies, 50), np.percentile(latencies, 99)) if latencies else (float("nan"),) * 2
+        print(f"{name:<13} | {p50:>7.1f}ms | {p99:>7.1f}ms | {len(latencies) / elapsed:>10.1f} | "
+              f"{retries:>12} | {failures:>6}")
+
+if __name__ == "__main__":
+    main()
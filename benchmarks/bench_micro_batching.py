@@ -0,0 +1,110 @@
+"""
+Benchmark do micro-batching: vazão e latência com 1, 8, 32 e 128 clientes concorrentes,
+cada cliente chamando a busca direto (uma consulta por chamada) ou pelo MicroBatcher
+(consultas concorrentes divididas em lotes de até --max-batch, esperando até --max-wait-ms).
+
+A fase de busca usa um índice FAISS sintético. Com sentence-transformers instalado, uma
+segunda fase mede encode + busca com o modelo real (--model), como no Agent.
+
+Uso:
+    python benchmarks/bench_micro_batching.py --docs 100000 --clients 1 8 32 128
+    python benchmarks/bench_micro_batching.py --max-batch 64 --max-wait-ms 5 --seconds 5
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+from agents.batcher import MicroBatcher
+from database.sharded_store import build_shard
+from database.vector_store import FaissVectorStore
+
+QUESTIONS = [
+    "Qual o horário do RU?", "Quando começa a matrícula?", "Onde vejo o calendário acadêmico?",
+    "Como pedir trancamento de disciplina?", "Qual o edital de monitoria?", "Como emitir o histórico?",
+]
+
+def run_clients(call, payloads, clients, seconds):
+    """Cada cliente chama call(payload) em laço por `seconds`; retorna (QPS, p50 ms, p99 ms)."""
+    latencies = [[] for _ in range(clients)]
+    deadline = time.perf_counter() + seconds
+    def client(c):
+        i = c
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            call(payloads[i % len(payloads)])
+            latencies[c].append((time.perf_counter() - start) * 1000)
+            i += clients
+    start = time.perf_counter()
+    threads = [threading.Thread(target=client, args=(c,)) for c in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    merged = np.concatenate([np.asarray(values) for values in latencies])
+    return len(merged) / elapsed, np.percentile(merged, 50), np.percentile(merged, 99)
+
+def compare(name, direct, batched_handler, payloads, args):
+    print(f"\n{name}")
+    print(f"{'clientes':>8} | {'direto QPS':>10} | {'p50':>9} | {'lote QPS':>10} | {'p50':>9} | {'p99':>9} | {'lote médio':>10}")
+    for clients in args.clients:
+        qps, p50, _ = run_clients(direct, payloads, clients, args.seconds)
+        batcher = MicroBatcher(batched_handler, max_batch=args.max_batch, max_wait=args.max_wait_ms / 1000)
+        b_qps, b_p50, b_p99 = run_clients(batcher, payloads, clients, args.seconds)
+        batcher.close()
+        print(f"{clients:>8} | {qps:>10.1f} | {p50:>7.2f}ms | {b_qps:>10.1f} | {b_p50:>7.2f}ms | {b_p99:>7.2f}ms | "
+              f"{batcher.stats()['mean_batch']:>10}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=100_000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--index-type", default="flat")
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 8, 32, 128])
+    parser.add_argument("--max-batch", type=int, default=32)
+    parser.add_argument("--max-wait-ms", type=float, default=2.0)
+    parser.add_argument("--seconds", type=float, default=3.0, help="Duração de cada medição")
+    parser.add_argument("--k", type=int, default=8)
+    parser.add_argument("--model", default="paraphrase-multilingual-MiniLM-L12-v2")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    embeddings = rng.standard_normal((args.docs, args.dim)).astype(np.float32)
+    documents = [{"url": f"https://www.ufpb.br/doc/{i}", "content": f"documento {i}"} for i in range(args.docs)]
+    queries = list(rng.standard_normal((256, args.dim)).astype(np.float32))
+    print(f"{args.docs} documentos, {args.index_type}, {os.cpu_count()} núcleos, "
+          f"lote até {args.max_batch} / {args.max_wait_ms}ms")
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        build_shard(data_dir, documents, embeddings, args.index_type, "ip")
+        store = FaissVectorStore(data_dir)
+        store.search(queries[0], args.k, threshold=0.0)
+        compare(
+            "Busca (embeddings prontos)",
+            lambda query: store.search(query, args.k, threshold=0.0),
+            lambda batch: store.search_batch(np.stack(batch), args.k, threshold=0.0),
+            queries, args,
+        )
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError:
+            print("\nsentence-transformers não instalado: fase encode + busca ignorada.")
+            return
+        model = SentenceTransformer(args.model)
+        if model.get_sentence_embedding_dimension() != args.dim:
+            print(f"\nO modelo gera {model.get_sentence_embedding_dimension()} dimensões; use --dim igual.")
+            return
+        compare(
+            f"Encode + busca ({args.model})",
+            lambda text: store.search(model.encode(text, convert_to_numpy=True), args.k, threshold=0.0),
+            lambda batch: store.search_batch(model.encode(batch, convert_to_numpy=True), args.k, threshold=0.0),
+            QUESTIONS, args,
+        )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Benchmark da quantização de embeddings no CosineSearchEngine (IndexAgent):
+float32 vs int8 vs binário, com e sem reordenação (rescore) em float32.
+
+Reporta memória dos códigos, latência p50, speedup e recall@k contra a busca exata.
+Usa os embeddings do corpus (--data-dir) ou um corpus sintético.
+
+Uso:
+    python benchmarks/bench_quantization.py --data-dir data
+    python benchmarks/bench_quantization.py --docs 100000
+"""
+import argparse
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+from database.search_engine import CosineSearchEngine
+from database.segment_store import load_embeddings
+
+def store_bytes(store) -> int:
+    return sum(segment.rows.nbytes for segment in store.segments)
+
+def codes_bytes(codes) -> int:
+    if codes is None:
+        return 0
+    total = store_bytes(codes.codes)
+    if hasattr(codes, "scales"):
+        total += store_bytes(codes.scales)
+    return total
+
+def run(engine, queries, k):
+    latencies, results = [], []
+    for query in queries:
+        start = time.perf_counter()
+        indices, _ = engine.search(query, k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        results.append(set(indices.tolist()))
+    return float(np.percentile(latencies, 50)), results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data-dir", default=None)
+    parser.add_argument("--docs", type=int, default=100_000, help="Tamanho do corpus sintético")
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=8)
+    parser.add_argument("--rescore-factor", type=int, default=4)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    if args.data_dir:
+        embeddings = np.asarray(load_embeddings(args.data_dir), dtype=np.float32)
+        print(f"Corpus: {embeddings.shape[0]} embeddings de {args.data_dir}")
+    else:
+        embeddings = rng.standard_normal((args.docs, args.dim)).astype(np.float32)
+        print(f"Corpus sintético: {embeddings.shape[0]} vetores de dimensão {args.dim}")
+    # Consultas: vetores do corpus com ruído, como perguntas parecidas com documentos existentes
+    sample = rng.choice(embeddings.shape[0], size=min(args.queries, embeddings.shape[0]), replace=False)
+    queries = embeddings[sample] + rng.normal(0, 0.02, size=(len(sample), embeddings.shape[1])).astype(np.float32)
+
+    baseline = CosineSearchEngine()
+    baseline.build(embeddings)
+    base_p50, expected = run(baseline, queries, args.k)
+    float_mb = store_bytes(baseline.store) / (1024 * 1024)
+    print(f"\n{'modo':<16} | {'memória':>10} | {'redução':>7} | {'p50':>8} | {'speedup':>7} | {'recall@' + str(args.k):>9}")
+    print(f"{'float32':<16} | {float_mb:>8.1f}MB | {'1.0x':>7} | {base_p50:>6.2f}ms | {'1.0x':>7} | {1.0:>9.3f}")
+    for quantization in ("int8", "binary"):
+        for rescore in (False, True):
+            engine = CosineSearchEngine(quantization=quantization, rescore=rescore, rescore_factor=args.rescore_factor)
+            engine.build(embeddings)
+            p50, got = run(engine, queries, args.k)
+            recall = np.mean([len(g & e) / args.k for g, e in zip(got, expected)])
+            mb = codes_bytes(engine.codes) / (1024 * 1024)
+            label = f"{quantization}{' + rescore' if rescore else ''}"
+            print(f"{label:<16} | {mb:>8.1f}MB | {float_mb / mb:>6.1f}x | {p50:>6.2f}ms | {base_p50 / p50:>6.1f}x | {recall:>9.3f}")
+    print("\nObs.: com rescore, os float32 só precisam estar em disco (mmap); só os candidatos são lidos.")
+
+if __name__ == "__main__":
+    main()
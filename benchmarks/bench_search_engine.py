@@ -0,0 +1,62 @@
+"""
+Benchmark de latência: busca antiga (sklearn cosine_similarity + argsort completo)
+contra o CosineSearchEngine (matriz pré-normalizada + argpartition).
+
+Uso:
+    python benchmarks/bench_search_engine.py --sizes 10000 100000 1000000
+"""
+import argparse
+import os
+import sys
+import time
+import numpy as np
+from sklearn.metrics.pairwise import cosine_similarity
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+from database.search_engine import CosineSearchEngine
+
+def legacy_search(query, embeddings, k, threshold):
+    """Reprodução do caminho antigo do SearchAgent.search."""
+    similarities = cosine_similarity(query.reshape(1, -1), embeddings)[0]
+    valid_indices = np.where(similarities >= threshold)[0]
+    valid_indices = valid_indices[np.argsort(similarities[valid_indices])[::-1]]
+    return valid_indices[:k]
+
+def time_queries(fn, queries):
+    latencies = []
+    for q in queries:
+        start = time.perf_counter()
+        fn(q)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return np.percentile(latencies, 50), np.percentile(latencies, 99)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--k", type=int, default=8)
+    parser.add_argument("--threshold", type=float, default=0.0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    queries = rng.standard_normal((args.queries, args.dim)).astype(np.float32)
+    print(f"{'N':>10} | {'legado p50':>11} | {'legado p99':>11} | {'engine p50':>11} | {'engine p99':>11} | {'speedup':>7}")
+    for n in args.sizes:
+        embeddings = rng.standard_normal((n, args.dim)).astype(np.float32)
+        engine = CosineSearchEngine()
+        engine.build(embeddings)
+
+        # Confere que os dois caminhos devolvem os mesmos top-k
+        expected = legacy_search(queries[0], embeddings, args.k, args.threshold)
+        got, _ = engine.search(queries[0], args.k, args.threshold)
+        if not np.array_equal(expected, got):
+            print(f"  ⚠️ Divergência de resultados em N={n} (empates numéricos?)")
+
+        legacy_p50, legacy_p99 = time_queries(lambda q: legacy_search(q, embeddings, args.k, args.threshold), queries)
+        engine_p50, engine_p99 = time_queries(lambda q: engine.search(q, args.k, args.threshold), queries)
+        print(f"{n:>10} | {legacy_p50:>9.2f}ms | {legacy_p99:>9.2f}ms | {engine_p50:>9.2f}ms | {engine_p99:>9.2f}ms | {legacy_p50 / engine_p50:>6.1f}x")
+        del embeddings, engine
+
+if __name__ == "__main__":
+    main()
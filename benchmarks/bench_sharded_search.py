@@ -0,0 +1,83 @@
+"""
+Benchmark do ShardedVectorStore: latência e vazão da busca scatter-gather conforme o
+número de threads do pool, contra um índice único com o mesmo corpus.
+
+Os shards são construídos num diretório temporário (partição por hash). O FAISS roda
+com 1 thread OpenMP por busca, então o paralelismo medido é só o do pool entre shards.
+Em máquinas com poucos núcleos a curva satura em os.cpu_count().
+
+Uso:
+    python benchmarks/bench_sharded_search.py --docs 200000 --shards 4 --workers 1 2 4
+    python benchmarks/bench_sharded_search.py --index-type hnsw --clients 4
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import faiss
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+from database.sharded_store import ShardedVectorStore, build_shard, shard_key, write_shards
+from database.vector_store import FaissVectorStore
+
+def measure(store, queries, k, clients):
+    """p50/p99 (ms) por consulta e QPS com `clients` consultas simultâneas."""
+    def one(query):
+        start = time.perf_counter()
+        store.search(query, k, threshold=0.0)
+        return (time.perf_counter() - start) * 1000
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        latencies = list(pool.map(one, queries))
+    return np.percentile(latencies, 50), np.percentile(latencies, 99), len(queries) / (time.perf_counter() - start)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=200_000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--shards", type=int, default=4)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--index-type", default="flat")
+    parser.add_argument("--clients", type=int, default=1, help="Consultas simultâneas")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=8)
+    args = parser.parse_args()
+
+    faiss.omp_set_num_threads(1)
+    rng = np.random.default_rng(0)
+    embeddings = rng.standard_normal((args.docs, args.dim)).astype(np.float32)
+    documents = [{"url": f"https://www.ufpb.br/doc/{i}", "content": f"documento {i}"} for i in range(args.docs)]
+    queries = rng.standard_normal((args.queries, args.dim)).astype(np.float32)
+    print(f"{args.docs} documentos, {args.shards} shards, {args.index_type}, {os.cpu_count()} núcleos")
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        start = time.perf_counter()
+        build_shard(os.path.join(data_dir, "single"), documents, embeddings, args.index_type, "ip")
+        groups = {}
+        for row, doc in enumerate(documents):
+            groups.setdefault(shard_key(doc, "hash", args.shards), []).append(row)
+        entries = []
+        for name, rows in sorted(groups.items()):
+            build_shard(os.path.join(data_dir, "shards", name), [documents[i] for i in rows], embeddings[rows],
+                        args.index_type, "ip")
+            entries.append({"name": name, "dir": os.path.join("shards", name), "hosts": []})
+        write_shards(data_dir, {"partition": "hash", "shards": entries})
+        print(f"Índices construídos em {time.perf_counter() - start:.1f}s")
+
+        print(f"{'configuração':<22} | {'p50':>10} | {'p99':>10} | {'QPS':>8}")
+        single = FaissVectorStore(os.path.join(data_dir, "single"))
+        single.search(queries[0], args.k, threshold=0.0)
+        p50, p99, qps = measure(single, queries, args.k, args.clients)
+        print(f"{'índice único':<22} | {p50:>8.3f}ms | {p99:>8.3f}ms | {qps:>8.1f}")
+        for workers in args.workers:
+            store = ShardedVectorStore(data_dir, workers=workers)
+            store.search(queries[0], args.k, threshold=0.0)
+            p50, p99, qps = measure(store, queries, args.k, args.clients)
+            print(f"{f'{args.shards} shards, {workers} threads':<22} | {p50:>8.3f}ms | {p99:>8.3f}ms | {qps:>8.1f}")
+            store.close()
+
+if __name__ == "__main__":
+    main()
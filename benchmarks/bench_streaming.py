@@ -0,0 +1,174 @@
+"""
+Benchmark do streaming de respostas: tempo até o usuário ver algo com /ask (espera a resposta
+inteira do LLM) contra /ask/stream (fontes assim que a busca termina e os trechos conforme o
+LLM gera). Reporta p50/p95 do tempo até as fontes, até o primeiro trecho (TTFT) e até o fim.
+
+Tudo roda em processo: o LLM é o stub (benchmarks/llm_stub_server.py) com --llm-latency-ms até
+o primeiro trecho e --token-ms entre trechos; a busca é simulada por --retrieval-ms. As rotas
+usam api/streaming.py e o LLMClient da aplicação. O httpx.ASGITransport junta o corpo inteiro
+antes de devolver a resposta, então o benchmark usa um transporte ASGI que entrega os pedaços
+conforme o app os envia; sem isso o TTFT medido seria igual ao tempo total.
+
+Uso:
+    python benchmarks/bench_streaming.py --requests 100 --concurrency 1 8 32
+    python benchmarks/bench_streaming.py --llm-latency-ms 500 --token-ms 30 --tokens 300
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+import httpx
+import numpy as np
+from fastapi import FastAPI
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import api.llm_client as llm_client
+from api.llm_client import LLMClient
+from api.streaming import sse_response, stream_answer, streaming_stats
+from llm_stub_server import create_app
+
+MESSAGES = [{"role": "user", "content": "Quais são as regras de acesso ao RU?"}]
+SOURCES = [f"https://www.ufpb.br/ru/doc/{i}" for i in range(4)]
+SCORES = [0.82, 0.77, 0.71, 0.64]
+
+class _BodyStream(httpx.AsyncByteStream):
+    def __init__(self, queue: asyncio.Queue, task: asyncio.Task):
+        self.queue = queue
+        self.task = task
+
+    async def __aiter__(self):
+        while (chunk := await self.queue.get()) is not None:
+            yield chunk
+
+    async def aclose(self):
+        self.task.cancel()
+
+class StreamingASGITransport(httpx.AsyncBaseTransport):
+    """Como o httpx.ASGITransport, mas o corpo da resposta sai pedaço a pedaço."""
+    def __init__(self, app):
+        self.app = app
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        body = b"".join([chunk async for chunk in request.stream])
+        scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": request.method,
+            "headers": [(key.lower(), value) for key, value in request.headers.raw], "scheme": request.url.scheme,
+            "path": request.url.path, "raw_path": request.url.raw_path.split(b"?")[0],
+            "query_string": request.url.query, "server": (request.url.host, request.url.port or 80),
+            "client": ("127.0.0.1", 0), "root_path": "",
+        }
+        queue, start = asyncio.Queue(), asyncio.get_running_loop().create_future()
+        received = False
+
+        async def receive():
+            nonlocal received
+            if not received:
+                received = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            await asyncio.Event().wait()  # o cliente nunca desconecta
+
+        async def send(message):
+            if message["type"] == "http.response.start":
+                start.set_result(message)
+            elif message["type"] == "http.response.body":
+                await queue.put(message.get("body", b""))
+                if not message.get("more_body", False):
+                    await queue.put(None)
+
+        task = asyncio.create_task(self.app(scope, receive, send))
+        await asyncio.wait([start, task], return_when=asyncio.FIRST_COMPLETED)
+        if not start.done():
+            task.result()  # o app falhou antes de responder: relança o erro
+        message = start.result()
+        return httpx.Response(message["status"], headers=message.get("headers", []),
+                              stream=_BodyStream(queue, task), request=request)
+
+def build_app(retrieval_seconds: float) -> FastAPI:
+    app = FastAPI()
+
+    @app.post("/ask")
+    async def ask():
+        await asyncio.sleep(retrieval_seconds)
+        answer = await llm_client.get_llm_client().chat(MESSAGES, max_tokens=500)
+        return {"answer": answer.strip(), "sources": SOURCES, "scores": SCORES}
+
+    @app.post("/ask/stream")
+    async def ask_stream():
+        started = time.perf_counter()
+        await asyncio.sleep(retrieval_seconds)
+        return sse_response(stream_answer(MESSAGES, started, SOURCES, SCORES, max_tokens=500))
+
+    return app
+
+async def run(app: FastAPI, requests: int, concurrency: int):
+    client = httpx.AsyncClient(transport=StreamingASGITransport(app), base_url="http://lumia", timeout=None)
+    semaphore = asyncio.Semaphore(concurrency)
+    full, sources, first_token, total = [], [], [], []
+
+    async def blocking():
+        async with semaphore:
+            start = time.perf_counter()
+            response = await client.post("/ask", json={"text": "ru"})
+            response.raise_for_status()
+            full.append((time.perf_counter() - start) * 1000)
+
+    async def streaming():
+        async with semaphore:
+            start = time.perf_counter()
+            seen_token = False
+            async with client.stream("POST", "/ask/stream", json={"text": "ru"}) as response:
+                response.raise_for_status()
+                async for line in response.aiter_lines():
+                    if line == "event: sources":
+                        sources.append((time.perf_counter() - start) * 1000)
+                    elif line == "event: token" and not seen_token:
+                        seen_token = True
+                        first_token.append((time.perf_counter() - start) * 1000)
+                    elif line == "event: error":
+                        raise RuntimeError("erro no streaming")
+            total.append((time.perf_counter() - start) * 1000)
+
+    await asyncio.gather(*(blocking() for _ in range(requests)))
+    await asyncio.gather(*(streaming() for _ in range(requests)))
+    await client.aclose()
+    return full, sources, first_token, total
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=50, help="Requisições por rota e nível de concorrência")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--llm-latency-ms", type=float, default=300.0, help="Tempo do stub até o primeiro trecho")
+    parser.add_argument("--token-ms", type=float, default=20.0, help="Intervalo entre trechos do stub")
+    parser.add_argument("--tokens", type=int, default=150, help="Palavras na resposta do stub")
+    parser.add_argument("--retrieval-ms", type=float, default=30.0, help="Tempo simulado da busca")
+    args = parser.parse_args()
+
+    answer = " ".join(f"palavra{i}" for i in range(args.tokens))
+    stub = create_app(args.llm_latency_ms, 0.0, 0.0, answer, args.token_ms)
+    app = build_app(args.retrieval_ms / 1000)
+    print(f"LLM: {args.llm_latency_ms:.0f}ms até o primeiro trecho + {args.tokens} trechos a cada {args.token_ms:.0f}ms; "
+          f"busca {args.retrieval_ms:.0f}ms; {args.requests} requisições por rota")
+    print(f"{'conc.':>5} | {'/ask completo p50/p95':>23} | {'fontes p50/p95':>17} | {'TTFT p50/p95':>17} | "
+          f"{'stream total p50/p95':>21}")
+
+    def p(values):
+        return f"{np.percentile(values, 50):>7.0f}/{np.percentile(values, 95):<7.0f}ms"
+
+    for concurrency in args.concurrency:
+        async def measure():
+            # Cliente da aplicação apontado para o stub pelo transporte que não junta o corpo
+            llm_client._llm_client = LLMClient("openai", base_url="http://stub", timeout=60.0, budget=120.0,
+                                               http_client=httpx.AsyncClient(transport=StreamingASGITransport(stub)))
+            try:
+                return await run(app, args.requests, concurrency)
+            finally:
+                await llm_client.close_llm_client()
+        full, sources, first_token, total = asyncio.run(measure())
+        print(f"{concurrency:>5} | {p(full):>23} | {p(sources):>17} | {p(first_token):>17} | {p(total):>21}")
+    print(f"Servidor: {json.dumps(streaming_stats.stats())}")
+
+if __name__ == "__main__":
+    main()
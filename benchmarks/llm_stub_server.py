@@ -0,0 +1,93 @@
+"""
+Servidor LLM falso para testes e benchmarks: responde POST /chat/completions (e o caminho
+do Groq, /openai/v1/chat/completions) no formato da OpenAI, após uma latência configurável,
+e devolve 503 numa fração das chamadas para exercitar as retentativas do cliente. A geração
+custa --token-ms por palavra depois da primeira: sem "stream", a resposta inteira sai no fim;
+com "stream": true, a latência vale até o primeiro trecho e as palavras seguintes saem como
+server-sent events a cada --token-ms.
+
+Aponte a API para ele com:
+    LUMIA_LLM_PROVIDER=openai LUMIA_LLM_BASE_URL=http://127.0.0.1:8001
+ou, pelo SDK do Groq:
+    LUMIA_LLM_PROVIDER=groq LUMIA_LLM_BASE_URL=http://127.0.0.1:8001
+
+Uso:
+    python benchmarks/llm_stub_server.py --port 8001 --latency-ms 300 --jitter-ms 50
+    python benchmarks/llm_stub_server.py --error-rate 0.1
+    python benchmarks/llm_stub_server.py --token-ms 30 --answer "$(cat resposta_longa.txt)"
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+def create_app(latency_ms: float = 300.0, jitter_ms: float = 0.0, error_rate: float = 0.0,
+               answer: str = "Resposta do stub.", token_ms: float = 0.0) -> FastAPI:
+    app = FastAPI()
+    app.state.calls = 0
+
+    async def stream_chunks(payload: dict):
+        # Um trecho por palavra, no formato chat.completion.chunk da OpenAI
+        words = answer.split(" ")
+        for i, word in enumerate(words):
+            if i:
+                await asyncio.sleep(token_ms / 1000)
+            chunk = {
+                "id": f"stub-{app.state.calls}",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": payload.get("model", "stub"),
+                "choices": [{"index": 0, "delta": {"content": word if i == 0 else " " + word}, "finish_reason": None}],
+            }
+            yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+        yield "data: [DONE]\n\n"
+
+    async def chat_completions(request: Request):
+        payload = await request.json()
+        app.state.calls += 1
+        await asyncio.sleep(max(0.0, latency_ms + random.uniform(-jitter_ms, jitter_ms)) / 1000)
+        if random.random() < error_rate:
+            return JSONResponse({"error": {"message": "stub: falha simulada"}}, status_code=503)
+        if payload.get("stream"):
+            return StreamingResponse(stream_chunks(payload), media_type="text/event-stream")
+        await asyncio.sleep(token_ms * (len(answer.split(" ")) - 1) / 1000)
+        prompt_tokens = sum(len(str(message.get("content", "")).split()) for message in payload.get("messages", []))
+        return {
+            "id": f"stub-{app.state.calls}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": payload.get("model", "stub"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": answer}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": len(answer.split()),
+                      "total_tokens": prompt_tokens + len(answer.split())},
+        }
+
+    app.add_api_route("/chat/completions", chat_completions, methods=["POST"])
+    app.add_api_route("/openai/v1/chat/completions", chat_completions, methods=["POST"])
+
+    @app.get("/health")
+    async def health():
+        return {"status": "healthy", "calls": app.state.calls}
+
+    return app
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency-ms", type=float, default=300.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fração das chamadas respondidas com 503")
+    parser.add_argument("--answer", default="Resposta do stub.")
+    parser.add_argument("--token-ms", type=float, default=0.0, help="Tempo de geração por palavra")
+    args = parser.parse_args()
+
+    import uvicorn
+    uvicorn.run(create_app(args.latency_ms, args.jitter_ms, args.error_rate, args.answer, args.token_ms),
+                host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
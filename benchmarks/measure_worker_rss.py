@@ -0,0 +1,119 @@
+"""
+Mede a memória por worker ao carregar o índice com e sem mmap.
+
+Sobe N processos simultâneos (como workers do uvicorn), cada um carrega o
+vector store, executa algumas buscas e reporta RSS, PSS (memória proporcional,
+que divide páginas compartilhadas entre os processos) e memória privada,
+lidas de /proc/self/smaps_rollup (Linux).
+
+Uso:
+    python benchmarks/measure_worker_rss.py --workers 4 --store numpy
+    python benchmarks/measure_worker_rss.py --workers 4 --store faiss --data-dir data
+"""
+import argparse
+import json
+import multiprocessing as mp
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+sys.path.append(SRC_DIR)
+
+def read_memory_kb():
+    """Lê RSS, PSS e memória privada (kB) do processo atual."""
+    stats = {}
+    with open("/proc/self/smaps_rollup", "r") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 2 and parts[0].endswith(":"):
+                stats[parts[0][:-1]] = int(parts[1])
+    private = stats.get("Private_Clean", 0) + stats.get("Private_Dirty", 0)
+    return {"rss": stats.get("Rss", 0), "pss": stats.get("Pss", 0), "private": private}
+
+def build_synthetic_corpus(directory, n, dim):
+    """Gera documents.json, embeddings.npy (normalizado) e faiss.index sintéticos."""
+    import faiss
+    from database.vector_store import VectorStore
+    rng = np.random.default_rng(0)
+    embeddings = rng.standard_normal((n, dim)).astype(np.float32)
+    store = VectorStore()
+    store.add_documents([{"url": f"https://www.ufpb.br/doc/{i}", "content": ""} for i in range(n)], embeddings)
+    store.save(directory)
+    index = faiss.IndexFlatL2(dim)
+    index.add(store.index_agent.embeddings)
+    faiss.write_index(index, os.path.join(directory, "faiss.index"))
+
+def worker(data_dir, store_kind, mmap, dim, barrier, results):
+    sys.path.append(SRC_DIR)
+    from database.vector_store import VectorStore, FaissVectorStore
+    before = read_memory_kb()
+    start = time.perf_counter()
+    if store_kind == "faiss":
+        store = FaissVectorStore(data_dir, mmap=mmap)
+    else:
+        store = VectorStore()
+        store.load(data_dir, mmap=mmap)
+    load_ms = (time.perf_counter() - start) * 1000
+    rng = np.random.default_rng(os.getpid())
+    for _ in range(5):
+        store.search(rng.standard_normal(dim).astype(np.float32), k=8)
+    # Todos os workers medem ao mesmo tempo, com o índice carregado
+    barrier.wait()
+    after = read_memory_kb()
+    results.put({"pid": os.getpid(), "load_ms": load_ms, "before": before, "after": after})
+    barrier.wait()
+
+def run(data_dir, store_kind, mmap, workers, dim):
+    ctx = mp.get_context("spawn")
+    barrier = ctx.Barrier(workers)
+    results = ctx.Queue()
+    procs = [ctx.Process(target=worker, args=(data_dir, store_kind, mmap, dim, barrier, results)) for _ in range(workers)]
+    for p in procs:
+        p.start()
+    rows = [results.get() for _ in procs]
+    for p in procs:
+        p.join()
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data-dir", default=None, help="Diretório com documents.json/embeddings.npy/faiss.index (padrão: corpus sintético)")
+    parser.add_argument("--store", choices=["numpy", "faiss"], default="numpy")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--docs", type=int, default=200_000, help="Tamanho do corpus sintético")
+    parser.add_argument("--dim", type=int, default=384)
+    args = parser.parse_args()
+
+    tmp = None
+    data_dir = args.data_dir
+    if data_dir is None:
+        tmp = tempfile.TemporaryDirectory()
+        data_dir = tmp.name
+        print(f"Gerando corpus sintético com {args.docs} vetores em {data_dir}...")
+        build_synthetic_corpus(data_dir, args.docs, args.dim)
+
+    summary = {}
+    for mmap in (False, True):
+        rows = run(data_dir, args.store, mmap, args.workers, args.dim)
+        label = "mmap" if mmap else "cópia privada"
+        print(f"\n[{args.store} | {label}] {args.workers} workers")
+        for r in rows:
+            delta_private = (r["after"]["private"] - r["before"]["private"]) / 1024
+            print(f"  pid {r['pid']}: load {r['load_ms']:.0f}ms | RSS {r['after']['rss'] / 1024:.1f}MB | "
+                  f"PSS {r['after']['pss'] / 1024:.1f}MB | privado +{delta_private:.1f}MB")
+        summary[label] = {
+            "pss_total_mb": sum(r["after"]["pss"] for r in rows) / 1024,
+            "load_ms_avg": sum(r["load_ms"] for r in rows) / len(rows),
+        }
+    print("\nResumo:")
+    print(json.dumps(summary, ensure_ascii=False, indent=2))
+    saved = summary["cópia privada"]["pss_total_mb"] - summary["mmap"]["pss_total_mb"]
+    print(f"Economia total (PSS): {saved:.1f}MB | por worker: {saved / args.workers:.1f}MB")
+    if tmp is not None:
+        tmp.cleanup()
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,16 @@
-import json
+import os
+import sys
 
-# Caminho para o arquivo
-file_path = 'data/documents.json'  # agora busca sempre em /data
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+from database.content_store import open_documents
 
-# Carregar os dados
-with open(file_path, 'r', encoding='utf-8') as f:
-    documents = json.load(f)
+# Documentos de /data (store de conteúdo ou documents.json legado)
+data_dir = 'data'  # agora busca sempre em /data
+documents = open_documents(data_dir)
 
 # Contar PDFs
+# Documentos divididos em passagens contam uma vez só (primeira passagem)
+documents = [doc for doc in documents if doc.get('passage', 0) == 0]
 pdf_count = sum(1 for doc in documents if doc['url'].lower().endswith('.pdf'))
 total_count = len(documents)
 
@@ -1,23 +1,32 @@
 import json
 import os
+import sys
 from datetime import datetime
+from urllib.parse import urlparse
 
-# Caminho do arquivo de entrada e saída
-DOCS_PATH = os.path.join('data', 'documents.json')
-META_PATH = os.path.join('data', 'metadata.json')
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+from database.content_store import has_documents, open_documents
+from database.metadata_filters import content_type_for, normalize_path, read_crawl_dates
+
+# Diretório dos documentos (content/ ou documents.json) e arquivo de saída
+DATA_DIR = 'data'
+META_PATH = os.path.join(DATA_DIR, 'metadata.json')
 
 def clean_text(text):
     """Remove quebras de linha e espaços duplicados."""
     return ' '.join(text.replace('\n', ' ').replace('\r', ' ').split())
 
 def generate_metadata():
-    if not os.path.exists(DOCS_PATH):
-        print(f"Arquivo {DOCS_PATH} não encontrado.")
+    if not has_documents(DATA_DIR):
+        print(f"Nenhum documento encontrado em {DATA_DIR}.")
         return
-    with open(DOCS_PATH, 'r', encoding='utf-8') as f:
-        docs = json.load(f)
+    docs = open_documents(DATA_DIR)
     metadata = []
     now = datetime.now().isoformat()
+    # Mantém a data da primeira coleta de cada URL (usada no filtro crawled_after)
+    previous_dates = read_crawl_dates(os.path.dirname(META_PATH))
+    # Um metadado por documento de origem, não por passagem
+    docs = [doc for doc in docs if doc.get('passage', 0) == 0]
     for idx, doc in enumerate(docs, 1):
         url = doc.get('url', None)
         file_name = url.split('/')[-1] if url else f'doc_{idx}'
@@ -28,7 +37,10 @@ def generate_metadata():
             'file_name': file_name,
             'url': url,
             'summary': summary,
-            'date_added': now
+            'content_type': content_type_for(doc),
+            'host': urlparse(url).netloc.lower() if url else '',
+            'path': normalize_path(urlparse(url).path) if url else '/',
+            'date_added': doc.get('crawled_at') or previous_dates.get(url) or now
         }
         metadata.append(meta)
     with open(META_PATH, 'w', encoding='utf-8') as f:
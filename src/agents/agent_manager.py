@@ -1,46 +1,305 @@
+import asyncio
+import contextlib
+import functools
+import json
 import os
-from typing import Dict, Optional
+import threading
+import time
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from agents.batcher import DEFAULT_MAX_WAIT, MicroBatcher
+from agents.embedding_cache import QueryEmbeddingCache
+from agents.model_registry import model_registry
 from database.vector_store import VectorStore, FaissVectorStore
-from sentence_transformers import SentenceTransformer
+from database.sharded_store import ShardedVectorStore, has_shards
+from database.snapshots import current_version, resolve_data_dir
+from database.segment_store import has_embeddings
+from database.content_store import has_documents
+
+# Encode e busca fora do event loop: poucas threads, pois o torch e o FAISS já paralelizam por dentro
+DEFAULT_CPU_WORKERS = min(4, os.cpu_count() or 1)
+
+def filters_key(filters) -> str:
+    """Chave estável dos filtros (dict ou modelo pydantic) para agrupar pedidos iguais num lote."""
+    if filters is None:
+        return ""
+    if hasattr(filters, "model_dump"):
+        filters = filters.model_dump()
+    return json.dumps(filters, sort_keys=True, default=str)
+
+def close_store(vector_store):
+    """Fecha o store (pool de threads dos shards, mmaps do índice e dos documentos), se ele sabe fechar."""
+    close = getattr(vector_store, "close", None)
+    if close is not None:
+        close()
+
+def _unwrap(result):
+    if isinstance(result, Exception):
+        raise result
+    return result
 
 class Agent:
-    def __init__(self, name: str, data_dir: str, embedding_model: str, use_faiss: bool = True):
+    def __init__(self, name: str, data_dir: str, embedding_model: str, use_faiss: bool = True, mmap: bool = False,
+                 nprobe: Optional[int] = None, ef_search: Optional[int] = None,
+                 quantization: str = "none", rescore: bool = True, search_workers: Optional[int] = None,
+                 embedding_cache: Optional[QueryEmbeddingCache] = None, batch_max_size: int = 0,
+                 batch_max_wait: float = DEFAULT_MAX_WAIT, embedding_backend: str = "torch",
+                 onnx_dir: Optional[str] = None, executor: Optional[Executor] = None):
         self.name = name
         self.data_dir = data_dir
         self.embedding_model = embedding_model
-        if use_faiss:
-            self.vector_store = FaissVectorStore(data_dir)
-        else:
-            self.vector_store = VectorStore()
-        self.model = SentenceTransformer(embedding_model)
+        self.mmap = mmap
         self.use_faiss = use_faiss
-        self.load_data()
+        self.store_options = dict(nprobe=nprobe, ef_search=ef_search, quantization=quantization, rescore=rescore,
+                                  search_workers=search_workers)
+        self._reload_lock = threading.Lock()
+        self._watcher = None
+        # Buscas em andamento por store (id -> contagem): um store trocado pela recarga só é
+        # fechado quando a última busca que o segura termina
+        self._store_lock = threading.Lock()
+        self._store_refs: Dict[int, int] = {}
+        self._retired: Dict[int, object] = {}
+        # Com data_dir/CURRENT, carrega o snapshot ativo (ver database/snapshots.py)
+        self.index_dir, self.index_version = resolve_data_dir(data_dir)
+        self.vector_store = self._open_store(self.index_dir)
+        # "torch" (SentenceTransformer) ou "onnx" (int8, sem torch; ver src/tools/export_onnx.py)
+        self.embedding_backend = embedding_backend
+        self.onnx_dir = onnx_dir
+        # Compartilhado pelo processo: agentes com o mesmo modelo não o carregam de novo
+        self.model = model_registry.acquire(embedding_model, embedding_backend, onnx_dir)
+        # Compartilhado entre agentes: as chaves incluem o modelo (e o backend, que muda os vetores)
+        self.embedding_cache = embedding_cache
+        self.cache_key = embedding_model if embedding_backend == "torch" else f"{embedding_model}@{embedding_backend}"
+        # Pool limitado onde search_async roda encode + busca (None: o executor padrão do loop)
+        self.executor = executor
+        # batch_max_size > 1: buscas concorrentes (search/search_async) viram um encode e uma busca por lote
+        self.batcher = None
+        if batch_max_size > 1:
+            self.batcher = MicroBatcher(self._search_batch, max_batch=batch_max_size, max_wait=batch_max_wait,
+                                        name=f"batcher-{name}")
 
-    def load_data(self):
+    def _open_store(self, index_dir: str):
+        options = self.store_options
+        if self.use_faiss and has_shards(index_dir):
+            # index_dir/shards.json (src/tools/partition_shards.py): busca paralela nos shards
+            vector_store = ShardedVectorStore(index_dir, mmap=self.mmap, nprobe=options["nprobe"],
+                                              ef_search=options["ef_search"], rescore=options["rescore"],
+                                              workers=options["search_workers"])
+        elif self.use_faiss:
+            # No FAISS a quantização vem do tipo de índice gerado pelo builder (sq8, binary, ivf_pq)
+            vector_store = FaissVectorStore(index_dir, mmap=self.mmap, nprobe=options["nprobe"],
+                                            ef_search=options["ef_search"], rescore=options["rescore"])
+        else:
+            vector_store = VectorStore(quantization=options["quantization"], rescore=options["rescore"])
+            self.load_data(vector_store, index_dir)
+        if self.use_faiss:
+            index_model = vector_store.manifest.get("model")
+            if index_model and index_model != self.embedding_model:
+                print(f"[Agent {self.name}] Índice construído com '{index_model}', mas o agente usa '{self.embedding_model}'")
+        return vector_store
+
+    def load_data(self, vector_store=None, index_dir: Optional[str] = None):
+        vector_store = vector_store or self.vector_store
+        index_dir = index_dir or self.index_dir
         if self.use_faiss:
             # FAISS: já carrega no construtor
             return
-        docs_path = os.path.join(self.data_dir, "documents.json")
-        embs_path = os.path.join(self.data_dir, "embeddings.npy")
-        if os.path.exists(docs_path) and os.path.exists(embs_path):
-            self.vector_store.load(self.data_dir)
+        if has_documents(index_dir) and has_embeddings(index_dir):
+            vector_store.load(index_dir, mmap=self.mmap)
         else:
-            print(f"[Agent {self.name}] Dados não encontrados em {self.data_dir}")
+            print(f"[Agent {self.name}] Dados não encontrados em {index_dir}")
 
     def get_embedding(self, text: str):
-        return self.model.encode(text, convert_to_numpy=True)
+        if self.embedding_cache is None:
+            return self.model.encode(text, convert_to_numpy=True)
+        embedding = self.embedding_cache.get(self.cache_key, text)
+        if embedding is None:
+            embedding = self.embedding_cache.put(self.cache_key, text,
+                                                 self.model.encode(text, convert_to_numpy=True))
+        return embedding
+
+    def get_embeddings(self, texts: List[str]) -> np.ndarray:
+        """Embeddings de várias consultas: só as ausentes do cache passam pelo modelo, num único encode."""
+        if self.embedding_cache is None:
+            return self.model.encode(texts, convert_to_numpy=True)
+        embeddings = [self.embedding_cache.get(self.cache_key, text) for text in texts]
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        if missing:
+            encoded = self.model.encode([texts[i] for i in missing], convert_to_numpy=True)
+            for i, embedding in zip(missing, encoded):
+                embeddings[i] = self.embedding_cache.put(self.cache_key, texts[i], embedding)
+        return np.stack(embeddings)
+
+    # --- Busca (com micro-batching) ---
+    def search(self, text: str, k: int = 5, threshold: Optional[float] = None, hybrid: bool = True, filters=None):
+        """Embedding + busca de uma consulta; com o batcher ativo, entra no próximo lote."""
+        request = (text, k, threshold, hybrid, filters)
+        if self.batcher is None:
+            return _unwrap(self._search_batch([request])[0])
+        return self.batcher(request)
+
+    async def search_async(self, text: str, k: int = 5, threshold: Optional[float] = None, hybrid: bool = True,
+                           filters=None):
+        """search sem bloquear o event loop: espera o lote (ou roda a busca) fora dele."""
+        request = (text, k, threshold, hybrid, filters)
+        if self.batcher is None:
+            results = await asyncio.get_running_loop().run_in_executor(self.executor, self._search_batch, [request])
+            return _unwrap(results[0])
+        return await asyncio.wrap_future(self.batcher.submit(request))
+
+    def _search_batch(self, requests: List[Tuple]) -> List:
+        """
+        Um encode para o lote todo e uma busca por grupo de pedidos com os mesmos k, threshold e
+        filtros. Um grupo que falha (ex.: filtro inválido) recebe a exceção no lugar dos resultados.
+        """
+        embeddings = self.get_embeddings([text for text, *_ in requests])
+        # Uma referência por lote: uma recarga a quente no meio não mistura versões
+        with self.acquire_store() as vector_store:
+            return self._search_groups(vector_store, requests, embeddings)
+
+    def _search_groups(self, vector_store, requests: List[Tuple], embeddings: np.ndarray) -> List:
+        groups: Dict[Tuple, List[int]] = {}
+        for i, (_, k, threshold, hybrid, filters) in enumerate(requests):
+            groups.setdefault((k, threshold, hybrid, filters_key(filters)), []).append(i)
+        results: List = [[] for _ in requests]
+        for (k, threshold, hybrid, _), rows in groups.items():
+            filters = requests[rows[0]][4]
+            query_texts = [requests[i][0] if hybrid else None for i in rows]
+            try:
+                if hasattr(vector_store, "search_batch"):
+                    batch = vector_store.search_batch(embeddings[rows], k, threshold, query_texts=query_texts,
+                                                      filters=filters)
+                else:
+                    batch = [vector_store.search(embeddings[i], k, threshold, query_text=text, filters=filters)
+                             for i, text in zip(rows, query_texts)]
+            except Exception as e:
+                batch = [e] * len(rows)
+            for i, result in zip(rows, batch):
+                results[i] = result
+        return results
+
+    @contextlib.contextmanager
+    def acquire_store(self):
+        """O store atual, marcado como em uso até o fim do bloco (a recarga não o fecha antes disso)."""
+        with self._store_lock:
+            vector_store = self.vector_store
+            key = id(vector_store)
+            self._store_refs[key] = self._store_refs.get(key, 0) + 1
+        try:
+            yield vector_store
+        finally:
+            with self._store_lock:
+                self._store_refs[key] -= 1
+                retired = None
+                if self._store_refs[key] == 0:
+                    del self._store_refs[key]
+                    retired = self._retired.pop(key, None)
+            if retired is not None:
+                close_store(retired)
+
+    def _retire_store(self, vector_store):
+        """Fecha o store substituído agora, se nenhuma busca o usa, ou quando a última terminar."""
+        with self._store_lock:
+            key = id(vector_store)
+            if key in self._store_refs:
+                self._retired[key] = vector_store
+                return
+        close_store(vector_store)
+
+    def close(self):
+        """Para o batcher, fecha o store e devolve a referência ao modelo compartilhado."""
+        if self.batcher is not None:
+            self.batcher.close()
+        self._retire_store(self.vector_store)
+        model_registry.release(self.embedding_model, self.embedding_backend, self.onnx_dir)
+
+    @property
+    def content_version(self):
+        """
+        Versão do que as buscas enxergam: o snapshot carregado e o número de escritas
+        (upsert/delete/compact) feitas no store em memória desde então.
+        """
+        return self.index_version, getattr(self.vector_store, "generation", 0)
+
+    # --- Recarga a quente ---
+    def reload(self, version: Optional[str] = None) -> Optional[str]:
+        """
+        Carrega o snapshot (o CURRENT, se version não for dada) num store novo, aquece-o com
+        uma consulta e troca a referência self.vector_store de uma vez. Requisições em curso
+        já seguram o store antigo (acquire_store) e terminam nele; o último a soltá-lo o
+        fecha (pool dos shards e mmaps), sem esperar o coletor de lixo. Sem mmap, os dois
+        stores coexistem na memória durante a carga. Retorna a versão carregada.
+        """
+        with self._reload_lock:
+            index_dir, version = resolve_data_dir(self.data_dir, version)
+            start = time.perf_counter()
+            vector_store = self._open_store(index_dir)
+            # Aquecimento fora do caminho das requisições: páginas do índice e pools já prontos
+            vector_store.search(self.model.encode("aquecimento", convert_to_numpy=True), k=1, threshold=0.0)
+            previous = self.index_version
+            with self._store_lock:
+                previous_store, self.vector_store = self.vector_store, vector_store
+            self.index_dir, self.index_version = index_dir, version
+            self._retire_store(previous_store)
+            print(f"[Agent {self.name}] Índice {previous or 'inicial'} -> {version or index_dir} "
+                  f"em {time.perf_counter() - start:.2f}s")
+            return version
+
+    def watch(self, interval: float = 30.0) -> threading.Thread:
+        """Thread que recarrega o agente quando data_dir/CURRENT aponta para uma versão nova."""
+        def loop():
+            while True:
+                time.sleep(interval)
+                try:
+                    if current_version(self.data_dir) not in (None, self.index_version):
+                        self.reload()
+                except Exception as e:
+                    # Snapshot incompleto ou inválido: segue na versão atual e tenta no próximo ciclo
+                    print(f"[Agent {self.name}] Falha ao recarregar o índice: {e}")
+        if self._watcher is None:
+            self._watcher = threading.Thread(target=loop, name=f"reload-{self.name}", daemon=True)
+            self._watcher.start()
+        return self._watcher
 
 class AgentManager:
-    def __init__(self):
+    def __init__(self, embedding_cache: Optional[QueryEmbeddingCache] = None, batch_max_size: int = 0,
+                 batch_max_wait: float = DEFAULT_MAX_WAIT, embedding_backend: str = "torch",
+                 onnx_dir: Optional[str] = None, cpu_workers: Optional[int] = None):
         self.agents: Dict[str, Agent] = {}
         self.default_agent: Optional[str] = None
+        self.embedding_cache = embedding_cache
+        self.batch_max_size = batch_max_size
+        self.batch_max_wait = batch_max_wait
+        self.embedding_backend = embedding_backend
+        self.onnx_dir = onnx_dir
+        # Compartilhado pelos agentes: limita quantas requisições fazem trabalho de CPU ao mesmo tempo
+        self.executor = ThreadPoolExecutor(max_workers=cpu_workers or DEFAULT_CPU_WORKERS, thread_name_prefix="lumia-cpu")
 
-    def register_agent(self, name: str, data_dir: str, embedding_model: str, default=False, use_faiss=True):
-        agent = Agent(name, data_dir, embedding_model, use_faiss=use_faiss)
+    def register_agent(self, name: str, data_dir: str, embedding_model: str, default=False, use_faiss=True, mmap=False,
+                       nprobe=None, ef_search=None, quantization="none", rescore=True, search_workers=None):
+        agent = Agent(name, data_dir, embedding_model, use_faiss=use_faiss, mmap=mmap, nprobe=nprobe, ef_search=ef_search,
+                      quantization=quantization, rescore=rescore, search_workers=search_workers,
+                      embedding_cache=self.embedding_cache, batch_max_size=self.batch_max_size,
+                      batch_max_wait=self.batch_max_wait, embedding_backend=self.embedding_backend,
+                      onnx_dir=self.onnx_dir, executor=self.executor)
         self.agents[name] = agent
         if default or self.default_agent is None:
             self.default_agent = name
 
+    def remove_agent(self, name: str):
+        agent = self.agents.pop(name)
+        agent.close()
+        if self.default_agent == name:
+            self.default_agent = next(iter(self.agents), None)
+
+    async def run_in_executor(self, fn, *args, **kwargs):
+        """Roda trabalho de CPU (encode, busca, varrer documentos) no pool limitado, sem travar o event loop."""
+        return await asyncio.get_running_loop().run_in_executor(self.executor, functools.partial(fn, *args, **kwargs))
+
+    def reload_agent(self, name: Optional[str] = None, version: Optional[str] = None) -> Optional[str]:
+        return self.get_agent(name).reload(version)
+
     def get_agent(self, name: Optional[str] = None) -> Agent:
         if name and name in self.agents:
             return self.agents[name]
@@ -0,0 +1,128 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+import numpy as np
+
+DEFAULT_MAX_SIZE = 1024
+DEFAULT_TTL = 6 * 3600
+DEFAULT_THRESHOLD = 0.95
+
+_NO_VERSION = object()
+
+# --- Cache semântico de respostas ---
+class SemanticAnswerCache:
+    """
+    Respostas finais (texto, fontes, scores) por embedding da pergunta: uma pergunta nova com
+    similaridade de cosseno >= threshold com uma já respondida, no mesmo escopo (threshold de
+    busca e filtros), recebe a resposta guardada sem busca nem LLM.
+
+    Os embeddings ficam numa matriz pré-alocada de max_size linhas, normalizados: a consulta é
+    um produto interno com as linhas ocupadas (com ~1000 entradas, mais rápido que um índice
+    ANN e sem custo para remover), e a entrada expulsa pelo LRU libera a linha para a próxima.
+    Entradas com mais de ttl segundos não são servidas. O cache pertence a uma versão do índice
+    (Agent.content_version: snapshot + escritas no store): consultar com outra versão esvazia
+    tudo, e respostas calculadas sobre a versão anterior são descartadas em vez de guardadas.
+    Seguro para várias threads.
+    """
+    def __init__(self, max_size: int = DEFAULT_MAX_SIZE, ttl: Optional[float] = DEFAULT_TTL,
+                 threshold: float = DEFAULT_THRESHOLD):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.threshold = threshold
+        self.version = _NO_VERSION
+        self._vectors: Optional[np.ndarray] = None
+        self._used = np.zeros(max_size, dtype=bool)
+        self._entries: "OrderedDict[int, Dict]" = OrderedDict()  # linha -> entrada, do LRU ao mais recente
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _sync_version(self, version) -> bool:
+        """Adota a versão do índice, esvaziando o cache se ela mudou. Chamar com o lock."""
+        if version == self.version:
+            return False
+        if self._entries:
+            self.invalidations += 1
+            print(f"[Cache de respostas] índice mudou ({self.version} -> {version}); {len(self._entries)} respostas descartadas")
+        self._entries.clear()
+        self._used[:] = False
+        self.version = version
+        return True
+
+    def _remove(self, row: int):
+        del self._entries[row]
+        self._used[row] = False
+
+    @staticmethod
+    def _normalize(embedding: np.ndarray) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32).ravel()
+        return vector / max(float(np.linalg.norm(vector)), 1e-12)
+
+    def get(self, embedding: np.ndarray, scope: str, version) -> Optional[Dict]:
+        """Entrada mais parecida no escopo acima do threshold ({answer, sources, scores, question, similarity}) ou None."""
+        query = self._normalize(embedding)
+        with self._lock:
+            self._sync_version(version)
+            rows = np.flatnonzero(self._used)
+            if len(rows):
+                similarities = self._vectors[rows] @ query
+                now = time.time()
+                for i in np.argsort(-similarities):
+                    if similarities[i] < self.threshold:
+                        break
+                    row = int(rows[i])
+                    entry = self._entries[row]
+                    if entry["scope"] != scope:
+                        continue
+                    if self.ttl is not None and now - entry["stored_at"] > self.ttl:
+                        self._remove(row)
+                        continue
+                    self._entries.move_to_end(row)
+                    self.hits += 1
+                    return {**entry, "similarity": float(similarities[i])}
+            self.misses += 1
+            return None
+
+    def put(self, embedding: np.ndarray, scope: str, version, question: str, answer: str,
+            sources: List[str], scores: List[float]):
+        vector = self._normalize(embedding)
+        with self._lock:
+            if version != self.version:
+                # Resposta calculada sobre outro índice (recarga no meio da requisição): não serve mais
+                return
+            if self._vectors is None:
+                self._vectors = np.zeros((self.max_size, len(vector)), dtype=np.float32)
+            if len(self._entries) >= self.max_size:
+                row, _ = self._entries.popitem(last=False)
+                self._used[row] = False
+                self.evictions += 1
+            row = int(np.flatnonzero(~self._used)[0])
+            self._vectors[row] = vector
+            self._used[row] = True
+            self._entries[row] = {"question": question, "answer": answer, "sources": list(sources),
+                                  "scores": list(scores), "scope": scope, "stored_at": time.time()}
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._used[:] = False
+
+    def stats(self) -> Dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "threshold": self.threshold,
+            "index_version": None if self.version is _NO_VERSION else self.version,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
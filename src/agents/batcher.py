@@ -0,0 +1,86 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Dict, List
+
+DEFAULT_MAX_BATCH = 32
+DEFAULT_MAX_WAIT = 0.002  # segundos
+
+# --- Micro-batching ---
+class MicroBatcher:
+    """
+    Junta chamadas concorrentes num lote: a primeira espera até max_wait segundos (ou até
+    max_batch itens) pelas seguintes, e handler(itens) roda uma vez para o lote inteiro,
+    devolvendo um resultado por item, na mesma ordem. Cada chamador recebe um Future; um
+    resultado que seja uma exceção vira a exceção do Future daquele item (erro de um pedido
+    não derruba o lote), e uma exceção do handler falha o lote inteiro.
+
+    Uma única thread executa os lotes; enquanto um roda, os pedidos que chegam acumulam na
+    fila e formam o próximo, então o lote cresce sozinho com a carga.
+    """
+    def __init__(self, handler: Callable[[List], List], max_batch: int = DEFAULT_MAX_BATCH,
+                 max_wait: float = DEFAULT_MAX_WAIT, name: str = "micro-batcher"):
+        self.handler = handler
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._queue: "queue.Queue" = queue.Queue()
+        self.batches = 0
+        self.items = 0
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, item) -> Future:
+        future = Future()
+        self._queue.put((item, future))
+        return future
+
+    def __call__(self, item):
+        return self.submit(item).result()
+
+    def stats(self) -> Dict:
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "mean_batch": round(self.items / self.batches, 2) if self.batches else 0.0,
+        }
+
+    def close(self):
+        self._queue.put(None)
+
+    def _collect(self, first) -> List:
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            try:
+                # O que já está na fila entra sem esperar, mesmo com o prazo vencido
+                entry = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if entry is None:
+                self._queue.put(None)
+                break
+            batch.append(entry)
+        return batch
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            batch = self._collect(first)
+            futures = [future for _, future in batch]
+            try:
+                results = self.handler([item for item, _ in batch])
+            except Exception as e:
+                for future in futures:
+                    future.set_exception(e)
+                continue
+            self.batches += 1
+            self.items += len(batch)
+            for future, result in zip(futures, results):
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
@@ -0,0 +1,112 @@
+import json
+import os
+from typing import Dict, List, Optional, Union
+import numpy as np
+
+EMBEDDING_BACKENDS = ("torch", "onnx", "onnx-fp32")
+ONNX_MANIFEST_NAME = "onnx_manifest.json"
+ONNX_MODEL_NAME = "model.onnx"
+ONNX_INT8_MODEL_NAME = "model_int8.onnx"
+TOKENIZER_NAME = "tokenizer.json"
+DEFAULT_BATCH_SIZE = 32
+
+def default_onnx_dir(model_name: str) -> str:
+    """models/<modelo>-onnx/ na raiz do projeto (onde src/tools/export_onnx.py grava)."""
+    root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    return os.path.join(root, "models", f"{model_name.split('/')[-1]}-onnx")
+
+# --- Backends de embeddings ---
+# Todos expõem o subconjunto da API do SentenceTransformer usado no projeto: encode(texto ou
+# lista, convert_to_numpy=True) e get_sentence_embedding_dimension().
+
+class TorchBackend:
+    """O SentenceTransformer original (PyTorch). Importado só aqui: o backend ONNX não carrega o torch."""
+    def __init__(self, model_name: str):
+        from sentence_transformers import SentenceTransformer
+        self.model_name = model_name
+        self.model = SentenceTransformer(model_name)
+
+    def encode(self, texts: Union[str, List[str]], convert_to_numpy: bool = True, batch_size: int = DEFAULT_BATCH_SIZE):
+        return self.model.encode(texts, convert_to_numpy=convert_to_numpy, batch_size=batch_size)
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.model.get_sentence_embedding_dimension()
+
+class OnnxBackend:
+    """
+    O mesmo transformer exportado para ONNX (src/tools/export_onnx.py), com pesos int8 por
+    quantização dinâmica, rodando no onnxruntime. Tokenização pelo tokenizers (Rust) e pooling
+    replicando os módulos do SentenceTransformer (média pelos tokens, normalização opcional),
+    descritos no onnx_manifest.json. Dependências: onnxruntime e tokenizers; sem torch.
+    """
+    def __init__(self, onnx_dir: str, quantized: bool = True, threads: Optional[int] = None):
+        import onnxruntime
+        from tokenizers import Tokenizer
+        with open(os.path.join(onnx_dir, ONNX_MANIFEST_NAME), "r", encoding="utf-8") as f:
+            self.manifest: Dict = json.load(f)
+        self.model_name = self.manifest["model"]
+        self.normalize = self.manifest.get("normalize", False)
+        self.pooling = self.manifest.get("pooling", "mean")
+        self.model_path = os.path.join(onnx_dir, ONNX_INT8_MODEL_NAME if quantized else ONNX_MODEL_NAME)
+        if not os.path.exists(self.model_path):
+            raise ValueError(f"ONNX model not found: {self.model_path} (run src/tools/export_onnx.py)")
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = onnxruntime.InferenceSession(self.model_path, options, providers=["CPUExecutionProvider"])
+        self.input_names = {item.name for item in self.session.get_inputs()}
+        self.tokenizer = Tokenizer.from_file(os.path.join(onnx_dir, TOKENIZER_NAME))
+        self.tokenizer.enable_truncation(max_length=self.manifest.get("max_seq_length", 128))
+        self.tokenizer.enable_padding(pad_id=self.manifest.get("pad_token_id", 1),
+                                      pad_token=self.manifest.get("pad_token", "<pad>"))
+
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(texts)
+        input_ids = np.asarray([encoding.ids for encoding in encodings], dtype=np.int64)
+        attention_mask = np.asarray([encoding.attention_mask for encoding in encodings], dtype=np.int64)
+        inputs = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self.input_names:
+            inputs["token_type_ids"] = np.zeros_like(input_ids)
+        token_embeddings = self.session.run(None, inputs)[0]
+        if self.pooling == "cls":
+            embeddings = token_embeddings[:, 0]
+        else:
+            # Média só sobre os tokens reais (o padding não entra), como o Pooling do SentenceTransformer
+            mask = attention_mask[:, :, None].astype(np.float32)
+            embeddings = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        if self.normalize:
+            embeddings = embeddings / np.clip(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12, None)
+        return embeddings.astype(np.float32)
+
+    def encode(self, texts: Union[str, List[str]], convert_to_numpy: bool = True, batch_size: int = DEFAULT_BATCH_SIZE):
+        single = isinstance(texts, str)
+        texts = [texts] if single else list(texts)
+        if not texts:
+            return np.empty((0, self.get_sentence_embedding_dimension()), dtype=np.float32)
+        # Ordena por tamanho para que cada lote tenha pouco padding, como o SentenceTransformer
+        order = np.argsort([-len(text) for text in texts], kind="stable")
+        embeddings = np.empty((len(texts), self.get_sentence_embedding_dimension()), dtype=np.float32)
+        for start in range(0, len(texts), batch_size):
+            rows = order[start:start + batch_size]
+            embeddings[rows] = self._encode_batch([texts[i] for i in rows])
+        return embeddings[0] if single else embeddings
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return int(self.manifest["dim"])
+
+def load_embedding_backend(model_name: str, backend: str = "torch", onnx_dir: Optional[str] = None,
+                           threads: Optional[int] = None):
+    """
+    backend "torch": SentenceTransformer(model_name). "onnx": o modelo exportado em onnx_dir
+    (padrão: models/<modelo>-onnx/), int8; "onnx-fp32" usa o export sem quantização.
+    """
+    if backend == "torch":
+        return TorchBackend(model_name)
+    if backend in ("onnx", "onnx-fp32"):
+        onnx_dir = onnx_dir or default_onnx_dir(model_name)
+        model = OnnxBackend(onnx_dir, quantized=backend == "onnx", threads=threads)
+        if model.model_name != model_name:
+            print(f"[Embeddings] {onnx_dir} foi exportado de '{model.model_name}', não de '{model_name}'")
+        return model
+    raise ValueError(f"Unknown embedding backend '{backend}'. Options: {', '.join(EMBEDDING_BACKENDS)}")
@@ -0,0 +1,103 @@
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+import numpy as np
+
+DEFAULT_MAX_SIZE = 2048
+DEFAULT_TTL = 24 * 3600
+
+def normalize_query(text: str) -> str:
+    """Chave da consulta: sem espaços sobrando e em minúsculas ("Horário  do RU?" == "horário do ru?")."""
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+# --- Cache LRU de embeddings de consulta ---
+class QueryEmbeddingCache:
+    """
+    Embeddings de consultas já vistas, por (modelo, consulta normalizada). LRU limitado a
+    max_size entradas; entradas com mais de ttl segundos são recalculadas (ttl=None: sem
+    expiração). Os vetores guardados são somente leitura, já que são compartilhados entre
+    requisições. Seguro para várias threads.
+    """
+    def __init__(self, max_size: int = DEFAULT_MAX_SIZE, ttl: Optional[float] = DEFAULT_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[np.ndarray, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, model: str, query: str) -> Optional[np.ndarray]:
+        key = (model, normalize_query(query))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl is not None and time.time() - entry[1] > self.ttl:
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, model: str, query: str, embedding: np.ndarray, stored_at: Optional[float] = None) -> np.ndarray:
+        embedding = np.array(embedding, dtype=np.float32)
+        embedding.flags.writeable = False
+        key = (model, normalize_query(query))
+        with self._lock:
+            self._entries[key] = (embedding, stored_at or time.time())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return embedding
+
+    def stats(self) -> Dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
+
+    def save(self, path: str):
+        """Grava as entradas (da menos para a mais recente) para o warm start do próximo processo."""
+        with self._lock:
+            items = list(self._entries.items())
+        if not items:
+            return
+        tmp_path = path + ".tmp.npz"
+        np.savez(
+            tmp_path,
+            models=np.array([key[0] for key, _ in items]),
+            queries=np.array([key[1] for key, _ in items]),
+            embeddings=np.stack([entry[0] for _, entry in items]),
+            stored_at=np.array([entry[1] for _, entry in items], dtype=np.float64),
+        )
+        os.replace(tmp_path, path)
+
+    def load(self, path: str) -> int:
+        """Pré-carrega um arquivo gravado por save(); entradas já expiradas são descartadas. Retorna quantas."""
+        if not os.path.exists(path):
+            return 0
+        with np.load(path) as data:
+            models, queries = data["models"], data["queries"]
+            embeddings, stored_at = data["embeddings"], data["stored_at"]
+        now = time.time()
+        loaded = 0
+        for model, query, embedding, timestamp in zip(models, queries, embeddings, stored_at):
+            if self.ttl is not None and now - timestamp > self.ttl:
+                continue
+            self.put(str(model), str(query), embedding, stored_at=float(timestamp))
+            loaded += 1
+        return loaded
@@ -0,0 +1,145 @@
+import json
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+import numpy as np
+
+INTENTS = ("QA", "QB", "COLLAB", "TESTE")
+EXAMPLES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "intent_examples.json")
+DEFAULT_MIN_CONFIDENCE = 0.6
+DEFAULT_TEMPERATURE = 0.05
+
+Encoder = Callable[[List[str]], np.ndarray]
+
+def load_examples(path: str = EXAMPLES_PATH) -> List[Tuple[str, str]]:
+    """Exemplos rotulados [(texto, intenção)] de um JSON [{"text": ..., "intent": "QA"}, ...]."""
+    with open(path, "r", encoding="utf-8") as f:
+        examples = [(item["text"], item["intent"].upper()) for item in json.load(f)]
+    unknown = {intent for _, intent in examples} - set(INTENTS)
+    if unknown:
+        raise ValueError(f"Unknown intents in {path}: {', '.join(sorted(unknown))}. Options: {', '.join(INTENTS)}")
+    return examples
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+# --- Classificador ---
+class IntentRouter:
+    """
+    Roteador de intenção local (QA / QB / COLLAB / TESTE): centroide mais próximo sobre o
+    embedding da pergunta. Cada intenção é a média normalizada dos embeddings dos seus exemplos
+    rotulados; a confiança é o softmax das similaridades de cosseno divididas por `temperature`.
+    Abaixo de min_confidence, route devolve None e quem chamou decide pelo LLM.
+
+    Com o encoder do agente QB (Agent.get_embeddings), o embedding da pergunta fica no cache
+    de consultas e a busca seguinte não codifica o texto de novo.
+    """
+    def __init__(self, examples: List[Tuple[str, str]], min_confidence: float = DEFAULT_MIN_CONFIDENCE,
+                 temperature: float = DEFAULT_TEMPERATURE):
+        self.examples = examples
+        self.min_confidence = min_confidence
+        self.temperature = temperature
+        self.intents: List[str] = []
+        self.centroids: Optional[np.ndarray] = None
+        self._lock = threading.Lock()
+        self._fit_lock = threading.Lock()
+        self.routed = {intent: 0 for intent in INTENTS}
+        self.fallbacks = 0
+        self.local_seconds = 0.0
+        self.llm_calls = 0
+        self.llm_seconds = 0.0
+
+    @property
+    def trained(self) -> bool:
+        return self.centroids is not None
+
+    def fit(self, encode: Encoder) -> "IntentRouter":
+        """Calcula os centroides a partir dos exemplos (um encode em lote)."""
+        labels = np.array([intent for _, intent in self.examples])
+        embeddings = _normalize(encode([text for text, _ in self.examples]))
+        intents = [intent for intent in INTENTS if intent in labels]
+        centroids = _normalize(np.stack([embeddings[labels == intent].mean(axis=0) for intent in intents]))
+        with self._lock:
+            self.intents, self.centroids = intents, centroids
+        return self
+
+    def ensure_fitted(self, encode: Encoder) -> "IntentRouter":
+        # Treino preguiçoso, uma vez só mesmo com várias requisições chegando juntas
+        if self.centroids is None:
+            with self._fit_lock:
+                if self.centroids is None:
+                    self.fit(encode)
+        return self
+
+    def predict(self, embeddings: np.ndarray) -> Tuple[List[str], np.ndarray]:
+        """(intenções, confianças) para cada linha de embeddings."""
+        logits = _normalize(embeddings) @ self.centroids.T / self.temperature
+        probs = np.exp(logits - logits.max(axis=1, keepdims=True))
+        probs /= probs.sum(axis=1, keepdims=True)
+        best = probs.argmax(axis=1)
+        return [self.intents[i] for i in best], probs[np.arange(len(best)), best]
+
+    def route(self, text: str, encode: Encoder) -> Optional[str]:
+        """Intenção da pergunta, ou None quando a confiança fica abaixo de min_confidence."""
+        start = time.perf_counter()
+        intents, confidences = self.predict(encode([text]))
+        intent, confidence = intents[0], float(confidences[0])
+        with self._lock:
+            self.local_seconds += time.perf_counter() - start
+            if confidence < self.min_confidence:
+                self.fallbacks += 1
+                return None
+            self.routed[intent] += 1
+        return intent
+
+    def record_llm(self, seconds: float):
+        """Tempo de uma decisão tomada pelo LLM (fallback), para estimar a latência poupada."""
+        with self._lock:
+            self.llm_calls += 1
+            self.llm_seconds += seconds
+
+    def stats(self) -> Dict:
+        with self._lock:
+            local = sum(self.routed.values())
+            requests = local + self.fallbacks
+            local_ms = self.local_seconds / requests * 1000 if requests else None
+            llm_ms = self.llm_seconds / self.llm_calls * 1000 if self.llm_calls else None
+            # Toda requisição paga o roteador local; só as decididas por ele deixam de pagar o LLM
+            saved_ms = llm_ms * local / requests - local_ms if requests and llm_ms is not None else None
+            return {
+                "trained": self.centroids is not None,
+                "examples": len(self.examples),
+                "min_confidence": self.min_confidence,
+                "routed_locally": dict(self.routed),
+                "llm_fallbacks": self.fallbacks,
+                "local_ms": round(local_ms, 2) if local_ms is not None else None,
+                "llm_ms": round(llm_ms, 1) if llm_ms is not None else None,
+                "saved_ms_per_request": round(saved_ms, 1) if saved_ms is not None else None,
+            }
+
+def cross_validate(examples: List[Tuple[str, str]], embeddings: np.ndarray,
+                   temperature: float = DEFAULT_TEMPERATURE) -> Tuple[List[str], np.ndarray]:
+    """
+    Leave-one-out: cada exemplo classificado por centroides calculados sem ele. Retorna as
+    intenções previstas e as confianças, para medir acurácia e cobertura por threshold.
+    """
+    labels = np.array([intent for _, intent in examples])
+    embeddings = _normalize(embeddings)
+    intents = [intent for intent in INTENTS if intent in labels]
+    sums = {intent: embeddings[labels == intent].sum(axis=0) for intent in intents}
+    counts = {intent: int((labels == intent).sum()) for intent in intents}
+    predicted, confidences = [], np.zeros(len(examples), dtype=np.float32)
+    for i, label in enumerate(labels):
+        centroids = np.stack([
+            (sums[intent] - embeddings[i]) / max(counts[intent] - 1, 1) if intent == label
+            else sums[intent] / counts[intent]
+            for intent in intents
+        ])
+        router = IntentRouter([], temperature=temperature)
+        router.intents, router.centroids = intents, _normalize(centroids)
+        intent, confidence = router.predict(embeddings[i])
+        predicted.append(intent[0])
+        confidences[i] = confidence[0]
+    return predicted, confidences
@@ -0,0 +1,97 @@
+import os
+import resource
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+from agents.embedding_backends import load_embedding_backend
+
+def current_rss_mb() -> float:
+    """RSS atual do processo (Linux: /proc/self/statm); em outros sistemas, o pico (ru_maxrss)."""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def model_size_mb(model) -> Optional[float]:
+    """Tamanho dos pesos: parâmetros do torch ou o arquivo .onnx carregado."""
+    inner = getattr(model, "model", None)
+    if inner is not None and hasattr(inner, "parameters"):
+        return sum(p.numel() * p.element_size() for p in inner.parameters()) / (1024 * 1024)
+    path = getattr(model, "model_path", None)
+    return os.path.getsize(path) / (1024 * 1024) if path and os.path.exists(path) else None
+
+# --- Registro de modelos do processo ---
+class ModelRegistry:
+    """
+    Um modelo de embeddings por (nome, backend, onnx_dir) no processo inteiro: carregado na
+    primeira acquire (não no import) e compartilhado por agentes, scrapers e ferramentas.
+    Cada acquire conta uma referência; release devolve, e o modelo é descartado quando a
+    contagem zera (keep=True o mantém carregado para o próximo uso).
+    """
+    def __init__(self):
+        self._entries: Dict[Tuple, Dict] = {}
+        self._lock = threading.Lock()
+        self._key_locks: Dict[Tuple, threading.Lock] = {}
+
+    @staticmethod
+    def _key(model_name: str, backend: str, onnx_dir: Optional[str]) -> Tuple:
+        return (model_name, backend, os.path.abspath(onnx_dir) if onnx_dir else None)
+
+    def _key_lock(self, key: Tuple) -> threading.Lock:
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def acquire(self, model_name: str, backend: str = "torch", onnx_dir: Optional[str] = None):
+        key = self._key(model_name, backend, onnx_dir)
+        # Lock por modelo: duas threads pedindo o mesmo modelo carregam uma vez; modelos diferentes em paralelo
+        with self._key_lock(key):
+            entry = self._entries.get(key)
+            if entry is None:
+                rss_before = current_rss_mb()
+                start = time.perf_counter()
+                model = load_embedding_backend(model_name, backend, onnx_dir=onnx_dir)
+                entry = {
+                    "model": model,
+                    "refs": 0,
+                    "load_seconds": round(time.perf_counter() - start, 2),
+                    "rss_delta_mb": round(current_rss_mb() - rss_before, 1),
+                    "weights_mb": model_size_mb(model),
+                }
+                with self._lock:
+                    self._entries[key] = entry
+                print(f"[Modelos] '{model_name}' ({backend}) carregado em {entry['load_seconds']}s, "
+                      f"+{entry['rss_delta_mb']} MB de RSS")
+            entry["refs"] += 1
+            return entry["model"]
+
+    def release(self, model_name: str, backend: str = "torch", onnx_dir: Optional[str] = None, keep: bool = False):
+        key = self._key(model_name, backend, onnx_dir)
+        with self._key_lock(key):
+            entry = self._entries.get(key)
+            if entry is None:
+                return
+            entry["refs"] = max(0, entry["refs"] - 1)
+            if entry["refs"] == 0 and not keep:
+                with self._lock:
+                    del self._entries[key]
+
+    def stats(self) -> List[Dict]:
+        with self._lock:
+            return [
+                {
+                    "model": key[0],
+                    "backend": key[1],
+                    "refs": entry["refs"],
+                    "load_seconds": entry["load_seconds"],
+                    "rss_delta_mb": entry["rss_delta_mb"],
+                    "weights_mb": round(entry["weights_mb"], 1) if entry["weights_mb"] is not None else None,
+                }
+                for key, entry in self._entries.items()
+            ]
+
+model_registry = ModelRegistry()
+
+def get_model(model_name: str, backend: str = "torch", onnx_dir: Optional[str] = None):
+    """Atalho para scripts: o modelo compartilhado do processo (conta uma referência)."""
+    return model_registry.acquire(model_name, backend, onnx_dir)
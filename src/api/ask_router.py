@@ -1,34 +1,39 @@
 # src/api/ask_router.py
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
-from typing import Literal
+from typing import Literal, Optional
+import time
 from api.reflector_agent import decidir_fluxo
-from api.qa_endpoint import ask_qa
-from api.qb_agent import ask_qb
+from api.qa_endpoint import ask_qa, qa_messages
+from api.qb_agent import SearchFilters, answer_qb, qb_stream_response
+from api.streaming import sse_response, stream_answer
 
 router = APIRouter()
 
 class Question(BaseModel):
     text: str
+    filters: Optional[SearchFilters] = None
 
 class Answer(BaseModel):
     answer: str
     sources: list[str] = []
     scores: list[float] = []
+    cached: bool = False
 
 @router.post("/ask", response_model=Answer)
 async def ask_router(question: Question):
     try:
-        fluxo = decidir_fluxo(question.text)
+        fluxo = await decidir_fluxo(question.text)
 
         if fluxo == "QA":
             return await ask_qa(question)
         elif fluxo == "QB":
-            return await ask_qb(question)
+            return await answer_qb(question, threshold=0.4)
         elif fluxo == "COLLAB":
             interpretacao = await ask_qa(question)
             print(f"[COLLAB] Pergunta gerada pelo QA: {interpretacao.answer}")
-            resposta_final = await ask_qb(Question(text=interpretacao.answer))
+            resposta_final = await answer_qb(Question(text=interpretacao.answer, filters=question.filters),
+                                            threshold=0.4)
             print(f"[COLLAB] Resposta final do QB: {resposta_final.answer}")
             return resposta_final
 
@@ -38,5 +43,34 @@ async def ask_router(question: Question):
 
         return await ask_qa(question)
 
+    except ValueError as e:
+        # Filtro inválido (ex.: data em formato desconhecido), como no /qb/ask
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/ask/stream")
+async def ask_router_stream(question: Question):
+    """Mesmo roteamento do /ask, com a resposta em server-sent events (ver api/streaming.py)."""
+    started = time.perf_counter()
+    try:
+        fluxo = await decidir_fluxo(question.text)
+
+        if fluxo in ("QB", "COLLAB"):
+            if fluxo == "COLLAB":
+                # A reformulação do QA precisa estar completa antes da busca; só a resposta final é transmitida
+                interpretacao = await ask_qa(question)
+                print(f"[COLLAB] Pergunta gerada pelo QA: {interpretacao.answer}")
+                question = Question(text=interpretacao.answer, filters=question.filters)
+            return await qb_stream_response(question, 0.4, started)
+
+        if fluxo == "TESTE":
+            question = Question(text=f"Gere perguntas de exemplo com base nos documentos disponíveis. {question.text}")
+        return sse_response(stream_answer(qa_messages(question), started,
+                                          model="llama3-8b-8192", temperature=0.5, max_tokens=300))
+
+    except ValueError as e:
+        # Filtro inválido (ex.: data em formato desconhecido), como no /qb/ask
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
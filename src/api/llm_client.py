@@ -0,0 +1,241 @@
+import asyncio
+import json
+import os
+import random
+import time
+from typing import AsyncIterator, Dict, List, Optional
+import httpx
+from dotenv import load_dotenv
+
+load_dotenv()
+
+DEFAULT_MODEL = "llama3-8b-8192"
+DEFAULT_TIMEOUT = 20.0
+DEFAULT_BUDGET = 45.0
+DEFAULT_RETRIES = 2
+DEFAULT_MAX_CONNECTIONS = 32
+RETRYABLE_STATUS = (408, 409, 429, 500, 502, 503, 504)
+
+# --- Provedores ---
+# Cada provedor recebe o httpx.AsyncClient compartilhado (pool de conexões com keep-alive)
+# e implementa complete(messages, model, temperature, max_tokens, timeout) -> texto e
+# stream(...) -> trechos do texto conforme são gerados.
+
+class LLMProvider:
+    name = "base"
+
+    def __init__(self, http_client: httpx.AsyncClient, api_key: Optional[str] = None, base_url: Optional[str] = None):
+        self.http_client = http_client
+        self.api_key = api_key
+        self.base_url = base_url
+
+    async def complete(self, messages: List[Dict], model: str, temperature: float, max_tokens: int,
+                       timeout: float) -> str:
+        raise NotImplementedError
+
+    async def stream(self, messages: List[Dict], model: str, temperature: float, max_tokens: int,
+                     timeout: float) -> AsyncIterator[str]:
+        # Provedor sem streaming: a resposta inteira vira um único trecho
+        yield await self.complete(messages, model, temperature, max_tokens, timeout)
+
+    def is_retryable(self, error: Exception) -> bool:
+        return isinstance(error, (asyncio.TimeoutError, httpx.TransportError)) or (
+            isinstance(error, httpx.HTTPStatusError) and error.response.status_code in RETRYABLE_STATUS)
+
+class GroqProvider(LLMProvider):
+    """SDK oficial (AsyncGroq) sobre o pool compartilhado; as retentativas do SDK ficam desligadas."""
+    name = "groq"
+
+    def __init__(self, http_client: httpx.AsyncClient, api_key: Optional[str] = None, base_url: Optional[str] = None):
+        super().__init__(http_client, api_key, base_url)
+        from groq import AsyncGroq
+        self.client = AsyncGroq(api_key=api_key, base_url=base_url, http_client=http_client, max_retries=0)
+
+    async def complete(self, messages, model, temperature, max_tokens, timeout):
+        response = await self.client.chat.completions.create(
+            messages=messages, model=model, temperature=temperature, max_tokens=max_tokens, timeout=timeout
+        )
+        return response.choices[0].message.content
+
+    async def stream(self, messages, model, temperature, max_tokens, timeout):
+        response = await self.client.chat.completions.create(
+            messages=messages, model=model, temperature=temperature, max_tokens=max_tokens, timeout=timeout,
+            stream=True,
+        )
+        async for chunk in response:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+    def is_retryable(self, error):
+        import groq
+        if isinstance(error, (groq.APIConnectionError, groq.RateLimitError, groq.InternalServerError)):
+            return True
+        if isinstance(error, groq.APIStatusError):
+            return error.status_code in RETRYABLE_STATUS
+        return super().is_retryable(error)
+
+class OpenAICompatibleProvider(LLMProvider):
+    """
+    Qualquer servidor com POST {base_url}/chat/completions no formato da OpenAI: vLLM, Ollama,
+    ou o stub local de testes e benchmarks (benchmarks/llm_stub_server.py).
+    """
+    name = "openai"
+
+    def _request(self, messages, model, temperature, max_tokens, stream: bool = False):
+        headers = {"Authorization": f"Bearer {self.api_key}"} if self.api_key else {}
+        body = {"model": model, "messages": messages, "temperature": temperature, "max_tokens": max_tokens}
+        if stream:
+            body["stream"] = True
+        return f"{self.base_url.rstrip('/')}/chat/completions", headers, body
+
+    async def complete(self, messages, model, temperature, max_tokens, timeout):
+        url, headers, body = self._request(messages, model, temperature, max_tokens)
+        response = await self.http_client.post(url, headers=headers, json=body, timeout=timeout)
+        response.raise_for_status()
+        return response.json()["choices"][0]["message"]["content"]
+
+    async def stream(self, messages, model, temperature, max_tokens, timeout):
+        url, headers, body = self._request(messages, model, temperature, max_tokens, stream=True)
+        async with self.http_client.stream("POST", url, headers=headers, json=body, timeout=timeout) as response:
+            response.raise_for_status()
+            # Server-sent events: uma linha "data: {chunk}" por trecho, terminando em "data: [DONE]"
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    break
+                choices = json.loads(data).get("choices") or [{}]
+                content = choices[0].get("delta", {}).get("content")
+                if content:
+                    yield content
+
+PROVIDERS = {provider.name: provider for provider in (GroqProvider, OpenAICompatibleProvider)}
+
+# --- Cliente da aplicação ---
+class LLMClient:
+    """
+    Cliente único do processo para o LLM: um httpx.AsyncClient com pool de conexões e
+    keep-alive (o TLS é negociado uma vez e reaproveitado entre requisições), timeout por
+    chamada e retentativas com backoff exponencial e jitter ("full jitter") só para erros
+    transitórios (timeout, conexão, 429, 5xx), todas dentro de um orçamento de latência:
+    não começa uma tentativa que não caberia no tempo restante.
+    """
+    def __init__(self, provider: str = "groq", api_key: Optional[str] = None, base_url: Optional[str] = None,
+                 timeout: float = DEFAULT_TIMEOUT, budget: float = DEFAULT_BUDGET, retries: int = DEFAULT_RETRIES,
+                 backoff: float = 0.25, max_connections: int = DEFAULT_MAX_CONNECTIONS,
+                 http_client: Optional[httpx.AsyncClient] = None):
+        if provider not in PROVIDERS:
+            raise ValueError(f"Unknown LLM provider '{provider}'. Options: {', '.join(PROVIDERS)}")
+        self.timeout = timeout
+        self.budget = budget
+        self.retries = retries
+        self.backoff = backoff
+        self.http_client = http_client or httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections,
+                                keepalive_expiry=60.0),
+            timeout=timeout,
+        )
+        self.provider = PROVIDERS[provider](self.http_client, api_key=api_key, base_url=base_url)
+        self.calls = 0
+        self.retried = 0
+        self.failures = 0
+
+    @classmethod
+    def from_env(cls) -> "LLMClient":
+        """LUMIA_LLM_PROVIDER (groq | openai), LUMIA_LLM_BASE_URL, LUMIA_LLM_TIMEOUT, LUMIA_LLM_BUDGET e LUMIA_LLM_RETRIES."""
+        return cls(
+            provider=os.getenv("LUMIA_LLM_PROVIDER", "groq"),
+            api_key=os.getenv("LUMIA_LLM_API_KEY") or os.getenv("GROQ_API_KEY"),
+            base_url=os.getenv("LUMIA_LLM_BASE_URL"),
+            timeout=float(os.getenv("LUMIA_LLM_TIMEOUT", str(DEFAULT_TIMEOUT))),
+            budget=float(os.getenv("LUMIA_LLM_BUDGET", str(DEFAULT_BUDGET))),
+            retries=int(os.getenv("LUMIA_LLM_RETRIES", str(DEFAULT_RETRIES))),
+        )
+
+    async def _backoff(self, error: Exception, attempt: int, deadline: float, timeout: float):
+        """Espera antes da próxima tentativa ou relança o erro se não vale (ou não cabe) tentar de novo."""
+        delay = random.uniform(0, self.backoff * 2 ** attempt)
+        # Só tenta de novo se o erro é transitório e ainda sobra orçamento para uma tentativa útil
+        if (attempt >= self.retries or not self.provider.is_retryable(error)
+                or deadline - time.monotonic() - delay < min(timeout, 1.0)):
+            self.failures += 1
+            raise error
+        self.retried += 1
+        print(f"[LLM] {type(error).__name__} na tentativa {attempt + 1}; nova tentativa em {delay:.2f}s")
+        await asyncio.sleep(delay)
+
+    async def chat(self, messages: List[Dict], model: str = DEFAULT_MODEL, temperature: float = 0.0,
+                   max_tokens: int = 300, timeout: Optional[float] = None) -> str:
+        """Texto da resposta do LLM; levanta o último erro se as tentativas ou o orçamento acabarem."""
+        self.calls += 1
+        timeout = timeout or self.timeout
+        deadline = time.monotonic() + self.budget
+        attempt = 0
+        while True:
+            attempt_timeout = min(timeout, deadline - time.monotonic())
+            try:
+                return await asyncio.wait_for(
+                    self.provider.complete(messages, model, temperature, max_tokens, attempt_timeout),
+                    timeout=attempt_timeout,
+                )
+            except Exception as e:
+                await self._backoff(e, attempt, deadline, timeout)
+                attempt += 1
+
+    async def stream(self, messages: List[Dict], model: str = DEFAULT_MODEL, temperature: float = 0.0,
+                     max_tokens: int = 300, timeout: Optional[float] = None) -> AsyncIterator[str]:
+        """
+        Trechos da resposta conforme o LLM gera. Retenta só até o primeiro trecho (depois dele o
+        texto já foi entregue); o timeout vale para o primeiro trecho e para cada intervalo entre trechos.
+        """
+        self.calls += 1
+        timeout = timeout or self.timeout
+        deadline = time.monotonic() + self.budget
+        attempt = 0
+        while True:
+            attempt_timeout = min(timeout, deadline - time.monotonic())
+            chunks = self.provider.stream(messages, model, temperature, max_tokens, attempt_timeout)
+            try:
+                first = await asyncio.wait_for(chunks.__anext__(), timeout=attempt_timeout)
+                break
+            except StopAsyncIteration:
+                return
+            except Exception as e:
+                await chunks.aclose()
+                await self._backoff(e, attempt, deadline, timeout)
+                attempt += 1
+        try:
+            yield first
+            while True:
+                try:
+                    chunk = await asyncio.wait_for(chunks.__anext__(), timeout=timeout)
+                except StopAsyncIteration:
+                    return
+                yield chunk
+        except Exception:
+            self.failures += 1
+            raise
+        finally:
+            await chunks.aclose()
+
+    def stats(self) -> Dict:
+        return {"provider": self.provider.name, "calls": self.calls, "retries": self.retried, "failures": self.failures}
+
+    async def aclose(self):
+        await self.http_client.aclose()
+
+_llm_client: Optional[LLMClient] = None
+
+def get_llm_client() -> LLMClient:
+    """O cliente compartilhado da aplicação, criado no primeiro uso (já dentro do event loop)."""
+    global _llm_client
+    if _llm_client is None:
+        _llm_client = LLMClient.from_env()
+    return _llm_client
+
+async def close_llm_client():
+    global _llm_client
+    if _llm_client is not None:
+        await _llm_client.aclose()
+        _llm_client = None
@@ -1,21 +1,27 @@
 from fastapi import APIRouter, HTTPException, Query
 from pydantic import BaseModel
-from groq import Groq
-import os
-from api.qb_agent import ask_qb
+from typing import Optional
+from api.llm_client import get_llm_client
+from api.qb_agent import SearchFilters, answer_qb, route_intent
 from api.qa_endpoint import ask_qa
 
 router = APIRouter()
 
 class Question(BaseModel):
     text: str
+    filters: Optional[SearchFilters] = None
 
 class Answer(BaseModel):
     answer: str
     sources: list[str]
     scores: list[float]
+    cached: bool = False
 
-def classificar_pergunta(pergunta: str) -> str:
+async def classificar_pergunta(pergunta: str) -> str:
+    # Mesmo roteador local do /ask: QA e TESTE são respondidos pelo QA, QB e COLLAB dependem dos documentos
+    fluxo = await route_intent(pergunta)
+    if fluxo is not None:
+        return "qa" if fluxo in ("QA", "TESTE") else "qb"
     prompt = f"""
 Você é um classificador de intenções. Receba uma pergunta de um usuário universitário e responda apenas com 'qa' ou 'qb'.
 
@@ -26,23 +32,25 @@ Pergunta: "{pergunta}"
 Classificação:
 """.strip()
 
-    groq_client = Groq(api_key=os.getenv("GROQ_API_KEY"))
-    response = groq_client.chat.completions.create(
-        messages=[{"role": "user", "content": prompt}],
+    resposta = await get_llm_client().chat(
+        [{"role": "user", "content": prompt}],
         model="llama3-8b-8192",
         temperature=0,
         max_tokens=3
     )
-    resposta = response.choices[0].message.content.strip().lower()
+    resposta = resposta.strip().lower()
     return "qa" if "qa" in resposta else "qb"
 
 @router.post("/ask", response_model=Answer)
 async def ask(question: Question, threshold: float = Query(0.4, description="Threshold para busca QB")):
     try:
-        destino = classificar_pergunta(question.text)
+        destino = await classificar_pergunta(question.text)
         if destino == "qa":
             return await ask_qa(question)
         else:
-            return await ask_qb(question, threshold=threshold)
+            return await answer_qb(question, threshold=threshold)
+    except ValueError as e:
+        # Filtro inválido (ex.: data em formato desconhecido), como no /qb/ask
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -1,10 +1,7 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
-from groq import Groq
-import os
-from dotenv import load_dotenv
+from api.llm_client import get_llm_client
 
-load_dotenv()
 router = APIRouter(prefix="/qa")
 
 storytelling = """
@@ -27,23 +24,24 @@ class Answer(BaseModel):
     sources: list[str] = []
     scores: list[float] = []
 
-async def ask_qa(question: Question) -> Answer:
+def qa_messages(question: Question) -> list[dict]:
     prompt = f"""{storytelling} Responda de forma simpática e inteligente à seguinte pergunta:\n{question.text}\n\nResposta:"""
-    groq_client = Groq(api_key=os.getenv("GROQ_API_KEY"))
-    response = groq_client.chat.completions.create(
-        messages=[{"role": "user", "content": prompt}],
+    return [{"role": "user", "content": prompt}]
+
+async def ask_qa(question: Question) -> Answer:
+    answer = await get_llm_client().chat(
+        qa_messages(question),
         model="llama3-8b-8192",
         temperature=0.5,
         max_tokens=300
     )
-    answer = response.choices[0].message.content.strip()
+    answer = answer.strip()
     return Answer(answer=answer, sources=[], scores=[])
 
 @router.post("/ask", response_model=Answer)
 async def generic_answer(question: Question):
     try:
-        client = Groq(api_key=os.getenv("GROQ_API_KEY"))
-        response = client.chat.completions.create(
+        answer = await get_llm_client().chat(
             model="llama3-8b-8192",
             temperature=0.7,
             max_tokens=300,
@@ -67,6 +65,6 @@ async def generic_answer(question: Question):
                 }
             ]
         )
-        return Answer(answer=response.choices[0].message.content.strip())
+        return Answer(answer=answer.strip())
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -1,31 +1,188 @@
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, Header, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
-from typing import Optional
-from agents.agent_manager import AgentManager
-from groq import Groq
+from typing import List, Optional, Tuple
+from agents.agent_manager import AgentManager, filters_key
+from agents import answer_cache as answer_cache_defaults
+from agents.answer_cache import SemanticAnswerCache
+from agents.batcher import DEFAULT_MAX_BATCH, DEFAULT_MAX_WAIT
+from agents.embedding_cache import DEFAULT_MAX_SIZE, DEFAULT_TTL, QueryEmbeddingCache
+from agents.intent_router import DEFAULT_MIN_CONFIDENCE, EXAMPLES_PATH, IntentRouter, load_examples
+from agents.model_registry import model_registry
+from database.sharded_store import ShardedVectorStore
+from api.llm_client import get_llm_client
+from api.streaming import sse_response, stream_answer, stream_fixed_answer, streaming_stats
 from dotenv import load_dotenv
+import atexit
 import os
+import time
 
 router = APIRouter(prefix="/qb")
 
 load_dotenv()
 
+class SearchFilters(BaseModel):
+    """Restringe a busca antes do cálculo de similaridade; campos vazios não filtram."""
+    content_type: Optional[List[str]] = None  # ex.: ["pdf"] ou ["html"]
+    host: Optional[List[str]] = None  # ex.: ["www.ufpb.br", "sti.ufpb.br"]
+    path_prefix: Optional[str] = None  # ex.: "/inova"
+    crawled_after: Optional[str] = None  # data ISO, ex.: "2024-03-01"
+
 class Question(BaseModel):
     text: str
+    filters: Optional[SearchFilters] = None
 
 class Answer(BaseModel):
     answer: str
     sources: list[str]
     scores: list[float] = []
+    cached: bool = False  # resposta servida pelo cache semântico
+
+# LUMIA_HYBRID_SEARCH=0 desliga a fusão com o BM25 (só busca densa)
+HYBRID_SEARCH = os.getenv("LUMIA_HYBRID_SEARCH", "1") == "1"
+
+# Cache de embeddings de consulta. LUMIA_EMBED_CACHE_SIZE=0 desliga; LUMIA_EMBED_CACHE_FILE
+# pré-carrega as consultas frequentes na subida e é regravado ao encerrar o processo
+EMBED_CACHE_SIZE = int(os.getenv("LUMIA_EMBED_CACHE_SIZE", str(DEFAULT_MAX_SIZE)))
+EMBED_CACHE_FILE = os.getenv("LUMIA_EMBED_CACHE_FILE")
+embedding_cache = None
+if EMBED_CACHE_SIZE > 0:
+    embedding_cache = QueryEmbeddingCache(EMBED_CACHE_SIZE, ttl=float(os.getenv("LUMIA_EMBED_CACHE_TTL", str(DEFAULT_TTL))))
+    if EMBED_CACHE_FILE:
+        print(f"[QB] {embedding_cache.load(EMBED_CACHE_FILE)} embeddings de consulta pré-carregados")
+        atexit.register(embedding_cache.save, EMBED_CACHE_FILE)
+
+# Cache semântico de respostas: pergunta com cosseno >= LUMIA_ANSWER_CACHE_THRESHOLD com uma já
+# respondida (mesmo threshold e filtros) recebe a mesma resposta, sem busca nem LLM. Limitado por
+# LRU/TTL e esvaziado quando o índice muda de versão. LUMIA_ANSWER_CACHE_SIZE=0 desliga
+ANSWER_CACHE_SIZE = int(os.getenv("LUMIA_ANSWER_CACHE_SIZE", str(answer_cache_defaults.DEFAULT_MAX_SIZE)))
+answer_cache = None
+if ANSWER_CACHE_SIZE > 0:
+    answer_cache = SemanticAnswerCache(
+        ANSWER_CACHE_SIZE,
+        ttl=float(os.getenv("LUMIA_ANSWER_CACHE_TTL", str(answer_cache_defaults.DEFAULT_TTL))),
+        threshold=float(os.getenv("LUMIA_ANSWER_CACHE_THRESHOLD", str(answer_cache_defaults.DEFAULT_THRESHOLD))),
+    )
+
+# Micro-batching: requisições concorrentes esperam até LUMIA_BATCH_MAX_WAIT_MS para dividir um
+# encode e uma busca em lote de até LUMIA_BATCH_MAX_SIZE consultas (1 desliga)
+BATCH_MAX_SIZE = int(os.getenv("LUMIA_BATCH_MAX_SIZE", str(DEFAULT_MAX_BATCH)))
+BATCH_MAX_WAIT = float(os.getenv("LUMIA_BATCH_MAX_WAIT_MS", str(DEFAULT_MAX_WAIT * 1000))) / 1000
+# Threads do pool limitado de encode/busca (padrão: min(4, núcleos)); o event loop só espera por elas
+CPU_WORKERS = int(os.getenv("LUMIA_CPU_WORKERS")) if os.getenv("LUMIA_CPU_WORKERS") else None
 
 # Inicializa apenas com o agente qb
-agent_manager = AgentManager()
+agent_manager = AgentManager(embedding_cache=embedding_cache, batch_max_size=BATCH_MAX_SIZE,
+                             batch_max_wait=BATCH_MAX_WAIT, cpu_workers=CPU_WORKERS,
+                             # LUMIA_EMBEDDING_BACKEND=onnx: modelo int8 no onnxruntime (src/tools/export_onnx.py)
+                             embedding_backend=os.getenv("LUMIA_EMBEDDING_BACKEND", "torch"),
+                             onnx_dir=os.getenv("LUMIA_ONNX_DIR"))
 agent_manager.register_agent(
     name="qb",
     data_dir="data/",
     embedding_model='paraphrase-multilingual-MiniLM-L12-v2',
-    default=True
+    default=True,
+    # LUMIA_INDEX_MMAP=1: workers do uvicorn compartilham o índice via page cache
+    mmap=os.getenv("LUMIA_INDEX_MMAP", "0") == "1",
+    # Ajuste fino de índices ANN (IVF/HNSW); sem valor, vale o que o builder gravou no manifest
+    nprobe=int(os.getenv("LUMIA_FAISS_NPROBE")) if os.getenv("LUMIA_FAISS_NPROBE") else None,
+    ef_search=int(os.getenv("LUMIA_FAISS_EF_SEARCH")) if os.getenv("LUMIA_FAISS_EF_SEARCH") else None,
+    # Com data/shards.json: threads da busca paralela nos shards (padrão: min(shards, núcleos))
+    search_workers=int(os.getenv("LUMIA_SEARCH_WORKERS")) if os.getenv("LUMIA_SEARCH_WORKERS") else None
 )
+# LUMIA_RELOAD_INTERVAL=N: verifica data/CURRENT a cada N segundos e carrega snapshots novos
+if float(os.getenv("LUMIA_RELOAD_INTERVAL", "0")) > 0:
+    agent_manager.get_agent("qb").watch(float(os.getenv("LUMIA_RELOAD_INTERVAL")))
+# Roteamento local de intenção sobre o embedding da pergunta (agents/intent_router.py); abaixo de
+# LUMIA_INTENT_MIN_CONFIDENCE o LLM decide. LUMIA_INTENT_ROUTER=0 volta ao roteamento só pelo LLM
+intent_router = None
+if os.getenv("LUMIA_INTENT_ROUTER", "1") == "1":
+    intent_router = IntentRouter(load_examples(os.getenv("LUMIA_INTENT_EXAMPLES", EXAMPLES_PATH)),
+                                 min_confidence=float(os.getenv("LUMIA_INTENT_MIN_CONFIDENCE", str(DEFAULT_MIN_CONFIDENCE))))
+# Sem LUMIA_ADMIN_TOKEN, as rotas /admin ficam desativadas
+ADMIN_TOKEN = os.getenv("LUMIA_ADMIN_TOKEN")
+
+class ReloadRequest(BaseModel):
+    version: Optional[str] = None  # sem versão, carrega a apontada por data/CURRENT
+
+NO_DOCS_ANSWER = "Nenhum documento relevante encontrado."
+
+async def route_intent(text: str) -> Optional[str]:
+    """
+    QA / QB / COLLAB / TESTE pelo roteador local, ou None (desligado ou sem confiança: decide o LLM).
+    O embedding da pergunta passa pelo cache de consultas, então a busca do QB o reaproveita.
+    """
+    if intent_router is None:
+        return None
+    ag = agent_manager.get_agent("qb")
+    if not intent_router.trained:
+        # Exemplos codificados direto no modelo, sem ocupar o cache de consultas
+        await agent_manager.run_in_executor(intent_router.ensure_fitted,
+                                            lambda texts: ag.model.encode(texts, convert_to_numpy=True))
+    return await agent_manager.run_in_executor(intent_router.route, text, ag.get_embeddings)
+
+async def lookup_answer(question: Question, threshold: float = 0.4) -> Tuple[Optional[dict], Optional[tuple]]:
+    """
+    (resposta em cache ou None, chave para guardar a resposta nova com store_answer). O embedding
+    da pergunta passa pelo cache de consultas, então a busca seguinte não codifica o texto de novo.
+    """
+    if answer_cache is None:
+        return None, None
+    ag = agent_manager.get_agent("qb")
+    embedding = await agent_manager.run_in_executor(ag.get_embedding, question.text)
+    scope = f"{threshold}|{filters_key(getattr(question, 'filters', None))}"
+    # A versão é lida antes da busca: se o índice recarregar ou receber escritas no meio, a resposta não é guardada
+    cache_key = (embedding, scope, ag.content_version)
+    return answer_cache.get(*cache_key), cache_key
+
+def store_answer(cache_key: Optional[tuple], question: Question, answer: str, sources: List[str], scores: List[float]):
+    if cache_key is None or cache_key[2] != agent_manager.get_agent("qb").content_version:
+        return
+    answer_cache.put(*cache_key, question.text, answer, sources, scores)
+
+async def retrieve_qb(question: Question, threshold: float = 0.4) -> List[dict]:
+    ag = agent_manager.get_agent("qb")
+    # Fora do event loop; com o micro-batching, entra no lote das requisições concorrentes
+    return await ag.search_async(question.text, k=8, threshold=threshold, hybrid=HYBRID_SEARCH,
+                                 filters=getattr(question, "filters", None))
+
+def qb_messages(question: Question, relevant_docs: List[dict]) -> List[dict]:
+    context = "\n\n".join([
+    f"Fonte: {doc['url']}\n{doc['content'][:1000]}"  # Passagens já têm ~1000 caracteres; o corte protege docs antigos
+    for doc in relevant_docs
+])
+    prompt = f"""Com base no contexto abaixo, responda a pergunta em português.\nSe não houver contexto suficiente, diga isso claramente.\n\nContexto:\n{context}\n\nPergunta: {question.text}\n\nResposta:"""
+    return [{"role": "user", "content": prompt}]
+
+def qb_sources(relevant_docs: List[dict]):
+    sources = list(set(doc["url"].split('#')[0] for doc in relevant_docs))
+    scores = [doc.get("score", 0.0) for doc in relevant_docs]
+    return sources, scores
+
+async def answer_qb(question: Question, threshold: float = 0.4) -> Answer:
+    """
+    Resposta do QB (cache, busca e LLM). Para uso interno (/ask, orquestrador): chamar a rota
+    ask_qb direto passaria o Query(...) padrão no lugar do threshold. Filtro inválido levanta ValueError.
+    """
+    cached, cache_key = await lookup_answer(question, threshold)
+    if cached is not None:
+        return Answer(answer=cached["answer"], sources=cached["sources"], scores=cached["scores"], cached=True)
+
+    relevant_docs = await retrieve_qb(question, threshold)
+    if not relevant_docs:
+        return Answer(answer=NO_DOCS_ANSWER, sources=[], scores=[])
+
+    sources, scores = qb_sources(relevant_docs)
+    # Cliente compartilhado: conexão reaproveitada, timeout e retentativas dentro do orçamento
+    answer = await get_llm_client().chat(
+        qb_messages(question, relevant_docs),
+        model="llama3-8b-8192",
+        temperature=0.1,
+        max_tokens=500
+    )
+    answer = answer.strip()
+    store_answer(cache_key, question, answer, sources, scores)
+    return Answer(answer=answer, sources=sources, scores=scores)
 
 @router.post("/ask", response_model=Answer)
 async def ask_qb(
@@ -33,54 +190,108 @@ async def ask_qb(
     threshold: float = Query(0.4, description="Threshold de similaridade para busca de documentos")
 ):
     try:
-        ag = agent_manager.get_agent("qb")
-        query_embedding = ag.get_embedding(question.text)
-        relevant_docs = ag.vector_store.search(query_embedding, k=8)
+        return await answer_qb(question, threshold)
+    except ValueError as e:
+        # Filtro inválido (ex.: data em formato desconhecido)
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
-        sources = list(set(doc["url"].split('#')[0] for doc in relevant_docs))
-        context = "\n\n".join([
-    f"Fonte: {doc['url']}\n{doc['content'][:1000]}"  # 1000 caracteres ≈ 250 tokens por doc
-    for doc in relevant_docs
-])
-        scores = [doc.get("score", 0.0) for doc in relevant_docs]
-
-        if not relevant_docs:
-            return Answer(answer="Nenhum documento relevante encontrado.", sources=[], scores=[])
-
-        prompt = f"""Com base no contexto abaixo, responda a pergunta em português.\nSe não houver contexto suficiente, diga isso claramente.\n\nContexto:\n{context}\n\nPergunta: {question.text}\n\nResposta:"""
-        groq_client = Groq(api_key=os.getenv("GROQ_API_KEY"))
-        response = groq_client.chat.completions.create(
-            messages=[{"role": "user", "content": prompt}],
-            model="llama3-8b-8192",
-            temperature=0.1,
-            max_tokens=500
-        )
-        answer = response.choices[0].message.content.strip()
-        return Answer(answer=answer, sources=sources, scores=scores)
+def qb_answer_events(question: Question, relevant_docs: List[dict], started: float,
+                     cache_key: Optional[tuple] = None):
+    """Eventos SSE da resposta do QB para documentos já recuperados."""
+    if not relevant_docs:
+        return stream_fixed_answer(NO_DOCS_ANSWER, started)
+    sources, scores = qb_sources(relevant_docs)
+    return stream_answer(qb_messages(question, relevant_docs), started, sources, scores,
+                         on_done=lambda answer: store_answer(cache_key, question, answer, sources, scores),
+                         model="llama3-8b-8192", temperature=0.1, max_tokens=500)
+
+async def qb_stream_response(question: Question, threshold: float, started: float):
+    """
+    Cache de respostas e busca antes de abrir o stream (filtro inválido ainda vira ValueError/400);
+    uma resposta em cache sai inteira num só trecho, marcada com cached.
+    """
+    cached, cache_key = await lookup_answer(question, threshold)
+    if cached is not None:
+        return sse_response(stream_fixed_answer(cached["answer"], started, cached["sources"], cached["scores"],
+                                                cached=True))
+    relevant_docs = await retrieve_qb(question, threshold)
+    return sse_response(qb_answer_events(question, relevant_docs, started, cache_key))
 
+@router.post("/ask/stream")
+async def ask_qb_stream(
+    question: Question,
+    threshold: float = Query(0.4, description="Threshold de similaridade para busca de documentos")
+):
+    """
+    Mesma resposta do /qb/ask em server-sent events: fontes e scores assim que a busca termina,
+    depois os trechos do LLM conforme são gerados (ver api/streaming.py).
+    """
+    started = time.perf_counter()
+    try:
+        return await qb_stream_response(question, threshold, started)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def _document_previews(ag) -> List[dict]:
+    # Segura o store durante a varredura: uma recarga no meio não o fecha
+    with ag.acquire_store() as vector_store:
+        if isinstance(vector_store, ShardedVectorStore):
+            docs = vector_store.documents
+        else:
+            docs = vector_store.agent.documents if hasattr(vector_store, 'agent') else vector_store.index_agent.documents
+        # Uma entrada por documento de origem (a primeira passagem)
+        valid_docs = [doc for doc in docs if isinstance(doc, dict) and "url" in doc and "content" in doc and doc.get("passage", 0) == 0]
+        return [
+            {"url": doc["url"], "preview": doc["content"][:200]} for doc in valid_docs
+        ]
+
 @router.get("/documentos")
 async def list_documents_qb():
     ag = agent_manager.get_agent("qb")
-    docs = ag.vector_store.agent.documents if hasattr(ag.vector_store, 'agent') else ag.vector_store.index_agent.documents
-    valid_docs = [doc for doc in docs if isinstance(doc, dict) and "url" in doc and "content" in doc]
-    if not valid_docs:
+    # Varre (e decodifica) todo o acervo: no pool de CPU, não no event loop
+    previews = await agent_manager.run_in_executor(_document_previews, ag)
+    if not previews:
         raise HTTPException(status_code=404, detail="Nenhum documento encontrado para o agente QB.")
-    return [
-        {"url": doc["url"], "preview": doc["content"][:200]} for doc in valid_docs
-    ]
+    return previews
 
 @router.get("/health")
 async def health_check_qb():
-    return {"status": "healthy"}
+    ag = agent_manager.get_agent("qb")
+    return {
+        "status": "healthy",
+        "index_version": ag.index_version,
+        "compaction_error": getattr(ag.vector_store, "compaction_error", None),
+        "embedding_cache": embedding_cache.stats() if embedding_cache is not None else None,
+        "batcher": ag.batcher.stats() if ag.batcher is not None else None,
+        "models": model_registry.stats(),
+        "llm": get_llm_client().stats(),
+        "streaming": streaming_stats.stats(),
+        "intent_router": intent_router.stats() if intent_router is not None else None,
+        "answer_cache": answer_cache.stats() if answer_cache is not None else None,
+    }
+
+@router.post("/admin/reload")
+async def reload_qb(request: Optional[ReloadRequest] = None, x_admin_token: Optional[str] = Header(None)):
+    if not ADMIN_TOKEN or x_admin_token != ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Token de administração inválido.")
+    ag = agent_manager.get_agent("qb")
+    previous = ag.index_version
+    try:
+        # Carga e aquecimento numa thread: o event loop segue atendendo com o índice atual
+        version = await run_in_threadpool(ag.reload, request.version if request else None)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return {"previous_version": previous, "index_version": version}
 
 async def ask_qb_internal(question: Question, threshold: float = 0.4) -> Answer:
     ag = agent_manager.get_agent("qb")
-    query_embedding = ag.get_embedding(question.text)
-    relevant_docs = ag.vector_store.search(query_embedding, k=8)
+    relevant_docs = await ag.search_async(question.text, k=8, threshold=threshold, hybrid=HYBRID_SEARCH,
+                                          filters=getattr(question, "filters", None))
 
     if not relevant_docs:
         return Answer(answer="Nenhum documento relevante encontrado.", sources=[], scores=[])
@@ -90,13 +301,12 @@ async def ask_qb_internal(question: Question, threshold: float = 0.4) -> Answer:
     scores = [doc.get("score", 0.0) for doc in relevant_docs]
 
     prompt = f"""Com base no contexto abaixo, responda a pergunta em português.\nSe não houver contexto suficiente, diga isso claramente.\n\nContexto:\n{context}\n\nPergunta: {question.text}\n\nResposta:"""
-    groq_client = Groq(api_key=os.getenv("GROQ_API_KEY"))
-    response = groq_client.chat.completions.create(
-        messages=[{"role": "user", "content": prompt}],
+    answer = await get_llm_client().chat(
+        [{"role": "user", "content": prompt}],
         model="llama3-8b-8192",
         temperature=0.1,
         max_tokens=500
     )
-    answer = response.choices[0].message.content.strip()
+    answer = answer.strip()
     return Answer(answer=answer, sources=sources, scores=scores)
 
@@ -1,9 +1,6 @@
 # src/agents/reflector_agent.py
-from groq import Groq
-from dotenv import load_dotenv
-import os
-
-load_dotenv()
+import time
+from api.llm_client import get_llm_client
 
 ROUTING_PROMPT_TEMPLATE = """
 Usuário: "{question}"
@@ -17,14 +14,27 @@ Você é um roteador inteligente. Esta pergunta deve ser enviada para:
 Responda apenas com UMA dessas opções: QA / QB / COLLAB / TESTE.
 """
 
-def decidir_fluxo(pergunta: str) -> str:
+async def decidir_fluxo(pergunta: str) -> str:
+    # Roteador local primeiro (milissegundos); o LLM só decide quando ele não tem confiança.
+    # Import tardio: decidir_fluxo_llm pode ser usado sem carregar os agentes
+    from api.qb_agent import intent_router, route_intent
+    fluxo = await route_intent(pergunta)
+    if fluxo is not None:
+        return fluxo
+    start = time.perf_counter()
+    fluxo = await decidir_fluxo_llm(pergunta)
+    if intent_router is not None:
+        intent_router.record_llm(time.perf_counter() - start)
+    return fluxo
+
+async def decidir_fluxo_llm(pergunta: str) -> str:
     prompt = ROUTING_PROMPT_TEMPLATE.format(question=pergunta)
-    client = Groq(api_key=os.getenv("GROQ_API_KEY"))
-    response = client.chat.completions.create(
+    # Cliente compartilhado (assíncrono, com pool de conexões): o event loop segue atendendo
+    resposta = await get_llm_client().chat(
+        [{"role": "user", "content": prompt}],
         model="llama3-8b-8192",
         temperature=0,
         max_tokens=5,
-        messages=[{"role": "user", "content": prompt}]
     )
-    resposta = response.choices[0].message.content.strip().upper()
+    resposta = resposta.strip().upper()
     return resposta if resposta in ["QA", "QB", "COLLAB", "TESTE"] else "QA"
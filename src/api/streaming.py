@@ -0,0 +1,94 @@
+import json
+import time
+from collections import deque
+from typing import AsyncIterator, Callable, Dict, List, Optional
+import numpy as np
+from fastapi.responses import StreamingResponse
+from api.llm_client import get_llm_client
+
+# --- Server-sent events ---
+# Ordem dos eventos de uma resposta em streaming:
+#   sources  {"sources", "scores", "retrieval_ms", "cached"}   assim que a busca termina
+#   token    {"text"}                                          um por trecho gerado pelo LLM
+#   done     {"answer", "ttft_ms", "total_ms", "cached"}       resposta completa e tempos da requisição
+#   error    {"detail"}                                        falha depois que o streaming começou
+
+# Sem cache nem buffer de proxy (nginx), senão os trechos chegam todos juntos no fim
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+def sse_event(event: str, data: Dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+def sse_response(events: AsyncIterator[str]) -> StreamingResponse:
+    return StreamingResponse(events, media_type="text/event-stream", headers=SSE_HEADERS)
+
+def elapsed_ms(started: float) -> float:
+    return round((time.perf_counter() - started) * 1000, 1)
+
+# --- Time-to-first-token ---
+class StreamingStats:
+    """Janela das últimas respostas em streaming: tempo até o primeiro trecho e até o fim."""
+    def __init__(self, window: int = 1000):
+        self.ttft = deque(maxlen=window)
+        self.total = deque(maxlen=window)
+        self.requests = 0
+        self.errors = 0
+
+    def record(self, ttft_ms: Optional[float], total_ms: float):
+        self.requests += 1
+        if ttft_ms is not None:
+            self.ttft.append(ttft_ms)
+        self.total.append(total_ms)
+
+    def stats(self) -> Dict:
+        def percentile(values, q):
+            return round(float(np.percentile(values, q)), 1) if values else None
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "ttft_p50_ms": percentile(self.ttft, 50),
+            "ttft_p95_ms": percentile(self.ttft, 95),
+            "total_p50_ms": percentile(self.total, 50),
+            "total_p95_ms": percentile(self.total, 95),
+        }
+
+streaming_stats = StreamingStats()
+
+async def stream_answer(messages: List[Dict], started: float, sources: Optional[List[str]] = None,
+                        scores: Optional[List[float]] = None, on_done: Optional[Callable[[str], None]] = None,
+                        **llm_kwargs) -> AsyncIterator[str]:
+    """
+    Eventos SSE de uma resposta: as fontes primeiro (a busca já terminou), depois os trechos do
+    LLM conforme chegam e, no fim, a resposta completa com o TTFT medido desde `started`.
+    on_done recebe a resposta completa (ex.: para o cache de respostas); não é chamado se o LLM falhar.
+    """
+    yield sse_event("sources", {"sources": sources or [], "scores": scores or [],
+                                "retrieval_ms": elapsed_ms(started), "cached": False})
+    answer, ttft_ms = [], None
+    try:
+        async for text in get_llm_client().stream(messages, **llm_kwargs):
+            if ttft_ms is None:
+                ttft_ms = elapsed_ms(started)
+            answer.append(text)
+            yield sse_event("token", {"text": text})
+    except Exception as e:
+        # O status 200 já foi enviado: o erro vai como evento
+        streaming_stats.errors += 1
+        yield sse_event("error", {"detail": str(e) or type(e).__name__})
+        return
+    total_ms = elapsed_ms(started)
+    streaming_stats.record(ttft_ms, total_ms)
+    print(f"[STREAM] primeiro trecho em {ttft_ms}ms, resposta completa em {total_ms}ms")
+    answer = "".join(answer).strip()
+    if on_done is not None:
+        on_done(answer)
+    yield sse_event("done", {"answer": answer, "ttft_ms": ttft_ms, "total_ms": total_ms, "cached": False})
+
+async def stream_fixed_answer(answer: str, started: float, sources: Optional[List[str]] = None,
+                              scores: Optional[List[float]] = None, cached: bool = False) -> AsyncIterator[str]:
+    """Resposta pronta (sem LLM: sem documentos ou vinda do cache) no mesmo formato de eventos."""
+    yield sse_event("sources", {"sources": sources or [], "scores": scores or [],
+                                "retrieval_ms": elapsed_ms(started), "cached": cached})
+    yield sse_event("token", {"text": answer})
+    yield sse_event("done", {"answer": answer, "ttft_ms": elapsed_ms(started), "total_ms": elapsed_ms(started),
+                             "cached": cached})
@@ -0,0 +1,125 @@
+import os
+import shutil
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+import numpy as np
+from database.content_store import content_dir, open_documents, write_content_store
+from database.document_registry import load_registry, registry_path
+from database.faiss_index import (
+    build_index, index_metric, read_index, read_manifest, reconstruct_vectors, set_search_params, write_index, write_manifest
+)
+from database.lexical_index import build_lexical_index, lexical_index_path, load_lexical_index
+from database.metadata_filters import attributes_path, load_attributes
+from database.quantization import codes_dir
+from database.segment_store import MANIFEST_NAME, SEGMENTS_DIR, SegmentedEmbeddingStore
+
+FAISS_INDEX_NAME = "faiss.index"
+
+def dir_size_mb(path: str) -> float:
+    if os.path.isfile(path):
+        return os.path.getsize(path) / (1024 * 1024)
+    total = 0
+    for root, _, files in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(root, name)) for name in files)
+    return total / (1024 * 1024)
+
+def index_size_mb(data_dir: str) -> float:
+    """Tamanho em disco de tudo que é indexado por linha (documentos, vetores, BM25, atributos, FAISS)."""
+    paths = [content_dir(data_dir), os.path.join(data_dir, SEGMENTS_DIR), os.path.join(data_dir, FAISS_INDEX_NAME),
+             lexical_index_path(data_dir), attributes_path(data_dir), registry_path(data_dir)]
+    return sum(dir_size_mb(path) for path in paths if os.path.exists(path))
+
+def _swap_dir(tmp_dir: str, target: str):
+    """Troca target por tmp_dir; quem ainda tem os arquivos antigos mapeados continua lendo-os."""
+    old_dir = target + ".old"
+    shutil.rmtree(old_dir, ignore_errors=True)
+    if os.path.exists(target):
+        os.rename(target, old_dir)
+    os.rename(tmp_dir, target)
+    shutil.rmtree(old_dir, ignore_errors=True)
+
+def rewrite_segments(data_dir: str, rows: np.ndarray) -> SegmentedEmbeddingStore:
+    store = SegmentedEmbeddingStore.open(data_dir, mmap=True)
+    compacted = SegmentedEmbeddingStore(dim=store.dim, dtype=store.dtype, normalized=store.normalized)
+    compacted.append(store.take(rows))
+    target = os.path.join(data_dir, SEGMENTS_DIR)
+    tmp_dir = target + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    compacted.save(tmp_dir)
+    _swap_dir(tmp_dir, target)
+    legacy_path = os.path.join(data_dir, "embeddings.npy")
+    if os.path.exists(legacy_path):
+        # segments/ tem precedência; o legado desalinhado não deve ser usado como fallback
+        os.remove(legacy_path)
+    return compacted
+
+def rebuild_faiss(data_dir: str, embeddings: np.ndarray, metric: str = "l2"):
+    """
+    Reconstrói o faiss.index com o tipo e os parâmetros do faiss_manifest.json; sem manifest,
+    um índice flat com a métrica dada (a do índice antigo).
+    """
+    manifest = read_manifest(data_dir)
+    index = build_index(embeddings, manifest.get("index_type", "flat"), manifest.get("metric", metric),
+                        **manifest.get("params", {}))
+    set_search_params(index, nprobe=manifest.get("nprobe"), ef_search=manifest.get("ef_search"))
+    write_index(index, os.path.join(data_dir, FAISS_INDEX_NAME))
+    if manifest:
+        manifest.update(count=int(embeddings.shape[0]), built_at=datetime.now().isoformat())
+        write_manifest(data_dir, manifest)
+
+def index_vectors(data_dir: str, count: int) -> Optional[Tuple[np.ndarray, str]]:
+    """
+    (vetores, métrica) reconstruídos do faiss.index, para diretórios sem segments/ nem
+    embeddings.npy (só o índice guarda os vetores); None se não há faiss.index.
+    """
+    faiss_path = os.path.join(data_dir, FAISS_INDEX_NAME)
+    if not os.path.exists(faiss_path):
+        return None
+    index = read_index(faiss_path, binary=read_manifest(data_dir).get("index_type") == "binary")
+    if index.ntotal != count:
+        raise ValueError("FAISS index and documents are misaligned; refusing to compact")
+    vectors = reconstruct_vectors(index)
+    if vectors is None:
+        raise ValueError("FAISS index cannot reconstruct its vectors and there are no embeddings on disk; "
+                         "refusing to compact (rebuild the index with build_faiss_index.py)")
+    return vectors, index_metric(index)
+
+def compact_data_dir(data_dir: str, rows: np.ndarray, documents=None) -> Dict:
+    """
+    Regrava o diretório de dados só com as linhas dadas (crescentes): content/, segments/,
+    bm25.npz, attributes.npz, registry.npz (IDs preservados) e faiss.index. Sem segments/,
+    o faiss.index é reconstruído com os vetores dele mesmo (reconstruct_n). Tudo é validado
+    antes da primeira escrita: um diretório que não pode ser compactado inteiro não é tocado.
+    Cada arquivo é trocado atomicamente, então leitores abertos seguem íntegros até recarregar.
+    Retorna o tamanho em disco antes e depois, em MB.
+    """
+    documents = open_documents(data_dir) if documents is None else documents
+    rows = np.asarray(rows, dtype=np.int64)
+    size_before = index_size_mb(data_dir)
+    has_vectors = os.path.exists(os.path.join(data_dir, SEGMENTS_DIR, MANIFEST_NAME)) \
+        or os.path.exists(os.path.join(data_dir, "embeddings.npy"))
+    if has_vectors and len(SegmentedEmbeddingStore.open(data_dir, mmap=True)) != len(documents):
+        raise ValueError("Embeddings and documents are misaligned; refusing to compact")
+    from_index = None if has_vectors else index_vectors(data_dir, len(documents))
+
+    lexical = load_lexical_index(data_dir, len(documents))
+    attributes = load_attributes(data_dir, documents)
+    registry = load_registry(data_dir, documents)
+    write_content_store(content_dir(data_dir), (documents[int(i)] for i in rows))
+    if lexical is not None:
+        lexical.subset(rows).save(lexical_index_path(data_dir))
+    else:
+        build_lexical_index(open_documents(data_dir)).save(lexical_index_path(data_dir))
+    attributes.subset(rows).save(attributes_path(data_dir))
+    registry.subset(rows).save(registry_path(data_dir))
+    if has_vectors:
+        compacted = rewrite_segments(data_dir, rows)
+        if len(rows) and os.path.exists(os.path.join(data_dir, FAISS_INDEX_NAME)):
+            rebuild_faiss(data_dir, np.ascontiguousarray(compacted.to_array(), dtype=np.float32))
+    elif from_index is not None and len(rows):
+        vectors, metric = from_index
+        rebuild_faiss(data_dir, vectors[rows], metric)
+    # Códigos quantizados ficaram desalinhados: são recalculados no próximo save do IndexAgent
+    for quantization in ("int8", "binary"):
+        shutil.rmtree(codes_dir(data_dir, quantization), ignore_errors=True)
+    return {"size_before_mb": round(size_before, 2), "size_after_mb": round(index_size_mb(data_dir), 2)}
@@ -0,0 +1,210 @@
+import json
+import mmap
+import os
+import shutil
+from typing import Dict, Iterable, Iterator, List, Union
+import numpy as np
+
+CONTENT_DIR = "content"
+DATA_NAME = "content.bin"
+OFFSETS_NAME = "offsets.bin"
+DOCUMENTS_JSON = "documents.json"
+
+# Offset final de cada registro (o início é o fim do anterior): largura fixa de 8 bytes
+_OFFSET_DTYPE = np.dtype("<u8")
+
+# --- Store de conteúdo (append-only) ---
+class ContentStore:
+    """
+    Documentos em dois arquivos: content.bin (registros "url\\njson" concatenados, só cresce)
+    e offsets.bin (uint64 com o fim de cada registro). Abrir custa O(1): os offsets são
+    mapeados com np.memmap e o conteúdo com mmap; só os registros acessados são decodificados.
+
+    Funciona como uma sequência de dicts (len, índice, iteração), no lugar da lista
+    carregada de documents.json. Documentos novos ficam pendentes até flush(); a escrita
+    grava os dados antes dos offsets, então um processo interrompido nunca expõe registro parcial.
+    """
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.data_path = os.path.join(directory, DATA_NAME)
+        self.offsets_path = os.path.join(directory, OFFSETS_NAME)
+        self._pending: List[Dict] = []
+        self._urls = None
+        self._refresh()
+
+    @classmethod
+    def open(cls, directory: str, create: bool = False) -> "ContentStore":
+        if not os.path.exists(os.path.join(directory, OFFSETS_NAME)):
+            if not create:
+                raise FileNotFoundError(f"No content store in {directory}")
+            os.makedirs(directory, exist_ok=True)
+            for name in (DATA_NAME, OFFSETS_NAME):
+                open(os.path.join(directory, name), "ab").close()
+        return cls(directory)
+
+    def _refresh(self):
+        count = os.path.getsize(self.offsets_path) // _OFFSET_DTYPE.itemsize
+        self._count = count
+        if count == 0:
+            self._offsets = np.empty(0, dtype=_OFFSET_DTYPE)
+            self._data = b""
+            return
+        self._offsets = np.memmap(self.offsets_path, dtype=_OFFSET_DTYPE, mode="r", shape=(count,))
+        data_size = int(self._offsets[-1])
+        if data_size == 0:
+            self._data = b""
+            return
+        with open(self.data_path, "rb") as f:
+            self._data = mmap.mmap(f.fileno(), data_size, access=mmap.ACCESS_READ)
+
+    def __len__(self):
+        return self._count + len(self._pending)
+
+    def _span(self, i: int):
+        start = int(self._offsets[i - 1]) if i else 0
+        return start, int(self._offsets[i])
+
+    def _index(self, i: int) -> int:
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("document index out of range")
+        return i
+
+    def __getitem__(self, i: Union[int, slice]):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        i = self._index(int(i))
+        if i >= self._count:
+            return self._pending[i - self._count]
+        start, end = self._span(i)
+        newline = self._data.find(b"\n", start, end)
+        return json.loads(self._data[newline + 1:end])
+
+    def __iter__(self) -> Iterator[Dict]:
+        for i in range(len(self)):
+            yield self[i]
+
+    def take(self, ids: Iterable[int]) -> List[Dict]:
+        return [self[i] for i in ids]
+
+    def url(self, i: int) -> str:
+        """URL do documento i sem decodificar o conteúdo (primeira linha do registro)."""
+        i = self._index(i)
+        if i >= self._count:
+            return self._pending[i - self._count].get("url", "")
+        start, end = self._span(i)
+        return self._data[start:self._data.find(b"\n", start, end)].decode("utf-8")
+
+    def urls(self) -> List[str]:
+        """Todas as URLs (carregadas na primeira chamada e mantidas residentes)."""
+        if self._urls is None or len(self._urls) != self._count:
+            self._urls = [self.url(i) for i in range(self._count)]
+        return self._urls + [doc.get("url", "") for doc in self._pending]
+
+    def extend(self, documents: Iterable[Dict]):
+        self._pending.extend(documents)
+
+    def append(self, document: Dict):
+        self._pending.append(document)
+
+    def flush(self):
+        """Grava os documentos pendentes: dados primeiro, offsets depois."""
+        if not self._pending:
+            return
+        end = int(self._offsets[-1]) if self._count else 0
+        ends = []
+        with open(self.data_path, "r+b") as f:
+            # Descarta sobras de uma escrita interrompida depois do último offset
+            f.truncate(end)
+            f.seek(end)
+            for doc in self._pending:
+                record = doc.get("url", "").replace("\n", " ").encode("utf-8") + b"\n" + \
+                    json.dumps(doc, ensure_ascii=False).encode("utf-8")
+                f.write(record)
+                end += len(record)
+                ends.append(end)
+            f.flush()
+            os.fsync(f.fileno())
+        with open(self.offsets_path, "r+b") as f:
+            f.truncate(self._count * _OFFSET_DTYPE.itemsize)
+            f.seek(0, os.SEEK_END)
+            f.write(np.asarray(ends, dtype=_OFFSET_DTYPE).tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        self._pending = []
+        self._refresh()
+
+    def close(self):
+        """Fecha os mapeamentos; o store fica vazio (documentos pendentes não gravados são descartados)."""
+        if isinstance(self._data, mmap.mmap):
+            self._data.close()
+        self._data = b""
+        self._offsets = np.empty(0, dtype=_OFFSET_DTYPE)
+        self._count = 0
+        self._pending = []
+        self._urls = None
+
+def content_dir(data_dir: str) -> str:
+    return os.path.join(data_dir, CONTENT_DIR)
+
+def has_content_store(data_dir: str) -> bool:
+    """True se data_dir/content existe e não é mais antigo que um documents.json ao lado."""
+    offsets_path = os.path.join(content_dir(data_dir), OFFSETS_NAME)
+    if not os.path.exists(offsets_path):
+        return False
+    json_path = os.path.join(data_dir, DOCUMENTS_JSON)
+    return not os.path.exists(json_path) or os.path.getmtime(offsets_path) >= os.path.getmtime(json_path)
+
+def open_documents(data_dir: str):
+    """
+    Documentos de data_dir: o ContentStore (sob demanda, via mmap) quando está em dia,
+    senão a lista completa de documents.json (formato legado); [] se não há nenhum dos dois.
+    """
+    if has_content_store(data_dir):
+        return ContentStore.open(content_dir(data_dir))
+    json_path = os.path.join(data_dir, DOCUMENTS_JSON)
+    if not os.path.exists(json_path):
+        return []
+    if os.path.exists(content_dir(data_dir)):
+        print(f"[ContentStore] {json_path} é mais novo que {content_dir(data_dir)}; usando o JSON. "
+              "Rode src/tools/migrate_documents.py para atualizar o store.")
+    with open(json_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def open_for_append(data_dir: str) -> ContentStore:
+    """
+    Store de data_dir para um scraper anexar documentos (criado se não existe). Um
+    documents.json legado mais novo que o store é migrado antes: extend + flush só
+    gravam os registros novos, sem reler nem regravar a coleção inteira.
+    """
+    if os.path.exists(os.path.join(data_dir, DOCUMENTS_JSON)) and not has_content_store(data_dir):
+        migrate_documents_json(data_dir)
+    return ContentStore.open(content_dir(data_dir), create=True)
+
+def has_documents(data_dir: str) -> bool:
+    return has_content_store(data_dir) or os.path.exists(os.path.join(data_dir, DOCUMENTS_JSON))
+
+def write_content_store(directory: str, documents: Iterable[Dict]) -> ContentStore:
+    """
+    Grava um store novo em um diretório temporário e troca de lugar com o atual.
+    Processos com o store antigo mapeado continuam lendo os arquivos antigos (já desvinculados).
+    """
+    tmp_dir = directory.rstrip("/") + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    store = ContentStore.open(tmp_dir, create=True)
+    store.extend(documents)
+    store.flush()
+    old_dir = directory.rstrip("/") + ".old"
+    shutil.rmtree(old_dir, ignore_errors=True)
+    if os.path.exists(directory):
+        os.rename(directory, old_dir)
+    os.rename(tmp_dir, directory)
+    shutil.rmtree(old_dir, ignore_errors=True)
+    return ContentStore.open(directory)
+
+def migrate_documents_json(data_dir: str) -> ContentStore:
+    """Regrava documents.json como data_dir/content (substitui um store existente)."""
+    with open(os.path.join(data_dir, DOCUMENTS_JSON), "r", encoding="utf-8") as f:
+        documents = json.load(f)
+    return write_content_store(content_dir(data_dir), documents)
@@ -0,0 +1,207 @@
+import os
+import re
+from typing import Dict, Iterable, List, Optional
+import numpy as np
+from ingestion.chunking import parent_id_for
+
+REGISTRY_NAME = "registry.npz"
+
+# Fração de passagens removidas a partir da qual vale regravar os índices sem elas
+COMPACTION_THRESHOLD = 0.2
+
+_HEX64 = re.compile(r"[0-9a-fA-F]{1,16}")
+
+def _key(parent: str) -> int:
+    """
+    parent_id (até 16 hex = 64 bits) como inteiro. Qualquer outro valor (URL, parent_id
+    não hexadecimal vindo de outra fonte) vira o hash dele, como os documentos antigos.
+    """
+    if not _HEX64.fullmatch(parent):
+        parent = parent_id_for(parent)
+    return int(parent, 16)
+
+def parent_key(doc: Dict) -> int:
+    """Chave do documento de origem: parent_id ou, em documentos antigos, o hash da URL."""
+    return _key(str(doc.get("parent_id") or "") or parent_id_for(doc.get("url", "")))
+
+def as_parent_keys(parents: Iterable[str]) -> np.ndarray:
+    """parent_ids ou URLs em chaves uint64."""
+    return np.asarray([_key(str(p)) for p in parents], dtype=np.uint64)
+
+def combine_masks(*masks: Optional[np.ndarray]) -> Optional[np.ndarray]:
+    """AND das máscaras (booleanas ou bitmaps empacotados) presentes; None se nenhuma."""
+    result = None
+    for mask in masks:
+        if mask is None:
+            continue
+        result = mask.copy() if result is None else result & mask
+    return result
+
+# --- Registro de IDs estáveis e tombstones ---
+class DocumentRegistry:
+    """
+    Coluna de IDs alinhada com as linhas (documentos, embeddings, BM25, atributos, FAISS).
+    A posição de uma passagem muda numa compactação; o ID não: IDs são crescentes e
+    nunca reutilizados, então a linha de um ID é um searchsorted.
+
+    Remover uma passagem só liga seu tombstone: a busca aplica a máscara de vivos (o mesmo
+    caminho dos filtros de metadados) e nada é regravado até a compactação.
+
+    Faz o papel de um IndexIDMap2 do FAISS sem depender dele: o mesmo ID vale para o índice
+    em memória (IndexAgent), o FAISS e os shards, os filtros seguem um IDSelectorBitmap por
+    linha e o HNSW, que não aceita remove_ids, também é coberto. Em troca, a compactação
+    regrava as linhas vivas em todos os arquivos, faiss.index incluído (ver compaction.py).
+
+    As colunas crescem por duplicação de capacidade (como os segmentos de embeddings):
+    ids, parents e deleted são visões das linhas ocupadas, e add custa O(linhas novas)
+    amortizado em vez de recopiar o registro inteiro a cada lote.
+    """
+    def __init__(self):
+        self._ids = np.empty(0, dtype=np.int64)
+        self._parents = np.empty(0, dtype=np.uint64)
+        self._deleted = np.empty(0, dtype=bool)
+        self._size = 0
+        self.next_id = 0
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def ids(self) -> np.ndarray:
+        return self._ids[:self._size]
+
+    @ids.setter
+    def ids(self, values: np.ndarray):
+        self._ids = np.asarray(values, dtype=np.int64)
+        self._size = self._ids.shape[0]
+
+    @property
+    def parents(self) -> np.ndarray:
+        return self._parents[:self._size]
+
+    @parents.setter
+    def parents(self, values: np.ndarray):
+        self._parents = np.asarray(values, dtype=np.uint64)
+
+    @property
+    def deleted(self) -> np.ndarray:
+        return self._deleted[:self._size]
+
+    @deleted.setter
+    def deleted(self, values: np.ndarray):
+        self._deleted = np.asarray(values, dtype=bool)
+
+    def _reserve(self, size: int):
+        """Garante capacidade para size linhas, dobrando as colunas quando falta espaço."""
+        if size <= self._ids.shape[0]:
+            return
+        capacity = max(size, 2 * self._ids.shape[0], 1024)
+        for name in ("_ids", "_parents", "_deleted"):
+            column = getattr(self, name)
+            grown = np.zeros(capacity, dtype=column.dtype)
+            grown[:self._size] = column[:self._size]
+            setattr(self, name, grown)
+
+    @property
+    def deleted_count(self) -> int:
+        return int(self.deleted.sum())
+
+    @property
+    def tombstone_ratio(self) -> float:
+        return self.deleted_count / len(self) if len(self) else 0.0
+
+    def add(self, documents: Iterable[Dict]) -> np.ndarray:
+        """Registra as novas linhas e retorna os IDs atribuídos."""
+        keys = np.asarray([parent_key(doc) for doc in documents], dtype=np.uint64)
+        ids = np.arange(self.next_id, self.next_id + len(keys), dtype=np.int64)
+        self.next_id += len(keys)
+        start, end = self._size, self._size + len(keys)
+        self._reserve(end)
+        self._ids[start:end] = ids
+        self._parents[start:end] = keys
+        self._deleted[start:end] = False
+        self._size = end
+        return ids
+
+    def rows_of(self, ids: Iterable[int]) -> np.ndarray:
+        """Linhas atuais dos IDs (IDs inexistentes são ignorados)."""
+        ids = np.asarray(list(ids), dtype=np.int64)
+        rows = np.searchsorted(self.ids, ids)
+        rows = rows[rows < len(self.ids)]
+        return rows[np.isin(self.ids[rows], ids)]
+
+    def delete_rows(self, rows: np.ndarray) -> int:
+        rows = np.asarray(rows, dtype=np.int64)
+        newly = int((~self.deleted[rows]).sum())
+        self.deleted[rows] = True
+        return newly
+
+    def delete_ids(self, ids: Iterable[int]) -> int:
+        return self.delete_rows(self.rows_of(ids))
+
+    def delete_parents(self, parents: Iterable[str]) -> int:
+        """Marca todas as passagens vivas dos documentos (parent_id ou URL). Retorna quantas."""
+        keys = as_parent_keys(parents)
+        return self.delete_rows(np.flatnonzero(np.isin(self.parents, keys) & ~self.deleted))
+
+    def live_mask(self) -> Optional[np.ndarray]:
+        """Máscara booleana das linhas vivas, ou None se não há tombstones (nada a filtrar)."""
+        return ~self.deleted if self.deleted.any() else None
+
+    def live_bitmap(self) -> Optional[np.ndarray]:
+        """Mesma máscara empacotada no formato do faiss.IDSelectorBitmap."""
+        mask = self.live_mask()
+        return np.packbits(mask, bitorder="little") if mask is not None else None
+
+    def live_rows(self) -> np.ndarray:
+        return np.flatnonzero(~self.deleted)
+
+    def subset(self, rows: np.ndarray) -> "DocumentRegistry":
+        """Registro só com as linhas dadas (IDs preservados): o resultado de uma compactação."""
+        registry = DocumentRegistry()
+        registry.ids = self.ids[rows]
+        registry.parents = self.parents[rows]
+        registry.deleted = self.deleted[rows]
+        registry.next_id = self.next_id
+        return registry
+
+    def save(self, path: str):
+        tmp_path = path + ".tmp.npz"
+        np.savez(tmp_path, ids=self.ids, parents=self.parents, deleted=self.deleted,
+                 next_id=np.array([self.next_id], dtype=np.int64))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "DocumentRegistry":
+        registry = cls()
+        with np.load(path) as data:
+            registry.ids = data["ids"]
+            registry.parents = data["parents"]
+            registry.deleted = data["deleted"].copy()
+            registry.next_id = int(data["next_id"][0])
+        return registry
+
+    @classmethod
+    def build(cls, documents: List[Dict]) -> "DocumentRegistry":
+        registry = cls()
+        registry.add(documents)
+        return registry
+
+def registry_path(data_dir: str) -> str:
+    return os.path.join(data_dir, REGISTRY_NAME)
+
+def load_registry(data_dir: str, documents) -> DocumentRegistry:
+    """
+    Carrega data_dir/registry.npz. Linhas anexadas por um scraper que não mantém o registro
+    entram como vivas; um registro maior que os documentos (dados regravados) é reconstruído.
+    """
+    path = registry_path(data_dir)
+    if not os.path.exists(path):
+        return DocumentRegistry.build(documents)
+    registry = DocumentRegistry.load(path)
+    if len(registry) > len(documents):
+        print(f"[Registry] {path} tem {len(registry)} linhas para {len(documents)} documentos; reconstruído.")
+        return DocumentRegistry.build(documents)
+    if len(registry) < len(documents):
+        registry.add(documents[len(registry):])
+    return registry
@@ -0,0 +1,160 @@
+import json
+import math
+import os
+import numpy as np
+import faiss
+from typing import Dict, Optional
+from database.segment_store import normalize_rows
+
+INDEX_TYPES = ("flat", "ivf_flat", "ivf_pq", "hnsw", "sq8", "binary")
+# Tipos que guardam vetores comprimidos: candidatos podem ser reordenados com os float32 originais
+QUANTIZED_INDEX_TYPES = ("ivf_pq", "sq8", "binary")
+# "ip" = produto interno sobre vetores normalizados, ou seja, similaridade de cosseno
+METRICS = {"l2": faiss.METRIC_L2, "ip": faiss.METRIC_INNER_PRODUCT}
+FAISS_MANIFEST_NAME = "faiss_manifest.json"
+
+# Flags de leitura para compartilhar o índice entre processos via mmap
+FAISS_MMAP_FLAGS = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY | getattr(faiss, "IO_FLAG_MMAP_IFC", 0)
+
+def default_nlist(n: int) -> int:
+    """~4·sqrt(n) listas, garantindo ao menos 39 pontos de treino por centróide."""
+    return max(1, min(int(4 * math.sqrt(n)), n // 39))
+
+def create_index(index_type: str, dim: int, metric: str = "l2", n_train: int = 0,
+                 nlist: Optional[int] = None, pq_m: int = 48, pq_nbits: int = 8,
+                 hnsw_m: int = 32, ef_construction: int = 200) -> faiss.Index:
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type '{index_type}'. Options: {', '.join(INDEX_TYPES)}")
+    if metric not in METRICS:
+        raise ValueError(f"Unknown metric '{metric}'. Options: {', '.join(METRICS)}")
+    metric_type = METRICS[metric]
+    if index_type == "flat":
+        return faiss.IndexFlat(dim, metric_type)
+    if index_type == "sq8":
+        return faiss.IndexScalarQuantizer(dim, faiss.ScalarQuantizer.QT_8bit, metric_type)
+    if index_type == "binary":
+        # 1 bit por dimensão (sinal), busca por distância de Hamming; a métrica não se aplica
+        return faiss.IndexBinaryFlat(dim)
+    if index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, hnsw_m, metric_type)
+        index.hnsw.efConstruction = ef_construction
+        return index
+    nlist = nlist or default_nlist(n_train)
+    quantizer = faiss.IndexFlat(dim, metric_type)
+    if index_type == "ivf_flat":
+        return faiss.IndexIVFFlat(quantizer, dim, nlist, metric_type)
+    if dim % pq_m != 0:
+        raise ValueError(f"pq_m={pq_m} must divide the embedding dimension {dim}")
+    return faiss.IndexIVFPQ(quantizer, dim, nlist, pq_m, pq_nbits, metric_type)
+
+def build_index(embeddings: np.ndarray, index_type: str = "flat", metric: str = "l2", **params) -> faiss.Index:
+    """Cria, treina (IVF) e popula o índice com todos os embeddings."""
+    if metric == "ip":
+        embeddings = normalize_rows(embeddings)
+    embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+    index = create_index(index_type, embeddings.shape[1], metric, n_train=embeddings.shape[0], **params)
+    if index_type == "binary":
+        index.add(np.packbits(embeddings > 0, axis=1))
+        return index
+    if not index.is_trained:
+        index.train(embeddings)
+    index.add(embeddings)
+    return index
+
+def is_binary(index) -> bool:
+    return isinstance(index, faiss.IndexBinary)
+
+def index_metric(index) -> str:
+    if is_binary(index):
+        return "hamming"
+    return "ip" if index.metric_type == faiss.METRIC_INNER_PRODUCT else "l2"
+
+def flat_vectors(index) -> Optional[np.ndarray]:
+    """Vetores de um IndexFlat como matriz numpy, sem cópia (válida até o próximo add); None nos demais."""
+    if not isinstance(index, faiss.IndexFlat) or index.ntotal == 0:
+        return None
+    return faiss.rev_swig_ptr(index.get_xb(), index.ntotal * index.d).reshape(index.ntotal, index.d)
+
+def reconstruct_vectors(index) -> Optional[np.ndarray]:
+    """
+    Todos os vetores guardados no índice, na ordem das linhas (reconstruct_n): exatos no flat,
+    HNSW e IVF-flat, decodificados (aproximados) no sq8 e ivf_pq, ±1 por bit no binário.
+    Para quando o diretório não tem segments/: o próprio índice é a única cópia dos vetores.
+    None se o índice não permite reconstruir (ex.: aberto via mmap).
+    """
+    if index.ntotal == 0:
+        return np.empty((0, index.d), dtype=np.float32)
+    try:
+        if is_binary(index):
+            bits = np.unpackbits(index.reconstruct_n(0, index.ntotal), axis=1)[:, :index.d]
+            return bits.astype(np.float32) * 2 - 1
+        ivf = faiss.try_extract_index_ivf(index)
+        if ivf is not None:
+            # IVF só localiza um id nas listas invertidas com o direct map
+            ivf.make_direct_map()
+        return np.ascontiguousarray(index.reconstruct_n(0, index.ntotal), dtype=np.float32)
+    except RuntimeError:
+        return None
+
+def prepare_query(index, query: np.ndarray) -> np.ndarray:
+    """Formato de consulta esperado pelo índice (bits empacotados no índice binário); aceita um lote."""
+    query = np.ascontiguousarray(query, dtype=np.float32).reshape(-1, query.shape[-1])
+    if is_binary(index):
+        return np.packbits(query > 0, axis=1)
+    return query
+
+def set_search_params(index: faiss.Index, nprobe: Optional[int] = None, ef_search: Optional[int] = None):
+    """Ajusta nprobe (IVF) e efSearch (HNSW); ignora o que não se aplica ao tipo do índice."""
+    if is_binary(index):
+        return
+    params = faiss.ParameterSpace()
+    if nprobe is not None and faiss.try_extract_index_ivf(index) is not None:
+        params.set_index_parameter(index, "nprobe", int(nprobe))
+    if ef_search is not None and hasattr(index, "hnsw"):
+        params.set_index_parameter(index, "efSearch", int(ef_search))
+
+def filtered_search_params(index, bitmap: np.ndarray, n: int):
+    """
+    SearchParameters com um IDSelectorBitmap (bit i = id i, little-endian), preservando
+    o nprobe/efSearch já configurados no índice: a busca só visita ids permitidos.
+    """
+    selector = faiss.IDSelectorBitmap(n, faiss.swig_ptr(bitmap))
+    selector.referenced_bitmap = bitmap  # O seletor só guarda o ponteiro: mantém o array vivo
+    ivf = None if is_binary(index) else faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        return faiss.SearchParametersIVF(sel=selector, nprobe=ivf.nprobe)
+    if hasattr(index, "hnsw"):
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=index.hnsw.efSearch)
+    return faiss.SearchParameters(sel=selector)
+
+def read_index(path: str, mmap: bool = False, binary: bool = False):
+    if binary:
+        return faiss.read_index_binary(path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY) if mmap else faiss.read_index_binary(path)
+    if not mmap:
+        return faiss.read_index(path)
+    try:
+        return faiss.read_index(path, FAISS_MMAP_FLAGS)
+    except RuntimeError:
+        # Listas invertidas (IVF) não aceitam a combinação com IO_FLAG_MMAP_IFC
+        return faiss.read_index(path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+
+def write_index(index, path: str):
+    """Grava em arquivo temporário e troca atomicamente (leitores nunca veem arquivo parcial)."""
+    tmp_path = path + ".tmp"
+    if is_binary(index):
+        faiss.write_index_binary(index, tmp_path)
+    else:
+        faiss.write_index(index, tmp_path)
+    os.replace(tmp_path, path)
+
+def read_manifest(data_dir: str) -> Dict:
+    path = os.path.join(data_dir, FAISS_MANIFEST_NAME)
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def write_manifest(data_dir: str, manifest: Dict):
+    path = os.path.join(data_dir, FAISS_MANIFEST_NAME)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
@@ -0,0 +1,339 @@
+import os
+import re
+import threading
+import unicodedata
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from database.search_engine import top_k
+
+LEXICAL_INDEX_NAME = "bm25.npz"
+
+# Constante do RRF (Cormack et al.): amortece a diferença entre as primeiras posições
+RRF_K = 60
+
+# Termos em mais que esta fração dos documentos só pontuam candidatos vindos de termos raros
+COMMON_TERM_RATIO = 0.05
+
+# Stopwords do português já sem acento (a tokenização dobra acentos antes de filtrar)
+STOPWORDS_PT = frozenset("""
+a o e as os um uma uns umas de do da dos das em no na nos nas ao aos a as pelo pela pelos pelas
+por para com sem sob sobre entre ate desde que se nao mais menos muito muita ja so tambem
+como mas ou quando onde qual quais quem cujo cuja isso isto aquilo esse essa esses essas
+este esta estes estas aquele aquela aqueles aquelas ele ela eles elas eu tu voce voces nos vos
+me te lhe lhes meu minha meus minhas seu sua seus suas nosso nossa dele dela deles delas
+num numa ser e sao foi era ter tem ha havia sera estao esta estar
+""".split())
+
+# Palavras, números e códigos compostos: "01/2024", "gdsc-1234", "v2.1"
+_TOKEN = re.compile(r"[a-z0-9]+(?:[./\-][a-z0-9]+)*")
+
+def fold_accents(text: str) -> str:
+    """
+    Remove acentos e cedilha: "Edição" -> "Edicao". Demais caracteres não ASCII são
+    descartados, o que não muda nada para a tokenização (só casa [a-z0-9]).
+    """
+    return unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode("ascii")
+
+def tokenize(text: str) -> List[str]:
+    """
+    Tokenização para português: minúsculas, sem acentos, sem stopwords.
+    Códigos compostos ("edital 01/2024") entram inteiros e também em partes,
+    para casar tanto "01/2024" quanto "2024".
+    """
+    tokens = []
+    for match in _TOKEN.findall(fold_accents(text).lower()):
+        if match not in STOPWORDS_PT:
+            tokens.append(match)
+        if not match.isalnum():
+            tokens.extend(part for part in re.split(r"[./\-]", match) if part and part not in STOPWORDS_PT)
+    return tokens
+
+# --- Índice invertido BM25 ---
+class BM25Index:
+    """
+    Índice invertido em formato CSR: para o termo t, as postings são
+    doc_ids[offsets[t]:offsets[t+1]] (uint32, crescentes) e tfs[...] (uint16).
+    Os IDs de documento são as posições em documents.json. Documentos novos
+    ficam pendentes e entram nos arrays na próxima busca (ou save). add, o flush
+    das pendências e as buscas passam pelo mesmo lock: uma busca nunca vê as
+    postings no meio da reconstrução feita por outra thread.
+
+    Num índice repartido em shards, cada shard recebe as estatísticas da coleção inteira:
+    avgdl (set_avgdl, fixo) e, por consulta, df e total de documentos (collection_stats):
+    assim os scores BM25 de shards diferentes são comparáveis, como num índice único.
+    """
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.vocab: Dict[str, int] = {}
+        self.offsets = np.zeros(1, dtype=np.int64)
+        self.doc_ids = np.empty(0, dtype=np.uint32)
+        self.tfs = np.empty(0, dtype=np.uint16)
+        self.doc_lens = np.empty(0, dtype=np.uint32)
+        # Parte do BM25 que não depende da consulta, por posting (só em memória)
+        self._impacts = np.empty(0, dtype=np.float32)
+        # Tamanho médio dos documentos da coleção inteira (shards); None: o deste índice
+        self.avgdl: Optional[float] = None
+        self._pending: List[Tuple[np.ndarray, np.ndarray, int]] = []
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.doc_lens) + len(self._pending)
+
+    def add(self, texts: Iterable[str]):
+        documents = [tokenize(text) for text in texts]
+        with self._lock:
+            vocab = self.vocab
+            for tokens in documents:
+                term_ids = np.fromiter((vocab.setdefault(t, len(vocab)) for t in tokens), dtype=np.int64,
+                                       count=len(tokens))
+                terms, counts = np.unique(term_ids, return_counts=True)
+                self._pending.append((terms, counts, len(tokens)))
+
+    def build(self, texts: Iterable[str]):
+        self.__init__(self.k1, self.b)
+        self.add(texts)
+        self._flush()
+
+    def _flush(self):
+        """Incorpora os documentos pendentes às postings: uma ordenação estável por termo."""
+        with self._lock:
+            if self._pending:
+                self._merge_pending()
+
+    def _merge_pending(self):
+        first_doc = len(self.doc_lens)
+        lens = np.array([length for _, _, length in self._pending], dtype=np.uint32)
+        sizes = np.array([len(terms) for terms, _, _ in self._pending], dtype=np.int64)
+        # Postings antigas (expandidas para trios termo/doc/tf) seguidas das novas
+        terms = np.concatenate([np.repeat(np.arange(len(self.offsets) - 1), np.diff(self.offsets))]
+                               + [terms for terms, _, _ in self._pending])
+        docs = np.concatenate([self.doc_ids.astype(np.int64),
+                               np.repeat(np.arange(first_doc, first_doc + len(sizes)), sizes)])
+        tfs = np.concatenate([self.tfs.astype(np.int64)] + [counts for _, counts, _ in self._pending])
+        # Estável: dentro de cada termo os IDs continuam crescentes (antigos antes dos novos)
+        order = np.argsort(terms, kind="stable")
+        self.offsets = np.zeros(len(self.vocab) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(terms, minlength=len(self.vocab)), out=self.offsets[1:])
+        self.doc_ids = docs[order].astype(np.uint32)
+        self.tfs = np.minimum(tfs[order], np.iinfo(np.uint16).max).astype(np.uint16)
+        self.doc_lens = np.concatenate([self.doc_lens, lens])
+        self._pending = []
+        self._compute_impacts()
+
+    def _compute_impacts(self):
+        """tf * (k1 + 1) / (tf + k1 * (1 - b + b * len / avgdl)) de cada posting."""
+        avgdl = self.avgdl or (float(self.doc_lens.mean()) if len(self.doc_lens) else 1.0)
+        norms = (self.k1 * (1 - self.b + self.b * self.doc_lens / (avgdl or 1.0))).astype(np.float32)
+        tf = self.tfs.astype(np.float32)
+        self._impacts = tf * (self.k1 + 1) / (tf + norms[self.doc_ids])
+
+    @staticmethod
+    def _idf(df: int, n_docs: int) -> np.float32:
+        return np.float32(np.log1p((n_docs - df + 0.5) / (df + 0.5)))
+
+    def _postings(self, t: int, idf: Dict[int, np.float32]) -> Tuple[np.ndarray, np.ndarray]:
+        """(doc_ids, contribuições BM25) do termo t."""
+        start, end = self.offsets[t], self.offsets[t + 1]
+        return self.doc_ids[start:end], idf[t] * self._impacts[start:end]
+
+    def doc_freqs(self, terms: Iterable[str]) -> Dict[str, int]:
+        """Número de documentos deste índice com cada termo (tokenizado) presente no vocabulário."""
+        with self._lock:
+            self._flush()
+            return {t: int(self.offsets[self.vocab[t] + 1] - self.offsets[self.vocab[t]]) for t in terms if t in self.vocab}
+
+    def set_avgdl(self, avgdl: Optional[float]):
+        """Fixa o tamanho médio de documento (o da coleção inteira, num shard) e recalcula os impactos."""
+        with self._lock:
+            self._flush()
+            if avgdl != self.avgdl:
+                self.avgdl = avgdl
+                self._compute_impacts()
+
+    def search(self, query: str, k: int = 10, mask: Optional[np.ndarray] = None,
+               stats: Optional[Dict] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Retorna (doc_ids, scores BM25) em ordem decrescente. mask (bool, um por documento)
+        restringe o resultado aos documentos marcados. stats (collection_stats) troca o df e
+        o total de documentos deste índice pelos da coleção inteira.
+        """
+        with self._lock:
+            self._flush()
+            return self._search(query, k, mask, stats)
+
+    def _search(self, query: str, k: int, mask: Optional[np.ndarray],
+                stats: Optional[Dict] = None) -> Tuple[np.ndarray, np.ndarray]:
+        tokens = {self.vocab[t]: t for t in tokenize(query) if t in self.vocab}
+        terms = set(tokens)
+        if not terms or len(self.doc_lens) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        df = {t: int(self.offsets[t + 1] - self.offsets[t]) for t in terms}
+        n_docs = len(self.doc_lens)
+        if stats is not None:
+            df = {t: stats["doc_freqs"].get(tokens[t], df[t]) for t in terms}
+            n_docs = stats["n_docs"]
+        idf = {t: self._idf(df[t], n_docs) for t in terms}
+        rare = [t for t in terms if df[t] <= COMMON_TERM_RATIO * n_docs] or [min(terms, key=df.get)]
+        common = [t for t in terms if t not in rare]
+        if common:
+            result = self._search_candidates(rare, common, k, idf, mask)
+            if result is not None:
+                return result
+        ids, scores = self._accumulate(list(terms), idf, mask)
+        best = top_k(scores, k)
+        return ids[best].astype(np.int64), scores[best]
+
+    def _accumulate(self, terms: List[int], idf: Dict[int, np.float32],
+                    mask: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Soma as contribuições dos termos; retorna (doc_ids tocados e permitidos, scores)."""
+        if len(terms) == 1:
+            ids, scores = self._postings(terms[0], idf)
+            if mask is not None:
+                keep = mask[ids]
+                ids, scores = ids[keep], scores[keep]
+            return ids, scores
+        # Acumulador denso: dentro de um termo os doc_ids são únicos, então += indexado é seguro
+        scores = np.zeros(len(self.doc_lens), dtype=np.float32)
+        for t in terms:
+            docs, contributions = self._postings(t, idf)
+            scores[docs] += contributions
+        # Só os documentos tocados seguem para o top-k (argpartition degrada com muitos zeros empatados)
+        if mask is not None:
+            scores[~mask] = 0
+        ids = np.flatnonzero(scores)
+        return ids, scores[ids]
+
+    def _search_candidates(self, rare: List[int], common: List[int], k: int, idf: Dict[int, np.float32],
+                           mask: Optional[np.ndarray] = None):
+        """
+        Poda estilo MaxScore: só documentos com algum termo raro são candidatos; termos comuns
+        (quase stopwords, ex.: "ufpb") apenas somam sua parcela a eles, via busca binária nas
+        postings ordenadas. Um documento fora dos candidatos pontua no máximo a soma dos
+        limites dos termos comuns; se o k-ésimo candidato já supera isso, o top-k é exato.
+        Caso contrário retorna None e a busca cai no acumulador completo.
+        """
+        ids, scores = self._accumulate(rare, idf, mask)
+        bound = 0.0
+        for t in common:
+            docs, contributions = self._postings(t, idf)
+            pos = np.minimum(np.searchsorted(docs, ids), len(docs) - 1)
+            hit = docs[pos] == ids
+            scores[hit] += contributions[pos[hit]]
+            bound += float(contributions.max())
+        best = top_k(scores, k)
+        if len(best) < k or scores[best[-1]] < bound:
+            return None
+        return ids[best].astype(np.int64), scores[best]
+
+    def subset(self, rows: np.ndarray) -> "BM25Index":
+        """Índice só com os documentos das linhas dadas (crescentes), renumerados a partir de 0."""
+        with self._lock:
+            self._flush()
+            return self._subset(rows)
+
+    def _subset(self, rows: np.ndarray) -> "BM25Index":
+        remap = np.full(len(self.doc_lens), -1, dtype=np.int64)
+        remap[rows] = np.arange(len(rows))
+        terms = np.repeat(np.arange(len(self.offsets) - 1), np.diff(self.offsets))
+        new_ids = remap[self.doc_ids]
+        keep = new_ids >= 0
+        index = BM25Index(self.k1, self.b)
+        index.vocab = dict(self.vocab)
+        index.offsets = np.zeros(len(self.offsets), dtype=np.int64)
+        np.cumsum(np.bincount(terms[keep], minlength=len(self.offsets) - 1), out=index.offsets[1:])
+        # remap é crescente: as postings continuam ordenadas por documento dentro de cada termo
+        index.doc_ids = new_ids[keep].astype(np.uint32)
+        index.tfs = self.tfs[keep]
+        index.doc_lens = self.doc_lens[rows]
+        index.avgdl = self.avgdl
+        index._compute_impacts()
+        return index
+
+    def save(self, path: str):
+        """Grava vocabulário e postings num único .npz (escrita atômica)."""
+        with self._lock:
+            self._flush()
+            terms = sorted(self.vocab, key=self.vocab.get)
+            offsets, doc_ids, tfs, doc_lens = self.offsets, self.doc_ids, self.tfs, self.doc_lens
+        tmp_path = path + ".tmp.npz"
+        np.savez(
+            tmp_path,
+            terms=np.frombuffer("\n".join(terms).encode("utf-8"), dtype=np.uint8),
+            offsets=offsets,
+            doc_ids=doc_ids,
+            tfs=tfs,
+            doc_lens=doc_lens,
+            params=np.array([self.k1, self.b], dtype=np.float64),
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "BM25Index":
+        with np.load(path) as data:
+            k1, b = data["params"].tolist()
+            index = cls(k1=k1, b=b)
+            text = data["terms"].tobytes().decode("utf-8")
+            index.vocab = {term: i for i, term in enumerate(text.split("\n"))} if text else {}
+            index.offsets = data["offsets"]
+            index.doc_ids = data["doc_ids"]
+            index.tfs = data["tfs"]
+            index.doc_lens = data["doc_lens"]
+        index._compute_impacts()
+        return index
+
+def lexical_index_path(data_dir: str) -> str:
+    return os.path.join(data_dir, LEXICAL_INDEX_NAME)
+
+def build_lexical_index(documents: List[Dict]) -> BM25Index:
+    index = BM25Index()
+    index.build(doc.get("content", "") for doc in documents)
+    return index
+
+def load_lexical_index(data_dir: str, doc_count: int):
+    """Carrega data_dir/bm25.npz se estiver alinhado com documents.json; senão None."""
+    path = lexical_index_path(data_dir)
+    if not os.path.exists(path):
+        return None
+    index = BM25Index.load(path)
+    if len(index) != doc_count:
+        print(f"[BM25] {path} tem {len(index)} documentos para {doc_count} em documents.json; ignorado.")
+        return None
+    return index
+
+def collection_stats(indexes: Iterable[Optional[BM25Index]], queries: Iterable[Optional[str]]) -> Dict:
+    """
+    df dos termos das consultas e total de documentos somados sobre vários índices (os
+    shards de uma coleção), para BM25Index.search(stats=...): o idf passa a ser o global.
+    """
+    indexes = [index for index in indexes if index is not None]
+    terms = {t for query in queries if query for t in tokenize(query)}
+    doc_freqs: Dict[str, int] = {}
+    for index in indexes:
+        for term, df in index.doc_freqs(terms).items():
+            doc_freqs[term] = doc_freqs.get(term, 0) + df
+    return {"doc_freqs": doc_freqs, "n_docs": sum(len(index) for index in indexes)}
+
+def collection_avgdl(indexes: Iterable[Optional[BM25Index]]) -> Optional[float]:
+    """Tamanho médio dos documentos de todos os índices juntos (para BM25Index.set_avgdl)."""
+    indexes = [index for index in indexes if index is not None]
+    for index in indexes:
+        index._flush()
+    lens = [index.doc_lens for index in indexes]
+    total = sum(len(doc_lens) for doc_lens in lens)
+    return float(sum(int(doc_lens.sum()) for doc_lens in lens)) / total if total else None
+
+# --- Fusão de rankings ---
+def reciprocal_rank_fusion(rankings: List[np.ndarray], k: int, rrf_k: int = RRF_K) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Reciprocal rank fusion: score(d) = soma de 1 / (rrf_k + posição) nas listas em que d aparece.
+    Não depende da escala dos scores (cosseno vs BM25). Retorna (ids, scores) decrescentes.
+    """
+    fused: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking.tolist()):
+            fused[doc_id] = fused.get(doc_id, 0.0) + 1.0 / (rrf_k + rank + 1)
+    ordered = sorted(fused.items(), key=lambda item: item[1], reverse=True)[:k]
+    ids = np.array([doc_id for doc_id, _ in ordered], dtype=np.int64)
+    scores = np.array([score for _, score in ordered], dtype=np.float32)
+    return ids, scores
@@ -0,0 +1,205 @@
+import json
+import os
+from datetime import datetime
+from typing import Dict, List, Optional
+from urllib.parse import urlparse
+import numpy as np
+
+ATTRIBUTES_NAME = "attributes.npz"
+METADATA_NAME = "metadata.json"
+
+# Colunas de baixa cardinalidade com um bitmap por valor
+BITMAP_COLUMNS = ("content_type", "host")
+
+def content_type_for(doc: Dict) -> str:
+    """"pdf" ou "html": usa o campo do documento quando existe, senão a extensão da URL."""
+    if doc.get("content_type"):
+        return doc["content_type"]
+    path = urlparse(doc.get("url", "")).path.lower()
+    return "pdf" if path.endswith(".pdf") else "html"
+
+def normalize_path(path: str) -> str:
+    return "/" + path.strip("/").lower() if path.strip("/") else "/"
+
+def parse_date(value) -> int:
+    """Data ISO (ou datetime) em segundos Unix; -1 quando ausente ou inválida."""
+    if not value:
+        return -1
+    try:
+        moment = value if isinstance(value, datetime) else datetime.fromisoformat(str(value))
+    except ValueError:
+        return -1
+    return int(moment.timestamp())
+
+def read_crawl_dates(data_dir: str) -> Dict[str, str]:
+    """URL -> date_added do metadata.json gerado por metadata/generate_metadata.py."""
+    path = os.path.join(data_dir, METADATA_NAME)
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return {meta["url"]: meta.get("date_added") for meta in json.load(f) if meta.get("url")}
+
+def _filter_value(filters, name: str):
+    # Aceita dict ou objeto com atributos (ex.: o modelo pydantic SearchFilters da API)
+    if isinstance(filters, dict):
+        return filters.get(name)
+    return getattr(filters, name, None)
+
+def _as_list(value) -> List[str]:
+    if value is None:
+        return []
+    return [value] if isinstance(value, str) else list(value)
+
+def pack_mask(mask: np.ndarray) -> np.ndarray:
+    """Bitmap little-endian (bit i = documento i): o formato do faiss.IDSelectorBitmap."""
+    return np.packbits(mask, bitorder="little")
+
+# --- Atributos por documento (colunares) ---
+class DocumentAttributes:
+    """
+    Atributos de cada passagem, alinhados com documents.json, em arrays colunares:
+    colunas categóricas viram códigos inteiros + lista de valores (content_type, host, path)
+    e a data de coleta fica em segundos Unix (int64, -1 = desconhecida).
+    content_type e host também têm um bitmap empacotado por valor, combinados com
+    OR/AND bit a bit antes de qualquer cálculo de similaridade.
+    """
+    def __init__(self):
+        self.values: Dict[str, List[str]] = {"content_type": [], "host": [], "path": []}
+        self.codes: Dict[str, np.ndarray] = {
+            "content_type": np.empty(0, dtype=np.uint8),
+            "host": np.empty(0, dtype=np.uint16),
+            "path": np.empty(0, dtype=np.uint32),
+        }
+        self.crawled_at = np.empty(0, dtype=np.int64)
+        self._bitmaps: Dict[str, Dict[int, np.ndarray]] = {}
+
+    def __len__(self):
+        return self.crawled_at.shape[0]
+
+    def add(self, documents: List[Dict], crawl_dates: Optional[Dict[str, str]] = None,
+            default_date: Optional[str] = None):
+        """default_date vale para documentos sem data própria nem entrada em crawl_dates."""
+        crawl_dates = crawl_dates or {}
+        columns = {"content_type": [], "host": [], "path": []}
+        dates = []
+        for doc in documents:
+            url = doc.get("url", "")
+            parsed = urlparse(url)
+            columns["content_type"].append(content_type_for(doc))
+            columns["host"].append(parsed.netloc.lower())
+            columns["path"].append(normalize_path(parsed.path))
+            dates.append(parse_date(doc.get("crawled_at") or crawl_dates.get(url) or default_date))
+        for column, raw in columns.items():
+            lookup = {value: code for code, value in enumerate(self.values[column])}
+            new_codes = [lookup.setdefault(value, len(lookup)) for value in raw]
+            self.values[column] = sorted(lookup, key=lookup.get)
+            dtype = self.codes[column].dtype
+            if len(lookup) > np.iinfo(dtype).max:
+                dtype = np.uint32
+            self.codes[column] = np.concatenate([self.codes[column], np.asarray(new_codes, dtype=dtype)]).astype(dtype)
+        self.crawled_at = np.concatenate([self.crawled_at, np.asarray(dates, dtype=np.int64)])
+        self._bitmaps = {}
+
+    @classmethod
+    def build(cls, documents: List[Dict], crawl_dates: Optional[Dict[str, str]] = None) -> "DocumentAttributes":
+        attributes = cls()
+        attributes.add(documents, crawl_dates)
+        return attributes
+
+    def subset(self, rows: np.ndarray) -> "DocumentAttributes":
+        """Atributos só das linhas dadas (mesmos dicionários de valores)."""
+        attributes = DocumentAttributes()
+        attributes.values = {column: list(values) for column, values in self.values.items()}
+        attributes.codes = {column: codes[rows] for column, codes in self.codes.items()}
+        attributes.crawled_at = self.crawled_at[rows]
+        return attributes
+
+    def _bitmap(self, column: str, code: int) -> np.ndarray:
+        by_code = self._bitmaps.setdefault(column, {})
+        if code not in by_code:
+            by_code[code] = pack_mask(self.codes[column] == code)
+        return by_code[code]
+
+    def _match_any(self, column: str, wanted: List[str]) -> np.ndarray:
+        """OR dos bitmaps dos valores pedidos (bitmap vazio se nenhum existe)."""
+        result = np.zeros((len(self) + 7) // 8, dtype=np.uint8)
+        lookup = {value: code for code, value in enumerate(self.values[column])}
+        for value in wanted:
+            code = lookup.get(value.lower())
+            if code is not None:
+                result |= self._bitmap(column, code)
+        return result
+
+    def bitmap(self, filters) -> Optional[np.ndarray]:
+        """
+        Bitmap empacotado dos documentos que passam nos filtros, ou None sem filtros.
+        Filtros: content_type ("pdf"/"html" ou lista), host (ou lista), path_prefix
+        (ex.: "/inova") e crawled_after (data ISO).
+        """
+        if not filters:
+            return None
+        parts = []
+        for column in BITMAP_COLUMNS:
+            wanted = _as_list(_filter_value(filters, column))
+            if wanted:
+                parts.append(self._match_any(column, wanted))
+        prefix = _filter_value(filters, "path_prefix")
+        if prefix:
+            prefix = normalize_path(prefix)
+            # Compara o prefixo só com os caminhos distintos; depois expande pelos códigos
+            matching = np.array([path == prefix or path.startswith(prefix.rstrip("/") + "/")
+                                 for path in self.values["path"]], dtype=bool)
+            parts.append(pack_mask(matching[self.codes["path"]] if len(matching) else np.zeros(len(self), dtype=bool)))
+        after = _filter_value(filters, "crawled_after")
+        if after:
+            since = parse_date(after)
+            if since < 0:
+                raise ValueError(f"Invalid crawled_after date '{after}'")
+            parts.append(pack_mask(self.crawled_at >= since))
+        if not parts:
+            return None
+        result = parts[0].copy()
+        for part in parts[1:]:
+            result &= part
+        return result
+
+    def mask(self, filters) -> Optional[np.ndarray]:
+        """Mesmo filtro como máscara booleana (uma posição por documento)."""
+        bitmap = self.bitmap(filters)
+        if bitmap is None:
+            return None
+        return np.unpackbits(bitmap, count=len(self), bitorder="little").astype(bool)
+
+    def save(self, path: str):
+        tmp_path = path + ".tmp.npz"
+        np.savez(
+            tmp_path,
+            crawled_at=self.crawled_at,
+            **{f"{column}_codes": codes for column, codes in self.codes.items()},
+            **{f"{column}_values": np.frombuffer("\n".join(values).encode("utf-8"), dtype=np.uint8)
+               for column, values in self.values.items()},
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "DocumentAttributes":
+        attributes = cls()
+        with np.load(path) as data:
+            attributes.crawled_at = data["crawled_at"]
+            for column in attributes.codes:
+                attributes.codes[column] = data[f"{column}_codes"]
+                text = data[f"{column}_values"].tobytes().decode("utf-8")
+                attributes.values[column] = text.split("\n") if len(attributes.codes[column]) else []
+        return attributes
+
+def attributes_path(data_dir: str) -> str:
+    return os.path.join(data_dir, ATTRIBUTES_NAME)
+
+def load_attributes(data_dir: str, documents: List[Dict]) -> DocumentAttributes:
+    """Carrega data_dir/attributes.npz se alinhado com documents.json; senão reconstrói (uma passada nas URLs)."""
+    path = attributes_path(data_dir)
+    if os.path.exists(path):
+        attributes = DocumentAttributes.load(path)
+        if len(attributes) == len(documents):
+            return attributes
+    return DocumentAttributes.build(documents, read_crawl_dates(data_dir))
@@ -0,0 +1,143 @@
+import os
+import numpy as np
+from typing import Iterator, Optional, Tuple
+from database.segment_store import SegmentedEmbeddingStore, MANIFEST_NAME
+
+QUANTIZATIONS = ("none", "int8", "binary")
+
+# (offset do segmento, scores, linhas locais pontuadas ou None se todas)
+ScoredSegment = Tuple[int, np.ndarray, Optional[np.ndarray]]
+
+# Acima desta fração de linhas permitidas, pontuar o segmento inteiro e descartar o resto é
+# mais barato que copiar as linhas permitidas (ex.: só alguns tombstones)
+DENSE_MASK_RATIO = 0.5
+
+def score_allowed(rows: np.ndarray, score, mask: Optional[np.ndarray]) -> Tuple[Optional[np.ndarray], Optional[np.ndarray]]:
+    """
+    (scores, linhas locais permitidas) de um segmento; sem máscara, (todos os scores, None).
+    Com poucas linhas permitidas pontua só elas; com muitas, pontua tudo e seleciona os scores.
+    """
+    if mask is None:
+        return score(rows), None
+    allowed = np.flatnonzero(mask)
+    if allowed.size == 0:
+        return None, allowed
+    if allowed.size >= DENSE_MASK_RATIO * rows.shape[0]:
+        return score(rows)[allowed], allowed
+    return score(rows[allowed]), allowed
+
+# Tabela de popcount para numpy < 2.0 (sem np.bitwise_count)
+_POPCOUNT_TABLE = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+def popcount_rows(xor: np.ndarray) -> np.ndarray:
+    """Número de bits 1 por linha de uma matriz uint8."""
+    if hasattr(np, "bitwise_count"):
+        if xor.shape[1] % 8 == 0:
+            # Palavras de 64 bits: 8x menos operações que byte a byte
+            xor = np.ascontiguousarray(xor).view(np.uint64)
+        return np.bitwise_count(xor).sum(axis=1, dtype=np.int32)
+    return _POPCOUNT_TABLE[xor].sum(axis=1, dtype=np.int32)
+
+# --- Quantização escalar int8 ---
+class Int8Codes:
+    """
+    Cada vetor normalizado vira int8 com escala própria (127 / max|x|), 4x menor que float32.
+    A consulta é quantizada do mesmo jeito e o score aproximado é o produto interno inteiro
+    (int8 x int8, acumulado em int32) dividido pelas duas escalas: os códigos são lidos
+    direto, sem uma cópia convertida para float32 a cada busca.
+    """
+    kind = "int8"
+
+    def __init__(self, segment_capacity: int = 4096):
+        self.codes = SegmentedEmbeddingStore(dtype=np.int8, segment_capacity=segment_capacity)
+        self.scales = SegmentedEmbeddingStore(dim=1, dtype=np.float32, segment_capacity=segment_capacity)
+
+    def __len__(self):
+        return len(self.codes)
+
+    def add(self, rows: np.ndarray):
+        max_abs = np.abs(rows).max(axis=1, keepdims=True)
+        max_abs[max_abs == 0] = 1.0
+        scales = (127.0 / max_abs).astype(np.float32)
+        self.codes.append(np.rint(rows * scales).astype(np.int8))
+        self.scales.append(scales)
+
+    @staticmethod
+    def quantize_query(query: np.ndarray) -> Tuple[np.ndarray, np.float32]:
+        scale = np.float32(127.0 / max(float(np.abs(query).max()), 1e-12))
+        return np.rint(query * scale).astype(np.int8), scale
+
+    def approximate_scores(self, query: np.ndarray, mask: Optional[np.ndarray] = None) -> Iterator[ScoredSegment]:
+        query_code, query_scale = self.quantize_query(query)
+        # einsum acumula em int32 sem materializar os códigos em outro tipo (rows @ query converteria para float32)
+        dot = lambda rows: np.einsum("ij,j->i", rows, query_code, dtype=np.int32)
+        scales = self.scales.iter_segments()
+        for offset, codes in self.codes.iter_segments():
+            _, seg_scales = next(scales)
+            local = None if mask is None else mask[offset:offset + codes.shape[0]]
+            scores, allowed = score_allowed(codes, dot, local)
+            if scores is not None:
+                row_scales = seg_scales[:, 0] if allowed is None else seg_scales[allowed, 0]
+                yield offset, scores.astype(np.float32) / (row_scales * query_scale), allowed
+
+    def save(self, directory: str):
+        self.codes.save(os.path.join(directory, "codes"))
+        self.scales.save(os.path.join(directory, "scales"))
+
+    def load(self, directory: str, mmap: bool = False):
+        self.codes = SegmentedEmbeddingStore.load(os.path.join(directory, "codes"), mmap=mmap)
+        self.scales = SegmentedEmbeddingStore.load(os.path.join(directory, "scales"), mmap=mmap)
+
+# --- Quantização binária (1 bit por dimensão) ---
+class BinaryCodes:
+    """
+    Guarda só o sinal de cada dimensão (32x menor que float32) e busca por distância de Hamming.
+    O score aproximado usa cos(pi * hamming / dim), a relação clássica do SimHash.
+    """
+    kind = "binary"
+
+    def __init__(self, segment_capacity: int = 4096):
+        self.codes = SegmentedEmbeddingStore(dtype=np.uint8, segment_capacity=segment_capacity)
+        self.dim: Optional[int] = None
+
+    def __len__(self):
+        return len(self.codes)
+
+    @staticmethod
+    def encode(rows: np.ndarray) -> np.ndarray:
+        return np.packbits(rows > 0, axis=1)
+
+    def add(self, rows: np.ndarray):
+        self.dim = rows.shape[1]
+        self.codes.append(self.encode(rows))
+
+    def approximate_scores(self, query: np.ndarray, mask: Optional[np.ndarray] = None) -> Iterator[ScoredSegment]:
+        query_code = self.encode(query.reshape(1, -1))
+        dim = self.dim or self.codes.dim * 8
+        for offset, codes in self.codes.iter_segments():
+            local = None if mask is None else mask[offset:offset + codes.shape[0]]
+            hamming, allowed = score_allowed(codes, lambda rows: popcount_rows(np.bitwise_xor(rows, query_code)), local)
+            if hamming is not None:
+                yield offset, np.cos(np.pi * hamming / dim).astype(np.float32), allowed
+
+    def save(self, directory: str):
+        self.codes.save(os.path.join(directory, "codes"))
+
+    def load(self, directory: str, mmap: bool = False):
+        self.codes = SegmentedEmbeddingStore.load(os.path.join(directory, "codes"), mmap=mmap)
+
+def create_codes(quantization: str, segment_capacity: int = 4096):
+    """Retorna o armazenamento de códigos para o modo pedido (None para "none")."""
+    if quantization not in QUANTIZATIONS:
+        raise ValueError(f"Unknown quantization '{quantization}'. Options: {', '.join(QUANTIZATIONS)}")
+    if quantization == "int8":
+        return Int8Codes(segment_capacity)
+    if quantization == "binary":
+        return BinaryCodes(segment_capacity)
+    return None
+
+def codes_dir(directory: str, quantization: str) -> str:
+    return os.path.join(directory, f"codes_{quantization}")
+
+def has_codes(directory: str, quantization: str) -> bool:
+    return os.path.exists(os.path.join(codes_dir(directory, quantization), "codes", MANIFEST_NAME))
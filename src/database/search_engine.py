@@ -0,0 +1,142 @@
+import numpy as np
+from typing import Iterable, Optional, Tuple
+from database.segment_store import SegmentedEmbeddingStore, normalize_rows, is_normalized
+from database.quantization import create_codes, score_allowed
+
+# --- Seleção top-k ---
+def top_k(scores: np.ndarray, k: int, threshold: Optional[float] = None) -> np.ndarray:
+    """Retorna os índices dos k maiores scores (ordem decrescente), respeitando o threshold."""
+    if threshold is not None:
+        candidates = np.flatnonzero(scores >= threshold)
+    else:
+        candidates = np.arange(scores.shape[0])
+    if candidates.size == 0 or k <= 0:
+        return candidates[:0]
+    if candidates.size > k:
+        # argpartition é O(n): só ordena de fato os k melhores
+        part = np.argpartition(scores[candidates], -k)[-k:]
+        candidates = candidates[part]
+    return candidates[np.argsort(scores[candidates])[::-1]]
+
+# --- Motor de Busca por Cosseno ---
+class CosineSearchEngine:
+    """
+    Mantém os embeddings já normalizados em float32, em segmentos contíguos.
+    Cada consulta custa um produto matriz-vetor por segmento seguido de seleção parcial top-k.
+
+    Com quantization="int8" ou "binary", a primeira passada percorre apenas os códigos
+    compactos; com rescore=True os `k * rescore_factor` melhores candidatos são
+    reordenados pelo cosseno exato em float32. Para que a economia de RAM seja real,
+    carregue com mmap=True: só os códigos e as linhas candidatas ficam residentes.
+    """
+    def __init__(self, segment_capacity: int = 4096, quantization: str = "none",
+                 rescore: bool = True, rescore_factor: int = 4):
+        self.segment_capacity = segment_capacity
+        self.quantization = quantization
+        self.rescore = rescore
+        self.rescore_factor = rescore_factor
+        self.store = SegmentedEmbeddingStore(segment_capacity=segment_capacity, normalized=True)
+        self.codes = create_codes(quantization, segment_capacity)
+
+    def __len__(self):
+        return len(self.store)
+
+    @property
+    def matrix(self) -> Optional[np.ndarray]:
+        return self.store.to_array()
+
+    def _rebuild_codes(self):
+        self.codes = create_codes(self.quantization, self.segment_capacity)
+        if self.codes is not None:
+            for _, rows in self.store.iter_segments():
+                self.codes.add(rows)
+
+    def build(self, embeddings: Optional[np.ndarray]):
+        self.store = SegmentedEmbeddingStore(segment_capacity=self.segment_capacity, normalized=True)
+        if embeddings is not None:
+            if is_normalized(embeddings):
+                # Já normalizada (ex.: np.memmap salvo pelo IndexAgent): usa sem copiar
+                self.store.add_segment(embeddings)
+            else:
+                self.store.add_segment(normalize_rows(embeddings))
+        self._rebuild_codes()
+
+    def build_from_segments(self, segments: Iterable[np.ndarray]):
+        """Como build(), a partir de blocos já normalizados: cada bloco vira um segmento, sem cópia."""
+        self.store = SegmentedEmbeddingStore(segment_capacity=self.segment_capacity, normalized=True)
+        for rows in segments:
+            self.store.add_segment(rows)
+        self._rebuild_codes()
+
+    def add(self, embeddings: np.ndarray):
+        # O store normaliza apenas as linhas novas
+        start = self.store.append(embeddings)
+        if self.codes is not None:
+            self.codes.add(self.store.take(np.arange(start, len(self.store))))
+
+    def save(self, directory: str, codes_directory: Optional[str] = None):
+        self.store.save(directory)
+        if self.codes is not None and codes_directory:
+            self.codes.save(codes_directory)
+
+    def load(self, directory: str, mmap: bool = False, codes_directory: Optional[str] = None):
+        store = SegmentedEmbeddingStore.load(directory, mmap=mmap, segment_capacity=self.segment_capacity)
+        if not store.normalized:
+            # Segmentos gravados por scrapers (vetores brutos): normaliza uma vez, na carga
+            normalized = SegmentedEmbeddingStore(segment_capacity=self.segment_capacity, normalized=True)
+            for _, rows in store.iter_segments():
+                normalized.add_segment(normalize_rows(rows))
+            store = normalized
+        self.store = store
+        if self.codes is not None and codes_directory:
+            self.codes.load(codes_directory, mmap=mmap)
+            if len(self.codes) == len(self.store):
+                return
+        self._rebuild_codes()
+
+    def _scan(self, scores_by_segment, k: int, threshold: Optional[float]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Top-k de cada segmento, depois junta tudo em um top-k global. Cada item é
+        (offset, scores, allowed): com filtro, scores só cobre as linhas locais em allowed.
+        """
+        all_indices, all_scores = [np.empty(0, dtype=np.int64)], [np.empty(0, dtype=np.float32)]
+        for offset, scores, allowed in scores_by_segment:
+            local = top_k(scores, k, threshold)
+            all_indices.append((local if allowed is None else allowed[local]) + offset)
+            all_scores.append(scores[local])
+        indices = np.concatenate(all_indices)
+        scores = np.concatenate(all_scores)
+        best = top_k(scores, k)
+        return indices[best], scores[best]
+
+    @staticmethod
+    def _filtered(segments, score, mask: Optional[np.ndarray]):
+        """
+        Aplica o filtro junto do cálculo (ver score_allowed): filtros seletivos pontuam só as
+        linhas permitidas; máscaras quase cheias (tombstones) pontuam tudo e descartam o resto.
+        """
+        for offset, rows in segments:
+            local = None if mask is None else mask[offset:offset + rows.shape[0]]
+            scores, allowed = score_allowed(rows, score, local)
+            if scores is not None:
+                yield offset, scores, allowed
+
+    def search(self, query_embedding: np.ndarray, k: int = 5, threshold: Optional[float] = None,
+               mask: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Retorna (índices, scores) ordenados por similaridade de cosseno decrescente.
+        mask (bool, um por documento) restringe a busca aos documentos marcados.
+        """
+        if len(self.store) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        query = normalize_rows(query_embedding)[0]
+        if self.codes is None:
+            return self._scan(self._filtered(self.store.iter_segments(), lambda rows: rows @ query, mask), k, threshold)
+        approximate = self.codes.approximate_scores(query, mask)
+        if not self.rescore:
+            return self._scan(approximate, k, threshold)
+        # Primeira passada nos códigos compactos, reordenação exata só dos candidatos
+        candidates, _ = self._scan(approximate, k * self.rescore_factor, None)
+        scores = self.store.take(candidates) @ query
+        best = top_k(scores, k, threshold)
+        return candidates[best], scores[best]
@@ -0,0 +1,238 @@
+import json
+import os
+import numpy as np
+from typing import Iterator, List, Optional, Tuple
+
+SEGMENTS_DIR = "segments"
+MANIFEST_NAME = "manifest.json"
+
+# --- Utilitários de normalização ---
+def normalize_rows(embeddings: np.ndarray) -> np.ndarray:
+    """Converte para float32 contíguo e normaliza cada linha (norma L2 = 1)."""
+    matrix = np.ascontiguousarray(embeddings, dtype=np.float32)
+    if matrix.ndim == 1:
+        matrix = matrix.reshape(1, -1)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0  # Evita divisão por zero em vetores nulos
+    return matrix / norms
+
+def is_normalized(matrix: np.ndarray, sample: int = 1024, atol: float = 1e-3) -> bool:
+    """Verifica, por amostragem de linhas, se a matriz já é float32 contíguo com norma 1."""
+    if matrix.dtype != np.float32 or not matrix.flags["C_CONTIGUOUS"] or matrix.shape[0] == 0:
+        return False
+    rows = np.linspace(0, matrix.shape[0] - 1, num=min(sample, matrix.shape[0]), dtype=np.int64)
+    norms = np.linalg.norm(matrix[rows], axis=1)
+    return bool(np.allclose(norms, 1.0, atol=atol))
+
+# --- Segmento ---
+class Segment:
+    """Bloco de capacidade fixa, pré-alocado; só as primeiras `size` linhas são válidas."""
+    def __init__(self, segment_id: int, data: np.ndarray, size: int, level: int = 0, dirty: bool = True):
+        self.segment_id = segment_id
+        self.data = data
+        self.size = size
+        self.level = level
+        self.dirty = dirty
+
+    @property
+    def capacity(self) -> int:
+        return self.data.shape[0]
+
+    @property
+    def rows(self) -> np.ndarray:
+        return self.data[:self.size]
+
+    @property
+    def writable(self) -> bool:
+        return self.size < self.capacity and self.data.flags.writeable
+
+    @property
+    def file_name(self) -> str:
+        return f"segment_{self.segment_id:06d}.npy"
+
+# --- Store segmentado ---
+class SegmentedEmbeddingStore:
+    """
+    Armazena embeddings em segmentos pré-alocados, evitando o np.vstack por inserção
+    (que copia a matriz inteira a cada documento). Segmentos cheios são fundidos em
+    camadas (estilo LSM): `merge_factor` segmentos do mesmo nível viram um do nível
+    seguinte, o que mantém poucos segmentos com custo total O(n log n).
+    Persiste como vários arquivos .npy mais um manifest.json.
+    """
+    def __init__(self, dim: Optional[int] = None, dtype=np.float32, segment_capacity: int = 4096,
+                 merge_factor: int = 8, normalized: bool = False):
+        self.dim = dim
+        self.dtype = np.dtype(dtype)
+        self.segment_capacity = segment_capacity
+        self.merge_factor = merge_factor
+        self.normalized = normalized
+        self.segments: List[Segment] = []
+        self._next_id = 0
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def _new_segment(self, data: np.ndarray, size: int, level: int = 0, dirty: bool = True) -> Segment:
+        segment = Segment(self._next_id, data, size, level=level, dirty=dirty)
+        self._next_id += 1
+        self.segments.append(segment)
+        return segment
+
+    def _prepare(self, rows: np.ndarray) -> np.ndarray:
+        rows = np.asarray(rows)
+        if rows.ndim == 1:
+            rows = rows.reshape(1, -1)
+        if self.dim is None:
+            self.dim = rows.shape[1]
+        if rows.shape[1] != self.dim:
+            raise ValueError(f"Embedding dimension {rows.shape[1]} does not match store dimension {self.dim}")
+        if self.normalized:
+            return normalize_rows(rows)
+        return rows.astype(self.dtype, copy=False)
+
+    def append(self, rows: np.ndarray) -> int:
+        """Acrescenta linhas preenchendo o último segmento; retorna a posição global da primeira."""
+        rows = self._prepare(rows)
+        start = self._count
+        written = 0
+        while written < rows.shape[0]:
+            if not self.segments or not self.segments[-1].writable:
+                self._maybe_merge()
+                self._new_segment(np.empty((self.segment_capacity, self.dim), dtype=self.dtype), 0)
+            segment = self.segments[-1]
+            n = min(segment.capacity - segment.size, rows.shape[0] - written)
+            segment.data[segment.size:segment.size + n] = rows[written:written + n]
+            segment.size += n
+            segment.dirty = True
+            written += n
+        self._count += rows.shape[0]
+        return start
+
+    def add_segment(self, rows: np.ndarray):
+        """Adiciona uma matriz inteira como segmento selado, sem copiar (ex.: np.memmap)."""
+        if rows.shape[0] == 0:
+            return
+        if self.dim is None:
+            self.dim = rows.shape[1]
+        self._new_segment(rows, rows.shape[0], dirty=not isinstance(rows, np.memmap))
+        self._count += rows.shape[0]
+
+    def _merge(self, segments: List[Segment], level: int) -> Segment:
+        data = np.concatenate([s.rows for s in segments], axis=0)
+        merged = Segment(self._next_id, data, data.shape[0], level=level)
+        self._next_id += 1
+        return merged
+
+    def _maybe_merge(self):
+        # Só funde segmentos selados (todos, já que o último está cheio ao chamar aqui)
+        while len(self.segments) >= self.merge_factor:
+            tail = self.segments[-self.merge_factor:]
+            level = tail[0].level
+            if any(s.level != level for s in tail):
+                break
+            self.segments[-self.merge_factor:] = [self._merge(tail, level + 1)]
+
+    def compact(self):
+        """Funde todos os segmentos em um único (ex.: ao final de um crawl)."""
+        if len(self.segments) > 1:
+            level = max(s.level for s in self.segments) + 1
+            self.segments = [self._merge(self.segments, level)]
+
+    def iter_segments(self) -> Iterator[Tuple[int, np.ndarray]]:
+        """Percorre (posição global inicial, linhas válidas) de cada segmento."""
+        offset = 0
+        for segment in self.segments:
+            if segment.size:
+                yield offset, segment.rows
+            offset += segment.size
+
+    def take(self, indices: np.ndarray) -> np.ndarray:
+        """Linhas nas posições globais pedidas (copia só essas linhas, mesmo via mmap)."""
+        indices = np.asarray(indices, dtype=np.int64)
+        out = np.empty((indices.shape[0], self.dim), dtype=self.dtype)
+        starts = np.cumsum([0] + [s.size for s in self.segments])
+        owners = np.searchsorted(starts, indices, side="right") - 1
+        for seg_idx in np.unique(owners):
+            mask = owners == seg_idx
+            out[mask] = self.segments[seg_idx].rows[indices[mask] - starts[seg_idx]]
+        return out
+
+    def to_array(self) -> Optional[np.ndarray]:
+        """Matriz única com todas as linhas (sem cópia quando há um só segmento)."""
+        if self._count == 0:
+            return None
+        if len(self.segments) == 1:
+            return self.segments[0].rows
+        return np.concatenate([s.rows for s in self.segments if s.size], axis=0)
+
+    def save(self, directory: str):
+        """Grava só os segmentos alterados, o manifest e remove arquivos de segmentos fundidos."""
+        os.makedirs(directory, exist_ok=True)
+        for segment in self.segments:
+            if segment.dirty:
+                path = os.path.join(directory, segment.file_name)
+                tmp_path = path + ".tmp"
+                with open(tmp_path, "wb") as f:
+                    np.save(f, segment.rows)
+                os.replace(tmp_path, path)
+                segment.dirty = False
+        manifest = {
+            "dim": self.dim,
+            "dtype": self.dtype.name,
+            "normalized": self.normalized,
+            "count": self._count,
+            "next_segment_id": self._next_id,
+            "segments": [
+                {"id": s.segment_id, "file": s.file_name, "rows": s.size, "level": s.level}
+                for s in self.segments if s.size
+            ],
+        }
+        tmp_manifest = os.path.join(directory, MANIFEST_NAME + ".tmp")
+        with open(tmp_manifest, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp_manifest, os.path.join(directory, MANIFEST_NAME))
+        live = {s.file_name for s in self.segments}
+        for name in os.listdir(directory):
+            if name.startswith("segment_") and name.endswith(".npy") and name not in live:
+                os.remove(os.path.join(directory, name))
+
+    @classmethod
+    def load(cls, directory: str, mmap: bool = False, **kwargs) -> "SegmentedEmbeddingStore":
+        with open(os.path.join(directory, MANIFEST_NAME), "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        store = cls(dim=manifest["dim"], dtype=manifest["dtype"], normalized=manifest.get("normalized", False), **kwargs)
+        for entry in manifest["segments"]:
+            data = np.load(os.path.join(directory, entry["file"]), mmap_mode="r" if mmap else None)
+            store.segments.append(Segment(entry["id"], data, entry["rows"], level=entry.get("level", 0), dirty=False))
+            store._count += entry["rows"]
+        store._next_id = manifest.get("next_segment_id", len(store.segments))
+        return store
+
+    @classmethod
+    def open(cls, data_dir: str, mmap: bool = False, **kwargs) -> "SegmentedEmbeddingStore":
+        """
+        Abre os embeddings de um diretório de dados: segments/manifest.json se existir,
+        senão o embeddings.npy legado como segmento único, senão um store vazio.
+        """
+        segments_dir = os.path.join(data_dir, SEGMENTS_DIR)
+        if os.path.exists(os.path.join(segments_dir, MANIFEST_NAME)):
+            return cls.load(segments_dir, mmap=mmap, **kwargs)
+        store = cls(**kwargs)
+        legacy_path = os.path.join(data_dir, "embeddings.npy")
+        if os.path.exists(legacy_path):
+            legacy = np.load(legacy_path, mmap_mode="r" if mmap else None)
+            if store.normalized and not is_normalized(legacy):
+                legacy = normalize_rows(legacy)
+            store.dtype = legacy.dtype
+            store.add_segment(legacy)
+            store.segments[-1].dirty = True  # Será migrado para segments/ no próximo save
+        return store
+
+def has_embeddings(data_dir: str) -> bool:
+    return (os.path.exists(os.path.join(data_dir, SEGMENTS_DIR, MANIFEST_NAME))
+            or os.path.exists(os.path.join(data_dir, "embeddings.npy")))
+
+def load_embeddings(data_dir: str, mmap: bool = False) -> Optional[np.ndarray]:
+    """Atalho para ferramentas offline: todos os embeddings do diretório como uma matriz."""
+    return SegmentedEmbeddingStore.open(data_dir, mmap=mmap).to_array()
@@ -0,0 +1,204 @@
+import heapq
+import itertools
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+from urllib.parse import urlparse
+import numpy as np
+from database.content_store import content_dir, write_content_store
+from database.document_registry import DocumentRegistry, parent_key, registry_path
+from database.faiss_index import build_index, set_search_params, write_index, write_manifest
+from database.lexical_index import build_lexical_index, collection_avgdl, collection_stats, lexical_index_path
+from database.metadata_filters import DocumentAttributes, _as_list, _filter_value, attributes_path
+from database.segment_store import SEGMENTS_DIR, SegmentedEmbeddingStore
+from database.vector_store import PASSAGE_FANOUT, FaissIndexAgent, fuse_hybrid
+from ingestion.chunking import dedupe_by_parent
+
+SHARDS_NAME = "shards.json"
+SHARDS_DIR = "shards"
+PARTITIONS = ("host", "hash")
+
+def shard_key(doc: Dict, partition: str, n_shards: int) -> str:
+    """
+    Shard de um documento. "host": um shard por host (ufpb.br, www.ufpb.br/inova...);
+    "hash": parent_id módulo n_shards, mantendo as passagens de um documento juntas.
+    """
+    if partition == "host":
+        return urlparse(doc.get("url", "")).netloc.lower() or "sem-host"
+    if partition == "hash":
+        return f"shard_{parent_key(doc) % n_shards:03d}"
+    raise ValueError(f"Unknown partition '{partition}'. Options: {', '.join(PARTITIONS)}")
+
+def has_shards(data_dir: str) -> bool:
+    return os.path.exists(os.path.join(data_dir, SHARDS_NAME))
+
+def read_shards(data_dir: str) -> Dict:
+    with open(os.path.join(data_dir, SHARDS_NAME), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def write_shards(data_dir: str, manifest: Dict):
+    path = os.path.join(data_dir, SHARDS_NAME)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+def build_shard(shard_dir: str, documents: List[Dict], embeddings: np.ndarray, index_type: str = "flat",
+                metric: str = "ip", model: Optional[str] = None, nprobe: Optional[int] = None,
+                ef_search: Optional[int] = None, registry: Optional[DocumentRegistry] = None, **params) -> Dict:
+    """
+    Grava um diretório de dados completo e independente, no mesmo layout lido pelo
+    FaissIndexAgent: content/, segments/, bm25.npz, attributes.npz, registry.npz e faiss.index.
+    """
+    os.makedirs(shard_dir, exist_ok=True)
+    write_content_store(content_dir(shard_dir), documents)
+    vectors = SegmentedEmbeddingStore(normalized=metric == "ip")
+    vectors.append(embeddings)
+    vectors.save(os.path.join(shard_dir, SEGMENTS_DIR))
+    build_lexical_index(documents).save(lexical_index_path(shard_dir))
+    DocumentAttributes.build(documents).save(attributes_path(shard_dir))
+    (registry or DocumentRegistry.build(documents)).save(registry_path(shard_dir))
+    matrix = np.ascontiguousarray(vectors.to_array(), dtype=np.float32)
+    index = build_index(matrix, index_type, metric, **params)
+    set_search_params(index, nprobe=nprobe, ef_search=ef_search)
+    write_index(index, os.path.join(shard_dir, "faiss.index"))
+    manifest = {
+        "model": model,
+        "dim": int(matrix.shape[1]),
+        "metric": metric,
+        "index_type": index_type,
+        "params": {key: value for key, value in params.items() if value is not None},
+        "nprobe": nprobe if "nlist" in params else None,
+        "ef_search": ef_search if index_type == "hnsw" else None,
+        "count": int(matrix.shape[0]),
+        "built_at": datetime.now().isoformat(),
+    }
+    write_manifest(shard_dir, manifest)
+    return manifest
+
+# --- Store particionado (scatter-gather) ---
+class ShardedVectorStore:
+    """
+    Vários diretórios de dados independentes (shards), listados em data_dir/shards.json,
+    cada um com seu FaissIndexAgent. A busca é espalhada por um pool de threads (o FAISS e o
+    numpy liberam o GIL durante a busca) e os top-k de cada shard, já ordenados, são
+    intercalados por heap. Com partição por host, um filtro de host só consulta os shards
+    daquele host. Um shard novo entra com add_shard, sem reconstruir os outros.
+    """
+    def __init__(self, data_dir="data", mmap=False, nprobe=None, ef_search=None, rescore=True,
+                 workers: Optional[int] = None):
+        self.data_dir = data_dir
+        self.options = dict(mmap=mmap, nprobe=nprobe, ef_search=ef_search, rescore=rescore)
+        manifest = read_shards(data_dir)
+        self.partition = manifest.get("partition", "hash")
+        self.shards: List[Dict] = []
+        self.agents: List[FaissIndexAgent] = []
+        # Incrementado a cada escrita (shard novo, delete): caches de respostas deixam de valer
+        self.generation = 0
+        for entry in manifest["shards"]:
+            self._open(entry)
+        self._share_avgdl()
+        self.executor = ThreadPoolExecutor(max_workers=workers or max(1, min(len(self.shards), os.cpu_count() or 1)),
+                                           thread_name_prefix="shard-search")
+
+    def _open(self, entry: Dict):
+        self.agents.append(FaissIndexAgent(os.path.join(self.data_dir, entry["dir"]), **self.options))
+        self.shards.append(entry)
+
+    def _share_avgdl(self):
+        """BM25 de cada shard normalizado pelo tamanho médio de documento da coleção inteira."""
+        avgdl = collection_avgdl(agent.lexical for agent in self.agents)
+        for agent in self.agents:
+            if agent.lexical is not None:
+                agent.lexical.set_avgdl(avgdl)
+
+    @property
+    def manifest(self) -> Dict:
+        return self.agents[0].manifest if self.agents else {}
+
+    @property
+    def documents(self) -> Iterable[Dict]:
+        """Documentos de todos os shards, em ordem de shard (só para listagens)."""
+        return itertools.chain.from_iterable(agent.documents for agent in self.agents)
+
+    def __len__(self):
+        return sum(len(agent.documents) for agent in self.agents)
+
+    def add_shard(self, name: str, shard_dir: str, hosts: Optional[List[str]] = None):
+        """Registra um shard já construído (ver build_shard); os demais não são tocados."""
+        if any(entry["name"] == name for entry in self.shards):
+            raise ValueError(f"Shard '{name}' already exists")
+        entry = {"name": name, "dir": os.path.relpath(shard_dir, self.data_dir), "hosts": hosts or []}
+        self._open(entry)
+        self._share_avgdl()
+        self.generation += 1
+        write_shards(self.data_dir, {"partition": self.partition, "shards": self.shards})
+
+    def _targets(self, filters) -> List[int]:
+        """Shards que podem ter resultados: com partição por host, poda pelo filtro de host."""
+        hosts = {host.lower() for host in _as_list(_filter_value(filters, "host"))} if filters else set()
+        if self.partition != "host" or not hosts:
+            return list(range(len(self.agents)))
+        return [i for i, entry in enumerate(self.shards) if hosts & set(entry.get("hosts", []))]
+
+    def search(self, query_embedding: np.ndarray, k=5, threshold=None, query_text=None, filters=None):
+        """
+        Mesmo contrato do FaissVectorStore.search. Cada resultado ganha 'shard'. Na busca
+        híbrida a fusão é feita uma vez, aqui: os rankings denso e BM25 de cada shard são
+        juntados e o RRF usa as posições globais (ver fuse_hybrid). Os shards pontuam o BM25
+        com as estatísticas da coleção inteira (df, total de documentos e avgdl), então o
+        ranking lexical juntado é o mesmo de um índice único.
+        """
+        return self.search_batch(query_embedding, k, threshold, [query_text], filters)[0]
+
+    def search_batch(self, query_embeddings: np.ndarray, k=5, threshold=None, query_texts=None, filters=None):
+        """Lote de consultas: um search_batch por shard, em paralelo, e o merge por consulta."""
+        queries = np.asarray(query_embeddings).reshape(-1, np.shape(query_embeddings)[-1])
+        query_texts = query_texts or [None] * len(queries)
+        targets = self._targets(filters)
+        if not targets:
+            return [[] for _ in queries]
+        # Consultas híbridas voltam sem fusão (fuse=False): o RRF por shard não é comparável entre shards.
+        # O BM25 de cada shard usa o df e o total de documentos da coleção (o avgdl já é o global)
+        stats = collection_stats((agent.lexical for agent in self.agents), query_texts) if any(query_texts) else None
+        futures = [
+            (i, self.executor.submit(self.agents[i].search_batch, queries, k, threshold, query_texts, filters, False,
+                                     stats))
+            for i in targets
+        ]
+        per_query = [[] for _ in queries]
+        for i, future in futures:
+            for row, results in enumerate(future.result()):
+                for result in results:
+                    result["shard"] = self.shards[i]["name"]
+                per_query[row].append(results)
+        merged = []
+        for lists, query_text in zip(per_query, query_texts):
+            if query_text:
+                candidates = fuse_hybrid(list(itertools.chain.from_iterable(lists)), k * PASSAGE_FANOUT)
+            else:
+                # Cada lista já vem em ordem decrescente de cosseno: heapq.merge intercala sem reordenar tudo
+                candidates = heapq.merge(*lists, key=lambda result: -result["score"])
+            merged.append(dedupe_by_parent(candidates, k))
+        return merged
+
+    def delete(self, parents: Iterable[str] = (), ids: Iterable[int] = ()) -> int:
+        """
+        Tombstones em todos os shards. O partition_shards.py preserva os IDs do registro
+        original em cada shard, então um ID identifica uma única passagem. Retorna quantas.
+        """
+        parents, ids = list(parents), list(ids)
+        removed = sum(agent.delete(parents, ids) for agent in self.agents)
+        self.generation += 1
+        return removed
+
+    def save(self):
+        for agent in self.agents:
+            agent.save()
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+        for agent in self.agents:
+            agent.close()
@@ -0,0 +1,83 @@
+import os
+import shutil
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+SNAPSHOTS_DIR = "snapshots"
+CURRENT_NAME = "CURRENT"
+
+# --- Snapshots versionados do índice ---
+# data_dir/snapshots/<versão>/ é um diretório de dados completo (o layout lido pelo Agent) e
+# data_dir/CURRENT guarda o nome da versão ativa. Publicar é trocar CURRENT atomicamente:
+# quem já abriu uma versão continua nela até recarregar. Sem CURRENT, vale o próprio data_dir.
+
+def snapshot_dir(data_dir: str, version: str) -> str:
+    return os.path.join(data_dir, SNAPSHOTS_DIR, version)
+
+def current_version(data_dir: str) -> Optional[str]:
+    path = os.path.join(data_dir, CURRENT_NAME)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read().strip() or None
+
+def resolve_data_dir(data_dir: str, version: Optional[str] = None) -> Tuple[str, Optional[str]]:
+    """Diretório a carregar e sua versão (a de CURRENT, se nenhuma for pedida)."""
+    version = version or current_version(data_dir)
+    if version is None:
+        return data_dir, None
+    path = snapshot_dir(data_dir, version)
+    if not os.path.isdir(path):
+        raise ValueError(f"Snapshot '{version}' not found in {os.path.join(data_dir, SNAPSHOTS_DIR)}")
+    return path, version
+
+def list_snapshots(data_dir: str) -> List[str]:
+    """Versões publicadas, da mais antiga para a mais nova (nomes com timestamp ordenam por data)."""
+    root = os.path.join(data_dir, SNAPSHOTS_DIR)
+    if not os.path.isdir(root):
+        return []
+    return sorted(name for name in os.listdir(root)
+                  if os.path.isdir(os.path.join(root, name)) and not name.endswith(".tmp"))
+
+def set_current(data_dir: str, version: str):
+    if not os.path.isdir(snapshot_dir(data_dir, version)):
+        raise ValueError(f"Snapshot '{version}' not found in {os.path.join(data_dir, SNAPSHOTS_DIR)}")
+    path = os.path.join(data_dir, CURRENT_NAME)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(version + "\n")
+    os.replace(tmp_path, path)
+
+def publish_snapshot(data_dir: str, source_dir: str, version: Optional[str] = None, move: bool = False) -> str:
+    """
+    Copia (ou move) um diretório de dados pronto para data_dir/snapshots/<versão> e o torna
+    o CURRENT. A cópia vai para um .tmp e só é renomeada completa, então um leitor nunca vê
+    um snapshot pela metade. Retorna a versão publicada.
+    """
+    version = version or datetime.now().strftime("%Y%m%d-%H%M%S")
+    target = snapshot_dir(data_dir, version)
+    if os.path.exists(target):
+        raise ValueError(f"Snapshot '{version}' already exists")
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    tmp_dir = target + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    if move:
+        shutil.move(source_dir, tmp_dir)
+    else:
+        shutil.copytree(source_dir, tmp_dir)
+    os.rename(tmp_dir, target)
+    set_current(data_dir, version)
+    return version
+
+def prune_snapshots(data_dir: str, keep: int = 2) -> List[str]:
+    """
+    Apaga as versões mais antigas, mantendo as `keep` mais novas e sempre a CURRENT.
+    Processos que ainda mapeiam arquivos de uma versão apagada seguem lendo-os (o espaço só
+    é liberado quando o último mapeamento fecha). Retorna as versões apagadas.
+    """
+    current = current_version(data_dir)
+    versions = list_snapshots(data_dir)
+    removed = [version for version in versions[:max(0, len(versions) - keep)] if version != current]
+    for version in removed:
+        shutil.rmtree(snapshot_dir(data_dir, version), ignore_errors=True)
+    return removed
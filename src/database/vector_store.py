@@ -1,38 +1,265 @@
 import numpy as np
-import json
 import os
-from typing import List, Dict
-from sklearn.metrics.pairwise import cosine_similarity
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Iterable, List, Dict, Optional
 import faiss
+from database.search_engine import CosineSearchEngine, top_k
+from database.segment_store import (
+    SEGMENTS_DIR, MANIFEST_NAME, SegmentedEmbeddingStore, has_embeddings, is_normalized, normalize_rows
+)
+from database.quantization import codes_dir, has_codes
+from database.lexical_index import BM25Index, build_lexical_index, lexical_index_path, load_lexical_index, reciprocal_rank_fusion
+from ingestion.chunking import dedupe_by_parent
+from database.faiss_index import (
+    QUANTIZED_INDEX_TYPES, filtered_search_params, flat_vectors, index_metric, prepare_query, read_index, read_manifest,
+    reconstruct_vectors, set_search_params, write_index, write_manifest
+)
+from database.content_store import ContentStore, content_dir, open_documents, write_content_store
+from database.metadata_filters import DocumentAttributes, attributes_path, load_attributes
+from database.document_registry import (
+    COMPACTION_THRESHOLD, DocumentRegistry, combine_masks, load_registry, registry_path
+)
+from database.compaction import compact_data_dir, FAISS_INDEX_NAME
+
+# Passagens buscadas por resultado final: várias podem vir do mesmo documento
+PASSAGE_FANOUT = 3
+
+# Pausa entre blocos copiados na compactação em segundo plano (cede a CPU às buscas)
+COMPACTION_PAUSE = 0.002
+
+# Lotes a partir deste tamanho, num índice flat, viram uma multiplicação de matrizes (BLAS):
+# a busca exaustiva do FAISS processa as consultas uma a uma abaixo de 128000 por chamada
+BATCH_GEMM_MIN = 8
+
+def materialize(documents: List[Dict], ids: np.ndarray, scores: np.ndarray,
+                registry: Optional[DocumentRegistry] = None) -> List[Dict]:
+    """
+    Converte (linhas, scores) em cópias dos documentos com o campo 'score' e, com o
+    registro, 'doc_id' (ID estável, que sobrevive a compactações; usado em delete).
+    """
+    results = []
+    for idx, score in zip(ids, scores):
+        if idx < 0 or idx >= len(documents):
+            continue
+        doc = documents[idx].copy()
+        doc['score'] = float(score)
+        if registry is not None and idx < len(registry):
+            doc['doc_id'] = int(registry.ids[idx])
+        results.append(doc)
+    return results
+
+def hybrid_candidates(documents: List[Dict], lexical: Optional[BM25Index], dense_ids: np.ndarray, dense_scores: np.ndarray,
+                      query_text: str, k: int, mask: Optional[np.ndarray] = None,
+                      registry: Optional[DocumentRegistry] = None,
+                      similarity: Optional[Callable[[np.ndarray], Optional[np.ndarray]]] = None,
+                      lexical_stats: Optional[Dict] = None) -> List[Dict]:
+    """
+    Candidatos da busca híbrida, ainda sem fusão: as passagens do ranking denso (com
+    'dense_rank') seguidas das que só o BM25 trouxe, todas com 'score' = cosseno e, se
+    vieram do BM25, 'bm25_score'. similarity(linhas) dá o cosseno das que só o BM25 trouxe;
+    sem ela (ou devolvendo None, quando o índice não guarda os vetores) elas ficam de fora.
+    lexical_stats (collection_stats) calcula o BM25 com o df da coleção inteira (shards).
+    """
+    if lexical is not None:
+        lexical_ids, lexical_scores = lexical.search(query_text, k, mask, lexical_stats)
+    else:
+        lexical_ids, lexical_scores = np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+    dense = set(dense_ids.tolist())
+    lexical_only = np.array([idx for idx in lexical_ids.tolist() if idx not in dense], dtype=np.int64)
+    measured = similarity(lexical_only) if len(lexical_only) and similarity is not None else None
+    ids, scores = dense_ids, dense_scores
+    if measured is not None:
+        ids = np.concatenate([dense_ids, lexical_only])
+        scores = np.concatenate([dense_scores, np.asarray(measured, dtype=np.float32)])
+    bm25 = dict(zip(lexical_ids.tolist(), lexical_scores.tolist()))
+    results = materialize(documents, ids, scores, registry)
+    for rank, (doc, idx) in enumerate(zip(results, ids.tolist())):
+        if rank < len(dense_ids):
+            doc['dense_rank'] = rank
+        if idx in bm25:
+            doc['bm25_score'] = bm25[idx]
+    return results
+
+def fuse_hybrid(candidates: List[Dict], k: int) -> List[Dict]:
+    """
+    Reciprocal rank fusion dos candidatos (de um índice ou de vários shards juntos): o
+    ranking denso é a ordem por cosseno das passagens com 'dense_rank', o lexical a ordem
+    por 'bm25_score'. O RRF só define a ordem e fica em 'rrf_score'; 'score' segue o cosseno.
+
+    Passagens que casam só por termos exatos (número de edital, código de disciplina, nome
+    próprio) entram mesmo abaixo do threshold, mas apenas quando ao menos uma passagem
+    densa passou dele: sem nenhuma, a pergunta não tem contexto relevante e o resultado é vazio.
+    """
+    dense = sorted((i for i, doc in enumerate(candidates) if 'dense_rank' in doc),
+                   key=lambda i: -candidates[i]['score'])[:k]
+    if not dense:
+        return []
+    lexical = sorted((i for i, doc in enumerate(candidates) if 'bm25_score' in doc),
+                     key=lambda i: -candidates[i]['bm25_score'])[:k]
+    order, fused = reciprocal_rank_fusion([np.array(dense, dtype=np.int64), np.array(lexical, dtype=np.int64)], k)
+    results = []
+    for i, rrf in zip(order.tolist(), fused.tolist()):
+        candidates[i]['rrf_score'] = rrf
+        results.append(candidates[i])
+    return results
+
+def hybrid_results(documents: List[Dict], lexical: BM25Index, dense_ids: np.ndarray, dense_scores: np.ndarray,
+                   query_text: str, k: int, mask: Optional[np.ndarray] = None,
+                   registry: Optional[DocumentRegistry] = None,
+                   similarity: Optional[Callable[[np.ndarray], Optional[np.ndarray]]] = None) -> List[Dict]:
+    """Busca híbrida de um índice: hybrid_candidates seguido de fuse_hybrid."""
+    if len(dense_ids) == 0:
+        return []
+    return fuse_hybrid(hybrid_candidates(documents, lexical, dense_ids, dense_scores, query_text, k, mask,
+                                         registry, similarity), k)
+
+def load_sidecars(data_dir: str, documents, persist: bool = True):
+    """
+    (BM25, atributos, registro) alinhados com os documentos de data_dir. Os arquivos ausentes
+    (bm25.npz, attributes.npz, registry.npz) ou desatualizados são reconstruídos, o que
+    decodifica todo o ContentStore, e com persist=True gravados: a próxima carga só lê os .npz.
+    """
+    lexical = load_lexical_index(data_dir, len(documents))
+    rebuilt = []
+    if lexical is None:
+        lexical = build_lexical_index(documents)
+        rebuilt.append(lexical_index_path(data_dir))
+    missing = [path for path in (attributes_path(data_dir), registry_path(data_dir)) if not os.path.exists(path)]
+    attributes = load_attributes(data_dir, documents)
+    registry = load_registry(data_dir, documents)
+    rebuilt += missing
+    if persist and rebuilt:
+        try:
+            lexical.save(lexical_index_path(data_dir))
+            attributes.save(attributes_path(data_dir))
+            registry.save(registry_path(data_dir))
+            print(f"[Índices auxiliares] {', '.join(os.path.basename(path) for path in rebuilt)} "
+                  f"reconstruído(s) e gravado(s) em {data_dir}")
+        except OSError as e:
+            # Diretório somente leitura: segue com os índices em memória
+            print(f"[Índices auxiliares] não foi possível gravar em {data_dir}: {e}")
+    return lexical, attributes, registry
+
+def run_compaction(store, label: str):
+    """
+    Alvo da thread de compactação em segundo plano: uma falha fica em store.compaction_error
+    (exposto no /health) e no log, em vez de encerrar a thread sem ninguém ver.
+    """
+    try:
+        store.compact()
+        store.compaction_error = None
+    except Exception as e:
+        store.compaction_error = f"{type(e).__name__}: {e}"
+        print(f"[{label}] Compactação falhou, tombstones mantidos: {store.compaction_error}")
 
 # --- Agente de Indexação ---
 class IndexAgent:
-    def __init__(self):
+    def __init__(self, quantization: str = "none", rescore: bool = True):
         self.documents = []
-        self.embeddings = None
+        # Embeddings ficam normalizados (float32) uma única vez, na entrada, em segmentos
+        self.engine = CosineSearchEngine(quantization=quantization, rescore=rescore)
+        # Índice lexical (BM25) alinhado com os documentos, para a busca híbrida
+        self.lexical = BM25Index()
+        # Atributos colunares (tipo, host, caminho, data de coleta) para filtros
+        self.attributes = DocumentAttributes()
+        # IDs estáveis e tombstones das linhas
+        self.registry = DocumentRegistry()
+
+    @property
+    def embeddings(self):
+        return self.engine.matrix
 
     def add_documents(self, documents: List[Dict[str, str]], embeddings: np.ndarray):
         if len(documents) != embeddings.shape[0]:
             raise ValueError("Number of documents must match number of embeddings")
-        if self.embeddings is None:
-            self.embeddings = embeddings
-        else:
-            self.embeddings = np.vstack([self.embeddings, embeddings])
+        self.engine.add(embeddings)
         self.documents.extend(documents)
+        self.lexical.add(doc.get("content", "") for doc in documents)
+        self.attributes.add(documents, default_date=datetime.now().isoformat())
+        return self.registry.add(documents)
+
+    def upsert(self, documents: List[Dict[str, str]], embeddings: np.ndarray) -> np.ndarray:
+        """
+        Substitui os documentos de origem presentes em `documents` (mesmo parent_id/URL):
+        as passagens antigas viram tombstones e as novas são anexadas. Retorna os IDs novos.
+        """
+        if len(documents) != embeddings.shape[0]:
+            raise ValueError("Number of documents must match number of embeddings")
+        self.registry.delete_parents({doc.get("parent_id") or doc.get("url", "") for doc in documents})
+        return self.add_documents(documents, embeddings)
+
+    def delete(self, parents: Iterable[str] = (), ids: Iterable[int] = ()) -> int:
+        """Remove documentos (parent_id ou URL) e/ou passagens (IDs estáveis). Retorna quantas passagens."""
+        return self.registry.delete_parents(parents) + self.registry.delete_ids(ids)
+
+    def _live_blocks(self, rows: np.ndarray):
+        """
+        Copia as linhas vivas em blocos do tamanho de um segmento, com uma pausa entre eles:
+        cada cópia segura o GIL/CPU por pouco tempo e as buscas concorrentes passam na frente.
+        """
+        step = self.engine.segment_capacity
+        for start in range(0, len(rows), step):
+            yield self.engine.store.take(rows[start:start + step])
+            time.sleep(COMPACTION_PAUSE)
+
+    def compacted(self) -> "IndexAgent":
+        """
+        Cópia só com as linhas vivas (IDs preservados). Não altera este agente:
+        pode rodar em segundo plano enquanto ele continua atendendo buscas.
+        """
+        rows = self.registry.live_rows()
+        agent = IndexAgent(quantization=self.engine.quantization, rescore=self.engine.rescore)
+        agent.documents = [self.documents[int(i)] for i in rows]
+        agent.engine.build_from_segments(self._live_blocks(rows))
+        agent.lexical = self.lexical.subset(rows)
+        agent.attributes = self.attributes.subset(rows)
+        agent.registry = self.registry.subset(rows)
+        return agent
 
     def save(self, directory: str):
+        """
+        Grava documentos em directory/content (ContentStore). Se os documentos vieram desse
+        mesmo store, só os novos são anexados; senão o store é regravado por inteiro.
+        """
         os.makedirs(directory, exist_ok=True)
-        with open(os.path.join(directory, "documents.json"), "w", encoding="utf-8") as f:
-            json.dump(self.documents, f)
-        if self.embeddings is not None:
-            np.save(os.path.join(directory, "embeddings.npy"), self.embeddings)
-
-    def load(self, directory: str):
-        with open(os.path.join(directory, "documents.json"), "r", encoding="utf-8") as f:
-            self.documents = json.load(f)
+        target = content_dir(directory)
+        if isinstance(self.documents, ContentStore) and \
+                os.path.abspath(self.documents.directory) == os.path.abspath(target):
+            self.documents.flush()
+        else:
+            write_content_store(target, self.documents)
+        self.lexical.save(lexical_index_path(directory))
+        self.attributes.save(attributes_path(directory))
+        self.registry.save(registry_path(directory))
+        if len(self.engine):
+            self.engine.save(os.path.join(directory, SEGMENTS_DIR),
+                             codes_directory=codes_dir(directory, self.engine.quantization))
+
+    def load(self, directory: str, mmap: bool = False):
+        """
+        Carrega documentos (content/ ou o documents.json legado) e embeddings (segments/ ou
+        o embeddings.npy legado). Com mmap=True os arquivos são mapeados somente leitura, e
+        vários processos compartilham a mesma cópia no page cache.
+        """
+        self.documents = open_documents(directory)
+        self.lexical = load_lexical_index(directory, len(self.documents)) or build_lexical_index(self.documents)
+        self.attributes = load_attributes(directory, self.documents)
+        self.registry = load_registry(directory, self.documents)
+        segments_dir = os.path.join(directory, SEGMENTS_DIR)
         embeddings_path = os.path.join(directory, "embeddings.npy")
-        if os.path.exists(embeddings_path):
-            self.embeddings = np.load(embeddings_path)
+        if os.path.exists(os.path.join(segments_dir, MANIFEST_NAME)):
+            quantization = self.engine.quantization
+            self.engine.load(segments_dir, mmap=mmap,
+                             codes_directory=codes_dir(directory, quantization) if has_codes(directory, quantization) else None)
+        elif os.path.exists(embeddings_path):
+            embeddings = np.load(embeddings_path, mmap_mode="r" if mmap else None)
+            if mmap and not is_normalized(embeddings):
+                # Arquivo legado (não normalizado): a normalização gera uma cópia privada
+                print(f"[IndexAgent] {embeddings_path} não está normalizado; "
+                      "rode save() uma vez para habilitar o compartilhamento via mmap.")
+            self.engine.build(embeddings)
 
 # --- Agente de Busca ---
 class SearchAgent:
@@ -40,79 +267,420 @@ class SearchAgent:
         self.index_agent = index_agent
         self.similarity_threshold = similarity_threshold
 
-    def search(self, query_embedding: np.ndarray, k: int = 5) -> List[Dict]:
-        if self.index_agent.embeddings is None or len(self.index_agent.documents) == 0:
+    def search(self, query_embedding: np.ndarray, k: int = 5, threshold: Optional[float] = None,
+               query_text: Optional[str] = None, filters=None) -> List[Dict]:
+        """
+        Com query_text, funde a busca densa com o BM25 (ver hybrid_results).
+        filters (content_type, host, path_prefix, crawled_after) vira uma máscara
+        aplicada antes do cálculo de similaridade.
+        """
+        # Uma referência só: uma compactação em segundo plano pode trocar o agente no meio da busca
+        agent = self.index_agent
+        documents = agent.documents
+        if len(agent.engine) == 0 or len(documents) == 0:
             return []
-        query_embedding = query_embedding.reshape(1, -1)
-        similarities = cosine_similarity(query_embedding, self.index_agent.embeddings)[0]
-        valid_indices = np.where(similarities >= self.similarity_threshold)[0]
-        if len(valid_indices) == 0:
+        mask = combine_masks(agent.attributes.mask(filters), agent.registry.live_mask())
+        if mask is not None and not mask.any():
             return []
-        valid_indices = valid_indices[np.argsort(similarities[valid_indices])[::-1]]
-        valid_indices = valid_indices[:k]
-        results = []
-        for idx in valid_indices:
-            result = self.index_agent.documents[idx].copy()
-            result['score'] = float(similarities[idx])
-            results.append(result)
-        return results
+        threshold = self.similarity_threshold if threshold is None else threshold
+        # Busca passagens extras para sobrar k documentos distintos após a deduplicação
+        indices, scores = agent.engine.search(query_embedding, k * PASSAGE_FANOUT, threshold, mask=mask)
+        if query_text:
+            query = normalize_rows(np.asarray(query_embedding, dtype=np.float32).reshape(1, -1))[0]
+            results = hybrid_results(documents, agent.lexical, indices, scores, query_text,
+                                     k * PASSAGE_FANOUT, mask, agent.registry,
+                                     similarity=lambda rows: agent.engine.store.take(rows) @ query)
+        else:
+            results = materialize(documents, indices, scores, agent.registry)
+        return dedupe_by_parent(results, k)
 
 # --- Orchestrator ---
 class VectorStoreOrchestrator:
-    def __init__(self, similarity_threshold: float = 0.4):
-        self.index_agent = IndexAgent()
+    def __init__(self, similarity_threshold: float = 0.4, quantization: str = "none", rescore: bool = True):
+        self.index_agent = IndexAgent(quantization=quantization, rescore=rescore)
         self.search_agent = SearchAgent(self.index_agent, similarity_threshold)
+        # Serializa escritas e compactação; buscas não esperam por ele
+        self._write_lock = threading.Lock()
+        self._compaction = None
+        # Última falha da compactação em segundo plano (None se a última terminou bem)
+        self.compaction_error = None
+        # Incrementado a cada escrita: caches de respostas sobre a versão anterior deixam de valer
+        self.generation = 0
 
     def add_documents(self, documents: List[Dict[str, str]], embeddings: np.ndarray):
-        self.index_agent.add_documents(documents, embeddings)
+        with self._write_lock:
+            self.generation += 1
+            return self.index_agent.add_documents(documents, embeddings)
 
-    def search(self, query_embedding: np.ndarray, k: int = 5) -> List[Dict]:
-        return self.search_agent.search(query_embedding, k)
+    def upsert(self, documents: List[Dict[str, str]], embeddings: np.ndarray):
+        with self._write_lock:
+            ids = self.index_agent.upsert(documents, embeddings)
+            self.generation += 1
+        self.maybe_compact()
+        return ids
+
+    def delete(self, parents: Iterable[str] = (), ids: Iterable[int] = ()) -> int:
+        with self._write_lock:
+            removed = self.index_agent.delete(parents, ids)
+            self.generation += 1
+        self.maybe_compact()
+        return removed
+
+    def compact(self):
+        """Monta o agente compactado e troca a referência; buscas em andamento seguem no antigo."""
+        with self._write_lock:
+            compacted = self.index_agent.compacted()
+            self.index_agent = compacted
+            self.search_agent.index_agent = compacted
+            self.generation += 1
+
+    def maybe_compact(self, threshold: float = COMPACTION_THRESHOLD, background: bool = True):
+        """Dispara compact() quando a fração de tombstones passa do threshold (em uma thread, por padrão)."""
+        if self.index_agent.registry.tombstone_ratio < threshold:
+            return None
+        if self._compaction is not None and self._compaction.is_alive():
+            return self._compaction
+        if not background:
+            self.compact()
+            return None
+        self._compaction = threading.Thread(target=run_compaction, args=(self, "VectorStore"), name="index-compaction",
+                                            daemon=True)
+        self._compaction.start()
+        return self._compaction
+
+    def search(self, query_embedding: np.ndarray, k: int = 5, threshold: Optional[float] = None,
+               query_text: Optional[str] = None, filters=None) -> List[Dict]:
+        return self.search_agent.search(query_embedding, k, threshold, query_text=query_text, filters=filters)
 
     def save(self, directory: str):
-        self.index_agent.save(directory)
+        with self._write_lock:
+            self.index_agent.save(directory)
 
-    def load(self, directory: str):
-        self.index_agent.load(directory)
+    def load(self, directory: str, mmap: bool = False):
+        self.index_agent.load(directory, mmap=mmap)
 
 # Para compatibilidade retroativa
 VectorStore = VectorStoreOrchestrator
 
 class FaissIndexAgent:
-    def __init__(self, data_dir="data"):
+    def __init__(self, data_dir="data", mmap=False, nprobe=None, ef_search=None, rescore=True, rescore_factor=4):
         self.data_dir = data_dir
+        self.mmap = mmap
+        self.options = dict(mmap=mmap, nprobe=nprobe, ef_search=ef_search, rescore=rescore, rescore_factor=rescore_factor)
         self.documents = []
         self.index = None
+        self.manifest = {}
+        self.rescore_factor = rescore_factor
+        # Vetores float32 (via mmap) para reordenar candidatos de índices quantizados
+        self.rescore_vectors = None
+        self.lexical = None
+        self.attributes = DocumentAttributes()
+        self.registry = DocumentRegistry()
+        # Vetores adicionados por upsert, ainda não gravados em segments/
+        self._pending_vectors = []
+        self._index_dirty = False
         self._load()
+        if rescore:
+            self._load_rescore_vectors()
+        # Parâmetros explícitos têm prioridade sobre os gravados pelo builder
+        set_search_params(
+            self.index,
+            nprobe=nprobe if nprobe is not None else self.manifest.get("nprobe"),
+            ef_search=ef_search if ef_search is not None else self.manifest.get("ef_search"),
+        )
 
     def _load(self):
-        docs_path = os.path.join(self.data_dir, "documents.json")
         faiss_path = os.path.join(self.data_dir, "faiss.index")
-        if os.path.exists(docs_path):
-            with open(docs_path, 'r', encoding='utf-8') as f:
-                self.documents = json.load(f)
+        # ContentStore: abre em O(1) e só decodifica o conteúdo dos resultados de cada busca
+        self.documents = open_documents(self.data_dir)
+        if self.documents:
+            self.lexical, self.attributes, self.registry = load_sidecars(self.data_dir, self.documents)
         if os.path.exists(faiss_path):
-            self.index = faiss.read_index(faiss_path)
+            self.manifest = read_manifest(self.data_dir)
+            self.index = read_index(faiss_path, mmap=self.mmap, binary=self.manifest.get("index_type") == "binary")
         else:
             self.index = faiss.IndexFlatL2(384)
+        self.metric = index_metric(self.index)
+
+    def _load_rescore_vectors(self):
+        if self.manifest.get("index_type") not in QUANTIZED_INDEX_TYPES or not has_embeddings(self.data_dir):
+            return
+        vectors = SegmentedEmbeddingStore.open(self.data_dir, mmap=True)
+        if len(vectors) != self.index.ntotal:
+            print(f"[FaissIndexAgent] {len(vectors)} embeddings para {self.index.ntotal} vetores no índice; "
+                  "reordenação desativada.")
+            return
+        self.rescore_vectors = vectors
+
+    def search(self, query_embedding: np.ndarray, k=5, threshold=None, query_text=None, filters=None):
+        """
+        No modo "ip" (índice construído com --metric ip) o score é o cosseno real e o
+        threshold é aplicado dentro do índice via range_search: documentos abaixo dele
+        nem chegam a ser materializados. No modo L2 legado o threshold é ignorado.
+        Índices quantizados (sq8, binary, ivf_pq) buscam k * rescore_factor candidatos
+        nos códigos compactos e reordenam pelo cosseno exato quando há embeddings em disco.
+        Com query_text, o ranking denso é fundido com o BM25 (ver hybrid_results).
+        filters e os tombstones viram um IDSelectorBitmap: o índice só visita documentos permitidos.
+        Retorna no máximo uma passagem (a melhor) por documento de origem.
+        """
+        return self.search_batch(query_embedding, k, threshold, [query_text], filters)[0]
 
-    def search(self, query_embedding: np.ndarray, k=5):
+    def search_batch(self, query_embeddings: np.ndarray, k=5, threshold=None, query_texts=None,
+                     filters=None, fuse: bool = True, lexical_stats: Optional[Dict] = None) -> List[List[Dict]]:
+        """
+        Várias consultas com os mesmos k, threshold e filtros numa única chamada ao índice
+        (o FAISS aproveita a multiplicação de matrizes do lote). Mesmo resultado de search
+        para cada consulta; query_texts alinhado com as linhas (None: só busca densa).
+        Com fuse=False, as consultas com texto devolvem os candidatos de hybrid_candidates,
+        para quem chamou fundir (fuse_hybrid) junto com os de outros índices, e lexical_stats
+        (collection_stats de todos eles) deixa os scores BM25 comparáveis entre os índices.
+        """
+        queries = np.ascontiguousarray(query_embeddings, dtype=np.float32)
+        queries = queries.reshape(-1, queries.shape[-1])
+        query_texts = query_texts or [None] * len(queries)
         if self.index is None or len(self.documents) == 0:
-            return []
-        D, I = self.index.search(query_embedding.reshape(1, -1), k)
-        results = []
-        for idx, dist in zip(I[0], D[0]):
-            if idx < 0 or idx >= len(self.documents):
+            return [[] for _ in queries]
+        final_k, k = k, k * PASSAGE_FANOUT
+        bitmap = combine_masks(self.attributes.bitmap(filters), self.registry.live_bitmap())
+        if bitmap is not None and not bitmap.any():
+            return [[] for _ in queries]
+        params = filtered_search_params(self.index, bitmap, len(self.attributes)) if bitmap is not None else None
+        if self.metric == "hamming" or self.rescore_vectors is not None:
+            dense = self._search_quantized(queries, k, threshold, params)
+        elif self.metric == "ip" and len(queries) >= BATCH_GEMM_MIN and flat_vectors(self.index) is not None:
+            allowed = combine_masks(self.attributes.mask(filters), self.registry.live_mask()) if bitmap is not None else None
+            dense = self._flat_gemm_search(normalize_rows(queries), k, threshold, allowed)
+        elif self.metric == "ip":
+            queries = normalize_rows(queries)
+            if threshold is not None:
+                dense = self._range_search(queries, k, threshold, params)
+            else:
+                D, I = self.index.search(queries, k, params=params)
+                dense = list(zip(I, D))
+        else:
+            D, I = self.index.search(queries, k, params=params)
+            dense = [(ids, -dists) for ids, dists in zip(I, D)]  # Negativo porque L2, para parecer score
+        mask = None
+        if bitmap is not None and self.lexical is not None and any(query_texts):
+            mask = combine_masks(self.attributes.mask(filters), self.registry.live_mask())
+        batch = []
+        for (ids, scores), query_text, query in zip(dense, query_texts, normalize_rows(queries)):
+            similarity = lambda rows, query=query: self._cosines(rows, query)
+            if query_text and not fuse:
+                valid = ids >= 0
+                batch.append(hybrid_candidates(self.documents, self.lexical, ids[valid], scores[valid], query_text, k,
+                                               mask, self.registry, similarity, lexical_stats))
                 continue
-            doc = self.documents[idx].copy()
-            doc['score'] = float(-dist)  # Negativo porque L2, para parecer score
-            results.append(doc)
-        return results
+            if query_text and self.lexical is not None:
+                valid = ids >= 0
+                results = hybrid_results(self.documents, self.lexical, ids[valid], scores[valid], query_text, k, mask,
+                                         self.registry, similarity)
+            else:
+                results = materialize(self.documents, ids, scores, self.registry)
+            batch.append(dedupe_by_parent(results, final_k))
+        return batch
+
+    def upsert(self, documents: List[Dict[str, str]], embeddings: np.ndarray) -> np.ndarray:
+        """
+        Marca as versões anteriores dos mesmos documentos como tombstones e anexa as novas
+        passagens ao índice FAISS em memória (IVF já treinado, HNSW e flat aceitam add).
+        Exige o índice carregado sem mmap; save() persiste. Num diretório sem segments/,
+        os vetores já indexados são reconstruídos do índice e gravados antes dos novos:
+        segments/ nasce alinhado com todas as linhas, como a compactação exige.
+        """
+        if len(documents) != embeddings.shape[0]:
+            raise ValueError("Number of documents must match number of embeddings")
+        if self.mmap:
+            raise ValueError("Upsert needs a writable index: load FaissIndexAgent with mmap=False")
+        if self.index.ntotal != len(self.documents):
+            raise ValueError("FAISS index and documents are misaligned; rebuild the index first")
+        if self.rescore_vectors is None and not self._pending_vectors and not has_embeddings(self.data_dir):
+            existing = reconstruct_vectors(self.index)
+            if existing is None:
+                raise ValueError("FAISS index cannot reconstruct its vectors and there are no embeddings on disk; "
+                                 "rebuild the index with embeddings before upserting")
+            if len(existing):
+                self._pending_vectors.append(existing)
+        vectors = np.ascontiguousarray(embeddings, dtype=np.float32).reshape(len(documents), -1)
+        if self.metric == "hamming":
+            self.index.add(np.packbits(vectors > 0, axis=1))
+        else:
+            self.index.add(normalize_rows(vectors) if self.metric == "ip" else vectors)
+        if self.rescore_vectors is not None:
+            self.rescore_vectors.append(vectors)
+        else:
+            self._pending_vectors.append(vectors)
+        self._index_dirty = True
+        self.registry.delete_parents({doc.get("parent_id") or doc.get("url", "") for doc in documents})
+        self.documents.extend(documents)
+        if self.lexical is None:
+            self.lexical = BM25Index()
+        self.lexical.add(doc.get("content", "") for doc in documents)
+        self.attributes.add(documents, default_date=datetime.now().isoformat())
+        return self.registry.add(documents)
+
+    def delete(self, parents: Iterable[str] = (), ids: Iterable[int] = ()) -> int:
+        """Tombstones para documentos (parent_id ou URL) e/ou passagens (IDs estáveis); save() persiste."""
+        return self.registry.delete_parents(parents) + self.registry.delete_ids(ids)
+
+    def save(self):
+        """Grava documentos novos, BM25, atributos, registro e, após upserts, o índice e os vetores."""
+        if isinstance(self.documents, ContentStore):
+            self.documents.flush()
+        else:
+            write_content_store(content_dir(self.data_dir), self.documents)
+        if self.lexical is not None:
+            self.lexical.save(lexical_index_path(self.data_dir))
+        self.attributes.save(attributes_path(self.data_dir))
+        self.registry.save(registry_path(self.data_dir))
+        if not self._index_dirty:
+            return
+        segments_dir = os.path.join(self.data_dir, SEGMENTS_DIR)
+        if self.rescore_vectors is not None:
+            self.rescore_vectors.save(segments_dir)
+        elif self._pending_vectors:
+            store = SegmentedEmbeddingStore.open(self.data_dir, mmap=True)
+            for vectors in self._pending_vectors:
+                store.append(vectors)
+            store.save(segments_dir)
+        self._pending_vectors = []
+        write_index(self.index, os.path.join(self.data_dir, FAISS_INDEX_NAME))
+        self._index_dirty = False
+        if self.manifest:
+            self.manifest["count"] = int(self.index.ntotal)
+            write_manifest(self.data_dir, self.manifest)
+
+    def close(self):
+        """Solta índice, vetores e documentos (fecha os mmaps): depois disso as buscas voltam vazias."""
+        if isinstance(self.documents, ContentStore):
+            self.documents.close()
+        self.documents = []
+        self.index = None
+        self.rescore_vectors = None
+        self.lexical = None
+
+    def _cosines(self, ids: np.ndarray, query: np.ndarray) -> Optional[np.ndarray]:
+        """Cosseno exato de linhas fora do ranking denso (busca híbrida); None se os vetores não estão disponíveis."""
+        if self.rescore_vectors is not None:
+            return normalize_rows(self.rescore_vectors.take(ids)) @ query
+        if self.metric != "ip":
+            return None
+        try:
+            # Flat e HNSW guardam os vetores; IVF sem direct map não
+            return self.index.reconstruct_batch(ids) @ query
+        except RuntimeError:
+            return None
+
+    def _search_quantized(self, queries: np.ndarray, k: int, threshold=None, params=None):
+        query = normalize_rows(queries)
+        n = k * self.rescore_factor if self.rescore_vectors is not None else k
+        index_query = query if self.metric != "l2" else queries
+        D, I = self.index.search(prepare_query(self.index, index_query), n, params=params)
+        dense = []
+        for row in range(len(query)):
+            valid = I[row] >= 0
+            ids, dists = I[row][valid], D[row][valid]
+            if self.rescore_vectors is not None:
+                scores = normalize_rows(self.rescore_vectors.take(ids)) @ query[row]
+            else:
+                # Índice binário sem embeddings em disco: cosseno aproximado pela distância de Hamming
+                scores = np.cos(np.pi * dists / self.index.d).astype(np.float32)
+            best = top_k(scores, k, threshold)
+            dense.append((ids[best], scores[best]))
+        return dense
+
+    def _flat_gemm_search(self, queries: np.ndarray, k: int, threshold=None, allowed: Optional[np.ndarray] = None):
+        """Lote num índice flat: um GEMM sobre os vetores do próprio índice e top-k por linha."""
+        scores = queries @ flat_vectors(self.index).T
+        if allowed is not None:
+            scores[:, ~allowed] = -np.inf
+        dense = []
+        for row in scores:
+            best = top_k(row, k, threshold)
+            best = best[np.isfinite(row[best])]
+            dense.append((best.astype(np.int64), row[best]))
+        return dense
+
+    def _range_search(self, queries: np.ndarray, k: int, threshold: float, params=None):
+        try:
+            lims, D, I = self.index.range_search(queries, threshold, params=params)
+        except RuntimeError:
+            # Tipo de índice sem range_search: busca k vizinhos e filtra
+            D, I = self.index.search(queries, k, params=params)
+            return [(ids[dists >= threshold], dists[dists >= threshold]) for ids, dists in zip(I, D)]
+        dense = []
+        for row in range(len(queries)):
+            dists, ids = D[lims[row]:lims[row + 1]], I[lims[row]:lims[row + 1]]
+            best = top_k(dists, k)
+            dense.append((ids[best], dists[best]))
+        return dense
 
 # --- Faiss Vector Store Orchestrator ---
 class FaissVectorStore:
-    def __init__(self, data_dir="data"):
-        self.agent = FaissIndexAgent(data_dir)
+    def __init__(self, data_dir="data", mmap=False, nprobe=None, ef_search=None, rescore=True):
+        self.agent = FaissIndexAgent(data_dir, mmap=mmap, nprobe=nprobe, ef_search=ef_search, rescore=rescore)
+        self._write_lock = threading.Lock()
+        self._compaction = None
+        # Última falha da compactação em segundo plano (None se a última terminou bem)
+        self.compaction_error = None
+        # Incrementado a cada escrita: caches de respostas sobre a versão anterior deixam de valer
+        self.generation = 0
+
+    @property
+    def manifest(self) -> Dict:
+        return self.agent.manifest
+
+    def search(self, query_embedding: np.ndarray, k=5, threshold=None, query_text=None, filters=None):
+        return self.agent.search(query_embedding, k, threshold, query_text=query_text, filters=filters)
+
+    def search_batch(self, query_embeddings: np.ndarray, k=5, threshold=None, query_texts=None, filters=None):
+        return self.agent.search_batch(query_embeddings, k, threshold, query_texts=query_texts, filters=filters)
+
+    def upsert(self, documents: List[Dict[str, str]], embeddings: np.ndarray):
+        with self._write_lock:
+            ids = self.agent.upsert(documents, embeddings)
+            self.generation += 1
+            return ids
+
+    def delete(self, parents: Iterable[str] = (), ids: Iterable[int] = ()) -> int:
+        with self._write_lock:
+            removed = self.agent.delete(parents, ids)
+            self.generation += 1
+            return removed
+
+    def save(self):
+        with self._write_lock:
+            self.agent.save()
+        self.maybe_compact()
+
+    def close(self):
+        """Espera a compactação em andamento e libera o agente (índice e mmaps)."""
+        if self._compaction is not None:
+            self._compaction.join()
+        self.agent.close()
+
+    def compact(self):
+        """
+        Regrava o diretório só com as linhas vivas (reconstruindo o faiss.index) e carrega um
+        agente novo; o atual continua atendendo (arquivos antigos seguem mapeados) até a troca.
+        """
+        with self._write_lock:
+            agent = self.agent
+            agent.save()
+            compact_data_dir(agent.data_dir, agent.registry.live_rows(), agent.documents)
+            self.agent = FaissIndexAgent(agent.data_dir, **agent.options)
+            self.generation += 1
 
-    def search(self, query_embedding: np.ndarray, k=5):
-        return self.agent.search(query_embedding, k)
\ No newline at end of file
+    def maybe_compact(self, threshold: float = COMPACTION_THRESHOLD, background: bool = True):
+        """Dispara compact() quando a fração de tombstones passa do threshold (em uma thread, por padrão)."""
+        if self.agent.registry.tombstone_ratio < threshold:
+            return None
+        if self._compaction is not None and self._compaction.is_alive():
+            return self._compaction
+        if not background:
+            self.compact()
+            return None
+        self._compaction = threading.Thread(target=run_compaction, args=(self, "FaissVectorStore"), name="faiss-compaction",
+                                            daemon=True)
+        self._compaction.start()
+        return self._compaction
\ No newline at end of file
@@ -0,0 +1,93 @@
+import hashlib
+import re
+import numpy as np
+from typing import Dict, List, Tuple
+
+# ~1000 caracteres ≈ 250 tokens: cabe no limite do MiniLM e no orçamento do prompt
+DEFAULT_MAX_CHARS = 1000
+DEFAULT_OVERLAP = 200
+
+_SENTENCE_END = re.compile(r"[.!?;:]\s|\n")
+
+def parent_id_for(url: str) -> str:
+    """ID estável do documento de origem, derivado da URL."""
+    return hashlib.sha1(url.encode("utf-8")).hexdigest()[:16]
+
+def split_passages(text: str, max_chars: int = DEFAULT_MAX_CHARS,
+                   overlap: int = DEFAULT_OVERLAP) -> List[Tuple[int, int]]:
+    """
+    Divide o texto em janelas de até max_chars com `overlap` caracteres de sobreposição.
+    Os cortes preferem fim de frase/linha e, na falta, um espaço. Retorna offsets (início, fim).
+    """
+    spans = []
+    length = len(text)
+    start = 0
+    while start < length:
+        end = min(start + max_chars, length)
+        if end < length:
+            window = text[start + max_chars // 2:end]
+            boundaries = [m.end() for m in _SENTENCE_END.finditer(window)]
+            if boundaries:
+                end = start + max_chars // 2 + boundaries[-1]
+            else:
+                space = text.rfind(" ", start + max_chars // 2, end)
+                if space > start:
+                    end = space + 1
+        spans.append((start, end))
+        if end >= length:
+            break
+        # Recua `overlap` caracteres e alinha no próximo espaço para não cortar palavras
+        next_start = max(end - overlap, start + 1)
+        space = text.find(" ", next_start, end)
+        start = space + 1 if space != -1 else next_start
+    return spans
+
+def chunk_document(doc: Dict, max_chars: int = DEFAULT_MAX_CHARS,
+                   overlap: int = DEFAULT_OVERLAP) -> List[Dict]:
+    """Transforma um documento {url, content} em passagens com parent_id e offsets."""
+    text = doc["content"]
+    parent_id = parent_id_for(doc["url"])
+    passages = []
+    for number, (start, end) in enumerate(split_passages(text, max_chars, overlap)):
+        content = text[start:end].strip()
+        if not content:
+            continue
+        passage = {key: value for key, value in doc.items() if key != "content"}
+        passage.update({
+            "content": content,
+            "parent_id": parent_id,
+            "passage": number,
+            "start": start,
+            "end": end,
+        })
+        passages.append(passage)
+    return passages
+
+def embed_passages(model, passages: List[Dict], batch_size: int = 64, cache=None) -> np.ndarray:
+    """
+    Gera os embeddings das passagens em lotes (uma chamada ao modelo por lote). Com `cache`
+    (PassageEmbeddingCache de ingestion.embedding_cache), só as passagens fora dele vão ao modelo.
+    """
+    if not passages:
+        return np.empty((0, model.get_sentence_embedding_dimension()), dtype=np.float32)
+    texts = [p["content"] for p in passages]
+    if cache is not None:
+        return cache.encode(model, texts, batch_size=batch_size)
+    return model.encode(texts, batch_size=batch_size, convert_to_numpy=True)
+
+def dedupe_by_parent(results: List[Dict], k: int) -> List[Dict]:
+    """
+    Mantém só a melhor passagem de cada documento de origem (resultados já ordenados por score).
+    Documentos antigos, sem parent_id, são agrupados pela URL.
+    """
+    seen = set()
+    unique = []
+    for result in results:
+        key = result.get("parent_id") or result.get("url")
+        if key in seen:
+            continue
+        seen.add(key)
+        unique.append(result)
+        if len(unique) == k:
+            break
+    return unique
@@ -0,0 +1,199 @@
+import hashlib
+import json
+import os
+import re
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlparse, urlunparse
+import numpy as np
+from database.lexical_index import tokenize
+
+DEDUP_NAME = "dedup.json"
+
+# SimHash de 64 bits: até 3 bits diferentes = quase duplicata (Manku et al., 2007)
+SIMHASH_BITS = 64
+MAX_HAMMING = 3
+# 4 bandas de 16 bits: com distância <= 3, ao menos uma banda é idêntica (casas dos pombos)
+BANDS = 4
+SHINGLE_SIZE = 3
+# Textos com menos shingles que isso só são comparados por hash exato (SimHash instável)
+MIN_SHINGLES = 8
+
+_VIEW_SEGMENT = re.compile(r"^@@")
+
+def canonical_url(url: str) -> str:
+    """
+    Forma canônica da URL: sem fragmento (#afooter, #SearchableText), sem views do Plone
+    (@@slideshow_view), com barras duplicadas colapsadas, host minúsculo e sem barra final.
+    """
+    parsed = urlparse(url.strip())
+    segments = [s for s in parsed.path.split("/") if s and not _VIEW_SEGMENT.match(s)]
+    path = "/" + "/".join(segments) if segments else "/"
+    netloc = parsed.netloc.lower()
+    if netloc.endswith(":80") and parsed.scheme == "http" or netloc.endswith(":443") and parsed.scheme == "https":
+        netloc = netloc.rsplit(":", 1)[0]
+    return urlunparse((parsed.scheme.lower(), netloc, path, "", parsed.query, ""))
+
+def content_hash(text: str) -> str:
+    """Hash do texto normalizado (tokens sem acento/stopwords): ignora espaços e caixa."""
+    return hashlib.sha1(" ".join(tokenize(text)).encode("utf-8")).hexdigest()
+
+def simhash(text: str) -> Optional[int]:
+    """SimHash de 64 bits sobre shingles de 3 tokens; None para textos curtos demais."""
+    tokens = tokenize(text)
+    shingles = {" ".join(tokens[i:i + SHINGLE_SIZE]) for i in range(len(tokens) - SHINGLE_SIZE + 1)}
+    if len(shingles) < MIN_SHINGLES:
+        return None
+    hashes = np.fromiter(
+        (int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "little") for s in shingles),
+        dtype=np.uint64, count=len(shingles),
+    )
+    # Cada bit do fingerprint é o voto majoritário daquele bit entre os shingles
+    bits = (hashes[:, None] >> np.arange(SIMHASH_BITS, dtype=np.uint64)) & np.uint64(1)
+    votes = bits.sum(axis=0) * 2 > len(hashes)
+    return int(np.packbits(votes, bitorder="little").view("<u8")[0])
+
+def _bands(fingerprint: int) -> List[int]:
+    width = SIMHASH_BITS // BANDS
+    return [(fingerprint >> (band * width)) & ((1 << width) - 1) for band in range(BANDS)]
+
+def group_by_parent(documents) -> Dict[str, List[int]]:
+    """Passagens agrupadas por documento de origem (parent_id, ou a URL nos documentos antigos)."""
+    groups: Dict[str, List[int]] = {}
+    for i, doc in enumerate(documents):
+        groups.setdefault(doc.get("parent_id") or doc.get("url", ""), []).append(i)
+    return groups
+
+# --- Índice de duplicatas ---
+class DedupIndex:
+    """
+    Detecta documentos repetidos antes de gerar embeddings, em três níveis:
+    mesma URL canônica e conteúdo, hash exato do conteúdo e SimHash a até MAX_HAMMING bits
+    (LSH por bandas: só compara fingerprints que coincidem em alguma banda).
+    O primeiro documento é o canônico; os demais viram aliases (URL -> URL canônica).
+    """
+    def __init__(self):
+        self.urls: Dict[str, str] = {}
+        self.hashes: Dict[str, str] = {}
+        self.fingerprints: Dict[str, int] = {}
+        self.aliases: Dict[str, str] = {}
+        self._buckets: List[Dict[int, List[str]]] = [{} for _ in range(BANDS)]
+
+    def __len__(self):
+        return len(self.hashes)
+
+    def match(self, url: str, text: str, fingerprint: Optional[int] = None) -> Tuple[Optional[str], Optional[str]]:
+        """
+        (URL canônica, motivo: "url", "exact" ou "near") se for duplicata; (None, None) se é novo.
+        Uma URL já vista com conteúdo diferente é uma atualização, não duplicata: retorna
+        (None, None) e o chamador faz upsert da nova versão.
+        """
+        owner = self.urls.get(canonical_url(url))
+        canonical = self.hashes.get(content_hash(text))
+        if canonical:
+            return canonical, "url" if canonical == owner else "exact"
+        if owner:
+            return None, None
+        fingerprint = simhash(text) if fingerprint is None else fingerprint
+        if fingerprint is None:
+            return None, None
+        candidates = set()
+        for band, value in enumerate(_bands(fingerprint)):
+            candidates.update(self._buckets[band].get(value, ()))
+        for candidate in candidates:
+            if bin(self.fingerprints[candidate] ^ fingerprint).count("1") <= MAX_HAMMING:
+                return candidate, "near"
+        return None, None
+
+    def find(self, url: str, text: str) -> Optional[str]:
+        """URL canônica de que este documento é duplicata, ou None se é novo."""
+        return self.match(url, text)[0]
+
+    def add(self, url: str, text: str, fingerprint: Optional[int] = None):
+        """Registra o documento como canônico."""
+        self.urls[canonical_url(url)] = url
+        self.hashes[content_hash(text)] = url
+        fingerprint = simhash(text) if fingerprint is None else fingerprint
+        if fingerprint is not None:
+            self._index_fingerprint(url, fingerprint)
+
+    def add_alias(self, url: str, canonical: str):
+        if url != canonical:
+            self.aliases[url] = canonical
+
+    def _index_fingerprint(self, url: str, fingerprint: int):
+        self.fingerprints[url] = fingerprint
+        for band, value in enumerate(_bands(fingerprint)):
+            self._buckets[band].setdefault(value, []).append(url)
+
+    def register(self, url: str, text: str) -> Optional[str]:
+        """
+        Consulta e registra numa chamada: se for duplicata, grava o alias e retorna a URL
+        canônica (o chamador descarta o documento); senão o registra e retorna None.
+        """
+        fingerprint = simhash(text)
+        canonical, _ = self.match(url, text, fingerprint)
+        if canonical:
+            self.add_alias(url, canonical)
+            return canonical
+        self.add(url, text, fingerprint)
+        return None
+
+    def save(self, path: str):
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "hashes": self.hashes,
+                "fingerprints": {url: format(fp, "016x") for url, fp in self.fingerprints.items()},
+                "aliases": self.aliases,
+            }, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "DedupIndex":
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        index = cls()
+        index.hashes = data["hashes"]
+        index.aliases = data.get("aliases", {})
+        index.urls = {canonical_url(url): url for url in index.hashes.values()}
+        for url, fp in data.get("fingerprints", {}).items():
+            index._index_fingerprint(url, int(fp, 16))
+        return index
+
+    @classmethod
+    def build(cls, documents) -> "DedupIndex":
+        """Índice a partir de documentos já armazenados (passagens reagrupadas por documento)."""
+        index = cls()
+        for rows in group_by_parent(documents).values():
+            passages = [documents[i] for i in rows]
+            index.register(passages[0].get("url", ""), document_text(passages))
+        return index
+
+def document_text(passages: List[Dict]) -> str:
+    """
+    Texto original do documento a partir das passagens: usa os offsets (start/end) para
+    descartar a sobreposição, assim o SimHash bate com o do texto bruto visto na coleta.
+    """
+    parts = []
+    covered = 0
+    for passage in sorted(passages, key=lambda p: p.get("passage", 0)):
+        content = passage.get("content", "")
+        start, end = passage.get("start"), passage.get("end")
+        if start is None or end is None:
+            parts.append(content)
+            continue
+        if end <= covered:
+            continue
+        parts.append(content[max(covered - start, 0):])
+        covered = end
+    return " ".join(parts)
+
+def dedup_path(data_dir: str) -> str:
+    return os.path.join(data_dir, DEDUP_NAME)
+
+def load_dedup_index(data_dir: str, documents=None) -> DedupIndex:
+    """Carrega data_dir/dedup.json; sem ele, constrói a partir dos documentos existentes."""
+    path = dedup_path(data_dir)
+    if os.path.exists(path):
+        return DedupIndex.load(path)
+    return DedupIndex.build(documents) if documents else DedupIndex()
@@ -0,0 +1,183 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import unicodedata
+from typing import Dict, List, Optional
+import numpy as np
+
+EMBEDDING_CACHE_DIR = os.path.join("data", "embedding_cache")
+META_NAME = "meta.json"
+KEYS_NAME = "keys.bin"
+VECTORS_NAME = "vectors.f32"
+KEY_BYTES = 20  # sha1
+
+_WHITESPACE = re.compile(r"\s+")
+
+def normalize_text(text: str) -> str:
+    """
+    Forma normalizada para a chave: Unicode NFC e espaços colapsados. Caixa e acentos são
+    mantidos, pois o tokenizador do modelo os distingue (o embedding mudaria).
+    """
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFC", text)).strip()
+
+def text_key(text: str) -> bytes:
+    return hashlib.sha1(normalize_text(text).encode("utf-8")).digest()
+
+def model_slug(model_name: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name.strip("/"))
+
+# --- Cache de embeddings de passagens (disco) ---
+class PassageEmbeddingCache:
+    """
+    Embeddings já calculados na ingestão, por (modelo, SHA-1 do texto normalizado): reprocessar
+    um scraper ou reconstruir o índice só codifica passagens novas ou alteradas.
+    Um diretório por modelo com dois arquivos só de acréscimo:
+        keys.bin      20 bytes (SHA-1) por linha
+        vectors.f32   float32 cru, dim valores por linha (aberto com np.memmap, sem carregar)
+    mais o meta.json (modelo, dimensão, tempo médio de encode para estimar o tempo poupado).
+    Linhas novas ficam em memória até flush(); uma gravação interrompida é descartada na
+    abertura seguinte (os dois arquivos são truncados para o mesmo número de linhas).
+    """
+    def __init__(self, cache_dir: str, model_name: str):
+        self.cache_dir = cache_dir
+        self.model_name = model_name
+        self.dim: Optional[int] = None
+        self.seconds_per_text: Optional[float] = None
+        self._index: Dict[bytes, int] = {}
+        self._vectors: Optional[np.ndarray] = None
+        self._pending_keys: List[bytes] = []
+        self._pending: List[np.ndarray] = []
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.encode_seconds = 0.0
+        self._load()
+
+    @classmethod
+    def open(cls, model_name: str, root: Optional[str] = None) -> "PassageEmbeddingCache":
+        return cls(os.path.join(root or EMBEDDING_CACHE_DIR, model_slug(model_name)), model_name)
+
+    def __len__(self):
+        return len(self._index)
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.cache_dir, name)
+
+    def _load(self):
+        meta_path = self._path(META_NAME)
+        if not os.path.exists(meta_path):
+            return
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("model") != self.model_name:
+            raise ValueError(f"Embedding cache at {self.cache_dir} belongs to model '{meta.get('model')}'")
+        self.dim = int(meta["dim"])
+        self.seconds_per_text = meta.get("seconds_per_text")
+        keys_path, vectors_path = self._path(KEYS_NAME), self._path(VECTORS_NAME)
+        row_bytes = self.dim * 4
+        rows = min(os.path.getsize(keys_path) // KEY_BYTES if os.path.exists(keys_path) else 0,
+                   os.path.getsize(vectors_path) // row_bytes if os.path.exists(vectors_path) else 0)
+        # Descarta o fim de uma gravação interrompida para manter chaves e vetores alinhados
+        for path, size in ((keys_path, rows * KEY_BYTES), (vectors_path, rows * row_bytes)):
+            if os.path.exists(path) and os.path.getsize(path) != size:
+                os.truncate(path, size)
+        if rows == 0:
+            return
+        with open(keys_path, "rb") as f:
+            keys = f.read()
+        self._index = {keys[i * KEY_BYTES:(i + 1) * KEY_BYTES]: i for i in range(rows)}
+        self._vectors = np.memmap(vectors_path, dtype=np.float32, mode="r", shape=(rows, self.dim))
+
+    def _row(self, row: int) -> np.ndarray:
+        stored = 0 if self._vectors is None else self._vectors.shape[0]
+        return self._vectors[row] if row < stored else self._pending[row - stored]
+
+    def lookup(self, texts: List[str]) -> List[Optional[np.ndarray]]:
+        """Embedding em cache de cada texto (None quando ausente); não altera os contadores."""
+        with self._lock:
+            rows = [self._index.get(text_key(text)) for text in texts]
+            return [None if row is None else np.array(self._row(row)) for row in rows]
+
+    def encode(self, model, texts: List[str], batch_size: int = 64) -> np.ndarray:
+        """Embeddings dos textos: os em cache vêm do disco; só os ausentes vão ao modelo, em lote."""
+        dim = self.dim or model.get_sentence_embedding_dimension()
+        if self.dim is None:
+            self.dim = dim
+        elif model.get_sentence_embedding_dimension() != self.dim:
+            raise ValueError(f"Model dimension {model.get_sentence_embedding_dimension()} != cache dimension {self.dim}")
+        embeddings = np.empty((len(texts), dim), dtype=np.float32)
+        keys = [text_key(text) for text in texts]
+        missing: Dict[bytes, List[int]] = {}
+        with self._lock:
+            for i, key in enumerate(keys):
+                row = self._index.get(key)
+                if row is None:
+                    missing.setdefault(key, []).append(i)
+                else:
+                    embeddings[i] = self._row(row)
+        # Textos repetidos no mesmo lote são codificados uma vez (as repetições contam como acerto)
+        first = [rows[0] for rows in missing.values()]
+        self.hits += len(texts) - len(first)
+        if not missing:
+            return embeddings
+        start = time.perf_counter()
+        encoded = np.asarray(model.encode([texts[i] for i in first], batch_size=batch_size, convert_to_numpy=True),
+                             dtype=np.float32)
+        self.encode_seconds += time.perf_counter() - start
+        self.misses += len(first)
+        with self._lock:
+            stored = 0 if self._vectors is None else self._vectors.shape[0]
+            for (key, rows), vector in zip(missing.items(), encoded):
+                embeddings[rows] = vector
+                if key not in self._index:
+                    self._index[key] = stored + len(self._pending)
+                    self._pending_keys.append(key)
+                    self._pending.append(vector)
+        return embeddings
+
+    def flush(self):
+        """Anexa as linhas novas aos arquivos e reabre o memmap (vetores antes das chaves)."""
+        with self._lock:
+            if self.dim is None:
+                return
+            os.makedirs(self.cache_dir, exist_ok=True)
+            if self.misses:
+                # Média móvel do custo de encode por texto: base da estimativa de tempo poupado
+                measured = self.encode_seconds / self.misses
+                self.seconds_per_text = measured if self.seconds_per_text is None else \
+                    0.5 * (self.seconds_per_text + measured)
+            tmp_path = self._path(META_NAME) + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"model": self.model_name, "dim": self.dim, "seconds_per_text": self.seconds_per_text}, f)
+            os.replace(tmp_path, self._path(META_NAME))
+            if not self._pending:
+                return
+            with open(self._path(VECTORS_NAME), "ab") as f:
+                f.write(np.ascontiguousarray(np.stack(self._pending), dtype=np.float32).tobytes())
+            with open(self._path(KEYS_NAME), "ab") as f:
+                f.write(b"".join(self._pending_keys))
+            self._pending, self._pending_keys = [], []
+            self._vectors = np.memmap(self._path(VECTORS_NAME), dtype=np.float32, mode="r",
+                                      shape=(len(self._index), self.dim))
+
+    def stats(self) -> Dict:
+        total = self.hits + self.misses
+        per_text = self.encode_seconds / self.misses if self.misses else self.seconds_per_text
+        return {
+            "entries": len(self._index),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "encode_seconds": round(self.encode_seconds, 2),
+            "saved_seconds": round(self.hits * per_text, 2) if per_text else None,
+        }
+
+    def report(self) -> str:
+        stats = self.stats()
+        saved = f"~{stats['saved_seconds']}s poupados" if stats["saved_seconds"] is not None else "tempo poupado indisponível"
+        return (f"[Cache de embeddings] {stats['hits']} reaproveitados, {stats['misses']} codificados "
+                f"(hit rate {stats['hit_rate']:.1%}), {stats['encode_seconds']}s de encode, {saved}; "
+                f"{stats['entries']} no cache")
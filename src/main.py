@@ -5,18 +5,20 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 from scrapers.ufpb_scraper import UFPBScraper
 from fastapi import FastAPI, HTTPException
 from database.vector_store import VectorStore
-from sentence_transformers import SentenceTransformer
 # Removido: verificar_ou_atualizar_cardapio_automaticamente()
 import uvicorn
 from api.qa_endpoint import router as qa_router
 from api.qb_agent import router as qb_router  # ou src.agents.qb_agent dependendo do caminho
 from api.ask_router import router as ask_router
+from api.llm_client import close_llm_client
 
 app = FastAPI()
 
 app.include_router(qa_router)
 app.include_router(qb_router)
 app.include_router(ask_router)
+# Fecha o pool de conexões do cliente LLM compartilhado
+app.add_event_handler("shutdown", close_llm_client)
 
 
 def check_venv():
@@ -50,7 +52,7 @@ def collect_and_index_data():
     # Tenta carregar dados existentes primeiro
     try:
         print("Tentando carregar dados existentes...")
-        vector_store.load("data")
+        vector_store.load("data", mmap=True)  # Só confere os dados: evita cópia privada por worker
         # Compatível com arquitetura de agentes
         num_docs = len(vector_store.index_agent.documents)
         print(f"Dados carregados com sucesso! {num_docs} documentos encontrados.")
@@ -3,11 +3,17 @@ import json
 import requests
 from urllib.parse import urljoin, urlparse
 from bs4 import BeautifulSoup
-from sentence_transformers import SentenceTransformer
 import numpy as np
 import tempfile
 import PyPDF2
 import faiss
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ingestion.chunking import chunk_document, embed_passages
+from ingestion.embedding_cache import PassageEmbeddingCache
+from agents.model_registry import get_model
+from database.content_store import open_for_append
+from ingestion.dedup import canonical_url, dedup_path, load_dedup_index
 
 DATA_DIR = "data"
 DOCS_PATH = os.path.join(DATA_DIR, "documents.json")
@@ -18,25 +24,28 @@ MODEL_NAME = 'paraphrase-multilingual-MiniLM-L12-v2'
 class SimpleFullScraper:
     def __init__(self, base_url):
         self.base_url = base_url.rstrip('/')
-        self.model = SentenceTransformer(MODEL_NAME)
-        self.documents = []
+        self.model = get_model(MODEL_NAME)
+        # Passagens já codificadas em execuções anteriores não voltam ao modelo
+        self.embedding_cache = PassageEmbeddingCache.open(MODEL_NAME)
+        self.documents = None
         self.embeddings = []
         self.visited = set()
         os.makedirs(DATA_DIR, exist_ok=True)
         self.index = None
         self._load_existing()
-        # Sincroniza visited.json com todas as URLs já presentes em documents.json
+        # Sincroniza visited.json com todas as URLs já presentes nos documentos
         if self.documents:
-            doc_urls = {doc['url'] for doc in self.documents if 'url' in doc}
+            doc_urls = set(self.documents.urls())
             if not self.visited.issuperset(doc_urls):
                 self.visited.update(doc_urls)
                 with open(VISITED_PATH, 'w', encoding='utf-8') as f:
                     json.dump(list(self.visited), f, ensure_ascii=False, indent=2)
 
     def _load_existing(self):
-        if os.path.exists(DOCS_PATH):
-            with open(DOCS_PATH, 'r', encoding='utf-8') as f:
-                self.documents = json.load(f)
+        # Documentos em store append-only: abrir não carrega o conteúdo e salvar só anexa os novos
+        self.documents = open_for_append(DATA_DIR)
+        # Hashes/SimHash dos documentos já indexados: variantes da mesma página não são reembutidas
+        self.dedup = load_dedup_index(DATA_DIR, self.documents)
         if os.path.exists(FAISS_PATH):
             self.index = faiss.read_index(FAISS_PATH)
         else:
@@ -49,9 +58,10 @@ class SimpleFullScraper:
                     self.visited = set()
 
     def _save(self):
-        with open(DOCS_PATH, 'w', encoding='utf-8') as f:
-            json.dump(self.documents, f, ensure_ascii=False, indent=2)
+        self.documents.flush()
+        self.dedup.save(dedup_path(DATA_DIR))
         faiss.write_index(self.index, FAISS_PATH)
+        self.embedding_cache.flush()
         with open(VISITED_PATH, 'w', encoding='utf-8') as f:
             json.dump(list(self.visited), f, ensure_ascii=False, indent=2)
 
@@ -100,17 +110,19 @@ class SimpleFullScraper:
                     text = self._extract_html_text(resp.text)
                 else:
                     text = None
-                if text and len(text.strip()) > 0:
-                    doc = {'url': url, 'content': text}
-                    self.documents.append(doc)
-                    emb = self.model.encode([text], convert_to_numpy=True)
-                    self.index.add(emb)
+                canonical = self.dedup.register(url, text) if text and text.strip() else None
+                if canonical:
+                    print(f"[SCRAPER] Duplicata de {canonical}, ignorado: {url}")
+                elif text and len(text.strip()) > 0:
+                    passages = chunk_document({'url': url, 'content': text})
+                    self.documents.extend(passages)
+                    self.index.add(embed_passages(self.model, passages, cache=self.embedding_cache))
                     self._save()
                     print(f"[SCRAPER] Documento salvo e embedding adicionado: {url}")
                 if 'text/html' in content_type:
                     soup = BeautifulSoup(resp.text, 'html.parser')
                     for link in soup.find_all('a', href=True):
-                        next_url = urljoin(url, link['href'])
+                        next_url = canonical_url(urljoin(url, link['href']))
                         if self._is_valid_url(next_url) and next_url not in self.visited and next_url not in to_visit:
                             to_visit.append(next_url)
                 self.visited.add(url)
@@ -119,6 +131,7 @@ class SimpleFullScraper:
                 print(f"[SCRAPER ERROR] {url}: {e}")
         self._save()
         print(f"[SCRAPER] Finalizado. Total de documentos: {len(self.documents)}")
+        print(self.embedding_cache.report())
 
 if __name__ == "__main__":
     base_url = "https://www.ufpb.br/"
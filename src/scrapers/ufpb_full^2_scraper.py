@@ -4,10 +4,17 @@ import requests
 from datetime import datetime
 from urllib.parse import urljoin, urlparse
 from bs4 import BeautifulSoup
-from sentence_transformers import SentenceTransformer
 import numpy as np
 import tempfile
 import PyPDF2
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from database.segment_store import SegmentedEmbeddingStore
+from ingestion.chunking import chunk_document, embed_passages
+from ingestion.embedding_cache import PassageEmbeddingCache
+from agents.model_registry import get_model
+from database.content_store import open_for_append
+from ingestion.dedup import canonical_url, dedup_path, load_dedup_index
 
 class UFPBScraper:
     def __init__(self, base_url="https://www.ufpb.br/", log_path="scraper_log.txt", checkpoint_path="checkpoint.json", website_log_path="website_logs.json"):
@@ -17,6 +24,10 @@ class UFPBScraper:
         self.website_log_path = website_log_path
         self.visited_urls = self.load_checkpoint()
         self.website_logs = self.load_website_logs()
+        self.embedding_caches = {}
+        self.dedup_indexes = {}
+        self.data_stores = {}
+        self.flushed_segments = {}
         os.makedirs('data', exist_ok=True)
 
     def load_checkpoint(self):
@@ -49,6 +60,48 @@ class UFPBScraper:
             else:
                 f.write(f"{timestamp} - INFO: {url} - {message}\n")
 
+    def embedding_cache(self, model_name, data_dir):
+        """Cache de embeddings por (modelo, diretório), aberto uma vez por instância."""
+        key = (model_name, data_dir)
+        if key not in self.embedding_caches:
+            self.embedding_caches[key] = PassageEmbeddingCache.open(model_name, os.path.join(data_dir, 'embedding_cache'))
+        return self.embedding_caches[key]
+
+    def dedup_index(self, data_dir, documents):
+        """Índice de duplicatas por diretório, carregado uma vez por instância."""
+        if data_dir not in self.dedup_indexes:
+            self.dedup_indexes[data_dir] = load_dedup_index(data_dir, documents)
+        return self.dedup_indexes[data_dir]
+
+    def open_stores(self, data_dir):
+        """
+        (documentos, embeddings) de um diretório, abertos uma vez por instância: o store de
+        documentos é append-only e o de embeddings segmentado, então nada é relido por URL.
+        """
+        if data_dir not in self.data_stores:
+            all_embs = SegmentedEmbeddingStore.open(data_dir)
+            self.data_stores[data_dir] = (open_for_append(data_dir), all_embs)
+            self.flushed_segments[data_dir] = len(all_embs) // all_embs.segment_capacity
+        return self.data_stores[data_dir]
+
+    def flush_data(self, data_dir):
+        """Grava juntos documentos, embeddings, duplicatas, cache de embeddings e checkpoint do diretório."""
+        all_docs, all_embs = self.open_stores(data_dir)
+        all_docs.flush()
+        if len(all_embs):
+            all_embs.save(os.path.join(data_dir, 'segments'))
+        if data_dir in self.dedup_indexes:
+            self.dedup_indexes[data_dir].save(dedup_path(data_dir))
+        for (_, cache_dir), cache in self.embedding_caches.items():
+            if cache_dir == data_dir:
+                cache.flush()
+        self.save_checkpoint()
+        self.flushed_segments[data_dir] = len(all_embs) // all_embs.segment_capacity
+
+    def report_embedding_caches(self):
+        for cache in self.embedding_caches.values():
+            print(cache.report())
+
     def log_website(self, url, status, message=None):
         log_entry = {"url": url, "status": status, "message": message, "timestamp": datetime.now().isoformat()}
         self.website_logs.append(log_entry)
@@ -61,16 +114,13 @@ class UFPBScraper:
         """
         to_visit = [self.base_url]
         processed = set(self.visited_urls)
-        model = SentenceTransformer('paraphrase-multilingual-MiniLM-L12-v2')
-        embeddings_path = os.path.join('data', 'embeddings.npy')
-        docs_path = os.path.join('data', 'documents.json')
-        all_docs = []
-        if os.path.exists(docs_path):
-            with open(docs_path, 'r', encoding='utf-8') as f:
-                all_docs = json.load(f)
-        all_embs = None
-        if os.path.exists(embeddings_path):
-            all_embs = np.load(embeddings_path)
+        model = get_model('paraphrase-multilingual-MiniLM-L12-v2')
+        embedding_cache = self.embedding_cache('paraphrase-multilingual-MiniLM-L12-v2', 'data')
+        # Store append-only (salvar só grava as passagens novas) e segmentado (inserção
+        # amortizada, sem copiar a matriz a cada documento)
+        all_docs, all_embs = self.open_stores('data')
+        # Variantes da mesma página (#fragmento, @@view, conteúdo quase igual) não são reembutidas
+        dedup = self.dedup_index('data', all_docs)
         while to_visit:
             url = to_visit.pop(0)
             print(f"🌀 DEBUG: processando {url}")
@@ -85,14 +135,14 @@ class UFPBScraper:
                 content_type = resp.headers.get('Content-Type', '')
                 if 'application/pdf' in content_type or url.lower().endswith('.pdf'):
                     text = self._extract_pdf_text_from_url(url)
-                    if text:
-                        doc = {'url': url, 'content': text}
-                        all_docs.append(doc)
-                        emb = model.encode([text], convert_to_tensor=False)
-                        if all_embs is not None:
-                            all_embs = np.vstack([all_embs, emb])
-                        else:
-                            all_embs = emb
+                    canonical = dedup.register(url, text) if text else None
+                    if canonical:
+                        self.log_website(url, 'skipped', f'Duplicata de {canonical}')
+                    elif text:
+                        # Passagens com sobreposição, embutidas em lote
+                        passages = chunk_document({'url': url, 'content': text})
+                        all_docs.extend(passages)
+                        all_embs.append(embed_passages(model, passages, cache=embedding_cache))
                         self.log_status(url, 'PDF extraído e embedding gerado')
                         self.log_website(url, 'success', 'PDF extraído e embedding gerado')
                     else:
@@ -100,21 +150,21 @@ class UFPBScraper:
                 elif 'text/html' in content_type:
                     soup = BeautifulSoup(resp.text, 'html.parser')
                     text = self._extract_text_content(soup)
-                    if text:
-                        doc = {'url': url, 'content': text}
-                        all_docs.append(doc)
-                        emb = model.encode([text], convert_to_tensor=False)
-                        if all_embs is not None:
-                            all_embs = np.vstack([all_embs, emb])
-                        else:
-                            all_embs = emb
+                    canonical = dedup.register(url, text) if text else None
+                    if canonical:
+                        self.log_website(url, 'skipped', f'Duplicata de {canonical}')
+                    elif text:
+                        # Passagens com sobreposição, embutidas em lote
+                        passages = chunk_document({'url': url, 'content': text})
+                        all_docs.extend(passages)
+                        all_embs.append(embed_passages(model, passages, cache=embedding_cache))
                         self.log_status(url, 'HTML extraído e embedding gerado')
                         self.log_website(url, 'success', 'HTML extraído e embedding gerado')
                     else:
                         self.log_website(url, 'failed', 'Falha ao extrair texto HTML')
                     # Descobre novos links (incluindo subdomínios e PDFs)
                 for link in soup.find_all('a', href=True):
-                    next_url = urljoin(url, link['href'])
+                    next_url = canonical_url(urljoin(url, link['href']))
                     # DEBUG: Mostra cada link encontrado
                     print(f"Encontrado link: {next_url}")
                     if self._is_valid_url(next_url):
@@ -132,23 +182,21 @@ class UFPBScraper:
                 self.log_status(url, 'Erro ao processar', error=str(e))
                 self.log_website(url, 'failed', f'Exception: {e}')
         # Salva resultados
-        with open(docs_path, 'w', encoding='utf-8') as f:
-            json.dump(all_docs, f, ensure_ascii=False, indent=2)
-        if all_embs is not None:
-            np.save(embeddings_path, all_embs)
+        self.flush_data('data')
+        print(embedding_cache.report())
 
     def run_single_url(self, url):
-        """Processa scraping de uma única URL (HTML ou PDF)."""
-        model = SentenceTransformer('all-MiniLM-L6-v2')
-        embeddings_path = os.path.join('scraped_data', 'embeddings.npy')
-        docs_path = os.path.join('scraped_data', 'documents.json')
-        all_docs = []
-        if os.path.exists(docs_path):
-            with open(docs_path, 'r', encoding='utf-8') as f:
-                all_docs = json.load(f)
-        all_embs = None
-        if os.path.exists(embeddings_path):
-            all_embs = np.load(embeddings_path)
+        """
+        Processa scraping de uma única URL (HTML ou PDF). Os stores ficam abertos entre as
+        chamadas e são gravados (com o checkpoint) quando o segmento de embeddings aberto
+        enche: cada gravação regrava um segmento uma vez, custo amortizado O(1) por URL.
+        Ao fim do lote, chame flush_data('scraped_data') para gravar o restante.
+        """
+        model = get_model('all-MiniLM-L6-v2')
+        embedding_cache = self.embedding_cache('all-MiniLM-L6-v2', 'scraped_data')
+        all_docs, all_embs = self.open_stores('scraped_data')
+        # Mesma checagem de duplicatas (hash exato + SimHash) do run()
+        dedup = self.dedup_index('scraped_data', all_docs)
         try:
             print(f"Visitando: {url}")
             resp = requests.get(url, timeout=10)
@@ -156,14 +204,14 @@ class UFPBScraper:
             content_type = resp.headers.get('Content-Type', '')
             if 'application/pdf' in content_type or url.lower().endswith('.pdf'):
                 text = self._extract_pdf_text_from_url(url)
-                if text:
-                    doc = {'url': url, 'content': text}
-                    all_docs.append(doc)
-                    emb = model.encode([text], convert_to_tensor=False)
-                    if all_embs is not None:
-                        all_embs = np.vstack([all_embs, emb])
-                    else:
-                        all_embs = emb
+                canonical = dedup.register(url, text) if text else None
+                if canonical:
+                    self.log_website(url, 'skipped', f'Duplicata de {canonical}')
+                elif text:
+                    # Passagens com sobreposição, embutidas em lote
+                    passages = chunk_document({'url': url, 'content': text})
+                    all_docs.extend(passages)
+                    all_embs.append(embed_passages(model, passages, cache=embedding_cache))
                     self.log_status(url, 'PDF extraído e embedding gerado')
                     self.log_website(url, 'success', 'PDF extraído e embedding gerado')
                 else:
@@ -171,14 +219,14 @@ class UFPBScraper:
             elif 'text/html' in content_type:
                 soup = BeautifulSoup(resp.text, 'html.parser')
                 text = self._extract_text_content(soup)
-                if text:
-                    doc = {'url': url, 'content': text}
-                    all_docs.append(doc)
-                    emb = model.encode([text], convert_to_tensor=False)
-                    if all_embs is not None:
-                        all_embs = np.vstack([all_embs, emb])
-                    else:
-                        all_embs = emb
+                canonical = dedup.register(url, text) if text else None
+                if canonical:
+                    self.log_website(url, 'skipped', f'Duplicata de {canonical}')
+                elif text:
+                    # Passagens com sobreposição, embutidas em lote
+                    passages = chunk_document({'url': url, 'content': text})
+                    all_docs.extend(passages)
+                    all_embs.append(embed_passages(model, passages, cache=embedding_cache))
                     self.log_status(url, 'HTML extraído e embedding gerado')
                     self.log_website(url, 'success', 'HTML extraído e embedding gerado')
                 else:
@@ -186,11 +234,8 @@ class UFPBScraper:
             else:
                 self.log_website(url, 'failed', f'Content-Type não suportado: {content_type}')
             self.visited_urls.append(url)
-            self.save_checkpoint()
-            with open(docs_path, 'w', encoding='utf-8') as f:
-                json.dump(all_docs, f, ensure_ascii=False, indent=2)
-            if all_embs is not None:
-                np.save(embeddings_path, all_embs)
+            if len(all_embs) // all_embs.segment_capacity > self.flushed_segments['scraped_data']:
+                self.flush_data('scraped_data')
         except Exception as e:
             self.log_status(url, 'Erro ao processar', error=str(e))
             self.log_website(url, 'failed', f'Exception: {e}')
@@ -285,7 +330,11 @@ if __name__ == "__main__":
     # Substitui o to_visit pelo conjunto correto
     scraper.visited_urls = list(processed)
     scraper.save_checkpoint()
-    # Processa uma a uma
-    for url in urls_to_process:
-        scraper.run_single_url(url)
+    # Processa uma a uma, reaproveitando os stores abertos
+    try:
+        for url in urls_to_process:
+            scraper.run_single_url(url)
+    finally:
+        scraper.flush_data('scraped_data')
+    scraper.report_embedding_caches()
     print("Scraping finalizado!")
\ No newline at end of file
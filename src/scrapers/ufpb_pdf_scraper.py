@@ -1,12 +1,18 @@
 import os
-import json
 import requests
 from urllib.parse import urljoin, urlparse
 from bs4 import BeautifulSoup
-from sentence_transformers import SentenceTransformer
 import numpy as np
 import tempfile
 import PyPDF2
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from database.segment_store import SegmentedEmbeddingStore
+from ingestion.chunking import chunk_document, embed_passages
+from ingestion.embedding_cache import PassageEmbeddingCache
+from agents.model_registry import get_model
+from database.content_store import open_for_append
+from ingestion.dedup import canonical_url, dedup_path, load_dedup_index
 
 def find_pdf_links(base_url, max_pages=1000000):
     """Percorre recursivamente o site e retorna todos os links diretos para PDFs."""
@@ -25,7 +31,7 @@ def find_pdf_links(base_url, max_pages=1000000):
                 soup = BeautifulSoup(resp.text, 'html.parser')
                 for link in soup.find_all('a', href=True):
                     href = link['href']
-                    next_url = urljoin(url, href)
+                    next_url = canonical_url(urljoin(url, href))
                     if next_url.lower().endswith('.pdf'):
                         pdf_links.add(next_url)
                     elif next_url not in visited and urlparse(next_url).netloc.endswith(urlparse(base_url).netloc):
@@ -56,19 +62,17 @@ def main():
     base_url = "https://www.ufpb.br/"
     output_dir = "data"
     os.makedirs(output_dir, exist_ok=True)
-    docs_path = os.path.join(output_dir, "documents.json")
-    embs_path = os.path.join(output_dir, "embeddings.npy")
-    model = SentenceTransformer('paraphrase-multilingual-MiniLM-L12-v2')
-    all_docs = []
-    all_embs = None
-    # Carrega PDFs já processados para evitar duplicidade
-    processed_urls = set()
-    if os.path.exists(docs_path):
-        with open(docs_path, 'r', encoding='utf-8') as f:
-            for doc in json.load(f):
-                processed_urls.add(doc.get('url'))
-    if os.path.exists(embs_path):
-        all_embs = np.load(embs_path)
+    model = get_model('paraphrase-multilingual-MiniLM-L12-v2')
+    embedding_cache = PassageEmbeddingCache.open('paraphrase-multilingual-MiniLM-L12-v2',
+                                                 os.path.join(output_dir, "embedding_cache"))
+    # Store append-only: só os documentos novos são gravados no fim
+    all_docs = open_for_append(output_dir)
+    all_embs = SegmentedEmbeddingStore.open(output_dir)
+    # URLs já processadas, para evitar duplicidade
+    processed_urls = set(all_docs.urls())
+    # O mesmo PDF publicado em vários caminhos (ou quase igual) não é reembutido
+    dedup = load_dedup_index(output_dir, all_docs)
+    new_docs = 0
     print("Buscando links de PDFs...")
     pdf_links = find_pdf_links(base_url)
     print(f"Encontrados {len(pdf_links)} PDFs.")
@@ -77,24 +81,22 @@ def main():
             continue  # Pula PDFs já processados
         print(f"Processando: {pdf_url}")
         text = extract_pdf_text(pdf_url)
-        if text and len(text) > 100:
-            doc = {"url": pdf_url, "content": text}
-            all_docs.append(doc)
-            emb = model.encode([text], convert_to_tensor=False)
-            if all_embs is not None:
-                all_embs = np.vstack([all_embs, emb])
-            else:
-                all_embs = emb
-    # Salva todos os docs (antigos + novos)
-    if os.path.exists(docs_path):
-        with open(docs_path, 'r', encoding='utf-8') as f:
-            old_docs = json.load(f)
-        all_docs = old_docs + all_docs
-    with open(docs_path, 'w', encoding='utf-8') as f:
-        json.dump(all_docs, f, ensure_ascii=False, indent=2)
-    if all_embs is not None:
-        np.save(embs_path, all_embs)
-    print(f"Extração finalizada. PDFs processados: {len(all_docs)}")
+        canonical = dedup.register(pdf_url, text) if text and len(text) > 100 else None
+        if canonical:
+            print(f"Duplicata de {canonical}, ignorado: {pdf_url}")
+        elif text and len(text) > 100:
+            passages = chunk_document({"url": pdf_url, "content": text})
+            all_docs.extend(passages)
+            all_embs.append(embed_passages(model, passages, cache=embedding_cache))
+            new_docs += len(passages)
+    # Anexa só as passagens novas, antes dos embeddings correspondentes
+    all_docs.flush()
+    dedup.save(dedup_path(output_dir))
+    if len(all_embs):
+        all_embs.save(os.path.join(output_dir, "segments"))
+    embedding_cache.flush()
+    print(f"Extração finalizada. Passagens novas: {new_docs} (total: {len(all_docs)})")
+    print(embedding_cache.report())
 
 if __name__ == "__main__":
     main()
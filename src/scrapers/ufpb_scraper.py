@@ -3,7 +3,6 @@ from bs4 import BeautifulSoup
 from typing import List, Dict
 from urllib.parse import urljoin
 import time
-from sentence_transformers import SentenceTransformer
 import numpy as np
 import json
 import os
@@ -11,7 +10,6 @@ import os
 DATA_DIR = "data"
 DOCUMENTS_PATH = os.path.join(DATA_DIR, "documents.json")
 EMBEDDINGS_PATH = os.path.join(DATA_DIR, "embeddings.npy")
-model = SentenceTransformer('paraphrase-multilingual-MiniLM-L12-v2')
 
 IGNORE_EXTENSIONS = [
     ".pdf", ".jpg", ".jpeg", ".png", ".css", ".js", ".doc", ".docx", ".xls", ".xlsx",
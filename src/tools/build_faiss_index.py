@@ -0,0 +1,146 @@
+"""
+Construtor offline do índice FAISS a partir dos documentos (content/ ou documents.json) + embeddings.
+
+Gera data_dir/faiss.index e data_dir/faiss_manifest.json (modelo, dimensão,
+métrica, tipo do índice, parâmetros e número de documentos) e reporta tempo de
+construção, memória, latência p50/p99 e recall@k contra o índice flat exato.
+Também grava bm25.npz, attributes.npz e registry.npz se faltarem, para que o
+FaissIndexAgent não precise decodificar todos os documentos ao carregar.
+
+Uso:
+    python src/tools/build_faiss_index.py --data-dir data --index-type hnsw --ef-search 64
+    python src/tools/build_faiss_index.py --data-dir data --index-type ivf_pq --nprobe 16 --pq-m 48
+    python src/tools/build_faiss_index.py --data-dir data --index-type binary --rescore-factor 8
+"""
+import argparse
+import json
+import os
+import resource
+import sys
+import time
+from datetime import datetime
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from database.faiss_index import (
+    INDEX_TYPES, METRICS, QUANTIZED_INDEX_TYPES, build_index, prepare_query, set_search_params, write_index, write_manifest
+)
+from database.segment_store import load_embeddings, normalize_rows
+from database.content_store import open_documents
+from database.vector_store import load_sidecars
+
+def peak_rss_mb() -> float:
+    # ru_maxrss é em kB no Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def evaluate(index, baseline, queries, k, rescore_vectors=None, rescore_factor=4):
+    """
+    Latência por consulta (ms) e recall@k do índice contra o baseline exato.
+    Com rescore_vectors, busca k * rescore_factor candidatos e reordena pelo produto interno exato.
+    """
+    _, expected = baseline.search(queries, k)
+    latencies, hits = [], 0
+    for i, query in enumerate(queries):
+        start = time.perf_counter()
+        if rescore_vectors is None:
+            _, got = index.search(prepare_query(index, query), k)
+            got = got[0]
+        else:
+            _, candidates = index.search(prepare_query(index, query), k * rescore_factor)
+            candidates = candidates[0][candidates[0] >= 0]
+            got = candidates[np.argsort(rescore_vectors[candidates] @ query)[::-1][:k]]
+        latencies.append((time.perf_counter() - start) * 1000)
+        hits += len(set(got) & set(expected[i]))
+    return {
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+        f"recall@{k}": hits / (len(queries) * k),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data-dir", default="data")
+    parser.add_argument("--index-type", choices=INDEX_TYPES, default="flat")
+    parser.add_argument("--metric", choices=list(METRICS), default="ip", help="ip = cosseno (vetores normalizados); l2 = distância euclidiana")
+    parser.add_argument("--model", default="paraphrase-multilingual-MiniLM-L12-v2", help="Modelo que gerou os embeddings (registrado no manifest)")
+    parser.add_argument("--nlist", type=int, default=None, help="Listas do IVF (padrão: ~4*sqrt(n))")
+    parser.add_argument("--pq-m", type=int, default=48, help="Subquantizadores do IVF-PQ (deve dividir a dimensão)")
+    parser.add_argument("--pq-nbits", type=int, default=8)
+    parser.add_argument("--hnsw-m", type=int, default=32)
+    parser.add_argument("--ef-construction", type=int, default=200)
+    parser.add_argument("--nprobe", type=int, default=16, help="Listas visitadas por consulta (IVF)")
+    parser.add_argument("--ef-search", type=int, default=64, help="Tamanho da fila de busca (HNSW)")
+    parser.add_argument("--k", type=int, default=8)
+    parser.add_argument("--eval-queries", type=int, default=200)
+    parser.add_argument("--rescore-factor", type=int, default=4, help="Candidatos extras reordenados em índices quantizados")
+    args = parser.parse_args()
+
+    documents = open_documents(args.data_dir)
+    doc_count = len(documents)
+    embeddings = load_embeddings(args.data_dir)
+    if embeddings is None:
+        print(f"Nenhum embedding encontrado em {args.data_dir}.")
+        sys.exit(1)
+    embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+    if embeddings.shape[0] != doc_count:
+        print(f"⚠️ {doc_count} documentos, mas {embeddings.shape[0]} embeddings: os índices ficariam desalinhados.")
+        sys.exit(1)
+    n, dim = embeddings.shape
+    print(f"Construindo índice {args.index_type} ({args.metric}) para {n} vetores de dimensão {dim}...")
+
+    params = {}
+    if args.index_type in ("ivf_flat", "ivf_pq"):
+        params["nlist"] = args.nlist
+    if args.index_type == "ivf_pq":
+        params.update(pq_m=args.pq_m, pq_nbits=args.pq_nbits)
+    if args.index_type == "hnsw":
+        params.update(hnsw_m=args.hnsw_m, ef_construction=args.ef_construction)
+
+    rss_before = peak_rss_mb()
+    start = time.perf_counter()
+    index = build_index(embeddings, args.index_type, args.metric, **params)
+    build_seconds = time.perf_counter() - start
+    set_search_params(index, nprobe=args.nprobe, ef_search=args.ef_search)
+
+    index_path = os.path.join(args.data_dir, "faiss.index")
+    write_index(index, index_path)
+    index_mb = os.path.getsize(index_path) / (1024 * 1024)
+
+    # Consultas de avaliação: vetores do corpus com leve ruído (normalizados no modo ip)
+    rng = np.random.default_rng(0)
+    sample = rng.choice(n, size=min(args.eval_queries, n), replace=False)
+    queries = embeddings[sample] + rng.normal(0, 0.01, size=(len(sample), dim)).astype(np.float32)
+    if args.metric == "ip":
+        queries = normalize_rows(queries)
+    baseline = build_index(embeddings, "flat", args.metric)
+    report = {
+        "build_seconds": round(build_seconds, 3),
+        "index_mb": round(index_mb, 2),
+        "peak_rss_delta_mb": round(peak_rss_mb() - rss_before, 2),
+        **{key: round(value, 4) for key, value in evaluate(index, baseline, queries, args.k).items()},
+    }
+    report["flat_p50_ms"] = round(evaluate(baseline, baseline, queries[:50], args.k)["p50_ms"], 4)
+    if args.index_type in QUANTIZED_INDEX_TYPES:
+        vectors = normalize_rows(embeddings) if args.metric == "ip" else embeddings
+        rescored = evaluate(index, baseline, queries, args.k, rescore_vectors=vectors, rescore_factor=args.rescore_factor)
+        report["rescored"] = {key: round(value, 4) for key, value in rescored.items()}
+        report["float32_mb"] = round(embeddings.nbytes / (1024 * 1024), 2)
+
+    write_manifest(args.data_dir, {
+        "model": args.model,
+        "dim": dim,
+        "metric": args.metric,
+        "index_type": args.index_type,
+        "params": {key: value for key, value in params.items() if value is not None},
+        "nprobe": args.nprobe if "nlist" in params else None,
+        "ef_search": args.ef_search if args.index_type == "hnsw" else None,
+        "count": n,
+        "built_at": datetime.now().isoformat(),
+        "report": report,
+    })
+    load_sidecars(args.data_dir, documents)
+    print(f"Índice salvo em {index_path}")
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+if __name__ == "__main__":
+    main()
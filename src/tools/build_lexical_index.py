@@ -0,0 +1,72 @@
+"""
+Construtor offline do índice lexical (BM25) a partir dos documentos (content/ ou documents.json).
+
+Gera data_dir/bm25.npz (vocabulário + postings CSR) e reporta throughput de
+indexação, tamanho em disco e latência p50/p99 de consultas de exemplo.
+
+Uso:
+    python src/tools/build_lexical_index.py --data-dir data
+    python src/tools/build_lexical_index.py --data-dir data --query "edital 01/2024 monitoria"
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from database.content_store import open_documents
+from database.lexical_index import BM25Index, lexical_index_path, tokenize
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data-dir", default="data")
+    parser.add_argument("--k", type=int, default=8)
+    parser.add_argument("--eval-queries", type=int, default=200)
+    parser.add_argument("--query", default=None, help="Consulta para mostrar os melhores resultados")
+    args = parser.parse_args()
+
+    documents = open_documents(args.data_dir)
+    print(f"Indexando {len(documents)} documentos de {args.data_dir}...")
+
+    start = time.perf_counter()
+    index = BM25Index()
+    index.build(doc.get("content", "") for doc in documents)
+    build_seconds = time.perf_counter() - start
+    path = lexical_index_path(args.data_dir)
+    index.save(path)
+
+    # Consultas de avaliação: 3 termos sorteados de documentos do corpus
+    rng = np.random.default_rng(0)
+    latencies = []
+    for i in rng.choice(len(documents), size=min(args.eval_queries, len(documents)), replace=False):
+        tokens = tokenize(documents[i].get("content", ""))
+        if not tokens:
+            continue
+        query = " ".join(rng.choice(tokens, size=min(3, len(tokens)), replace=False))
+        begin = time.perf_counter()
+        index.search(query, args.k)
+        latencies.append((time.perf_counter() - begin) * 1000)
+
+    report = {
+        "docs": len(documents),
+        "terms": len(index.vocab),
+        "postings": int(index.doc_ids.shape[0]),
+        "build_seconds": round(build_seconds, 3),
+        "docs_per_second": round(len(documents) / build_seconds, 1) if build_seconds else None,
+        "index_mb": round(os.path.getsize(path) / (1024 * 1024), 2),
+    }
+    if latencies:
+        report["p50_ms"] = round(float(np.percentile(latencies, 50)), 4)
+        report["p99_ms"] = round(float(np.percentile(latencies, 99)), 4)
+    print(f"Índice salvo em {path}")
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+    if args.query:
+        ids, scores = index.search(args.query, args.k)
+        for idx, score in zip(ids, scores):
+            print(f"{score:7.3f}  {documents[idx].get('url', '')}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+"""
+Gera os embeddings de todos os documentos de um diretório de dados em lote, usando vários núcleos.
+
+Os documentos (content/ ou documents.json) são ordenados por tamanho, para que cada lote tenha
+textos parecidos e pouco padding, e divididos em lotes de --batch-size. Um pool de --workers
+processos (cada um com o seu modelo e --threads threads do torch/onnxruntime) codifica os lotes
+e grava as linhas direto na matriz de saída, pré-alocada e mapeada em memória (np.memmap).
+
+O progresso fica em data_dir/bulk_embed/ (matriz parcial + lotes concluídos): rodar de novo
+após uma interrupção retoma só os lotes pendentes. No fim, a matriz vira o único segmento de
+--out-dir/segments (padrão: o próprio data_dir), no lugar dos embeddings anteriores.
+
+Uso:
+    python src/tools/bulk_embed.py --data-dir data --workers 4 --threads 2
+    python src/tools/bulk_embed.py --data-dir data --backend onnx --batch-size 128
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+import multiprocessing
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from agents.embedding_backends import EMBEDDING_BACKENDS, load_embedding_backend
+from database.content_store import open_documents
+from database.segment_store import MANIFEST_NAME, SEGMENTS_DIR, SegmentedEmbeddingStore
+
+WORK_DIR = "bulk_embed"
+OUTPUT_NAME = "embeddings.npy"
+DONE_NAME = "done.npy"
+META_NAME = "meta.json"
+
+# --- Processo de trabalho ---
+_worker = {}
+
+def init_worker(model_name, backend, onnx_dir, threads, output_path):
+    """Fixa as threads antes de importar o torch, carrega o modelo e mapeia a saída para escrita."""
+    if threads:
+        for name in ("OMP_NUM_THREADS", "MKL_NUM_THREADS"):
+            os.environ[name] = str(threads)
+        if backend == "torch":
+            import torch
+            torch.set_num_threads(threads)
+    _worker["model"] = load_embedding_backend(model_name, backend, onnx_dir=onnx_dir, threads=threads)
+    _worker["output_path"] = output_path
+
+def model_dimension() -> int:
+    return _worker["model"].get_sentence_embedding_dimension()
+
+def encode_batch(batch_id, rows, texts, batch_size):
+    """Codifica um lote e grava as linhas na matriz compartilhada; retorna (lote, textos)."""
+    if "output" not in _worker:
+        _worker["output"] = np.load(_worker["output_path"], mmap_mode="r+")
+    output = _worker["output"]
+    output[rows] = _worker["model"].encode(texts, batch_size=batch_size, convert_to_numpy=True)
+    # Grava as páginas antes de o lote ser marcado como concluído
+    output.flush()
+    return batch_id, len(texts)
+
+# --- Plano e progresso ---
+def plan_batches(lengths: np.ndarray, batch_size: int):
+    """Índices dos documentos do maior para o menor, fatiados em lotes (ordem determinística)."""
+    order = np.argsort(-lengths, kind="stable")
+    return [order[start:start + batch_size] for start in range(0, len(order), batch_size)]
+
+def load_progress(work_dir: str, meta: dict, n_batches: int) -> np.ndarray:
+    """Lotes concluídos de uma execução anterior com o mesmo plano; senão recomeça do zero."""
+    meta_path = os.path.join(work_dir, META_NAME)
+    if os.path.exists(meta_path):
+        with open(meta_path, "r", encoding="utf-8") as f:
+            previous = json.load(f)
+        if previous == meta and all(os.path.exists(os.path.join(work_dir, name)) for name in (OUTPUT_NAME, DONE_NAME)):
+            return np.load(os.path.join(work_dir, DONE_NAME))
+        print("Execução anterior com outro plano (documentos, modelo ou lote); recomeçando.")
+    shutil.rmtree(work_dir, ignore_errors=True)
+    os.makedirs(work_dir)
+    with open(meta_path, "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+    return np.zeros(n_batches, dtype=bool)
+
+def save_progress(work_dir: str, done: np.ndarray):
+    tmp_path = os.path.join(work_dir, DONE_NAME + ".tmp")
+    with open(tmp_path, "wb") as f:
+        np.save(f, done)
+    os.replace(tmp_path, os.path.join(work_dir, DONE_NAME))
+
+def install_segments(output_path: str, out_dir: str):
+    """A matriz pronta vira o único segmento de out_dir/segments (troca atômica do diretório)."""
+    segments_dir = os.path.join(out_dir, SEGMENTS_DIR)
+    tmp_dir = segments_dir.rstrip("/") + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    store = SegmentedEmbeddingStore()
+    segment_path = os.path.join(tmp_dir, "segment_000000.npy")
+    os.rename(output_path, segment_path)
+    # Segmento mapeado não é regravado: save só escreve o manifest apontando para ele
+    store.add_segment(np.load(segment_path, mmap_mode="r"))
+    store.save(tmp_dir)
+    old_dir = segments_dir.rstrip("/") + ".old"
+    shutil.rmtree(old_dir, ignore_errors=True)
+    if os.path.exists(segments_dir):
+        os.rename(segments_dir, old_dir)
+    os.rename(tmp_dir, segments_dir)
+    shutil.rmtree(old_dir, ignore_errors=True)
+    return os.path.join(segments_dir, MANIFEST_NAME)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data-dir", default="data")
+    parser.add_argument("--out-dir", help="Onde gravar segments/ (padrão: --data-dir)")
+    parser.add_argument("--model", default="paraphrase-multilingual-MiniLM-L12-v2")
+    parser.add_argument("--backend", choices=EMBEDDING_BACKENDS, default="torch")
+    parser.add_argument("--onnx-dir")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="Processos de encode (0 = no próprio processo)")
+    parser.add_argument("--threads", type=int, help="Threads por processo (padrão: núcleos / workers)")
+    parser.add_argument("--batch-size", type=int, default=256, help="Documentos por tarefa do pool")
+    parser.add_argument("--encode-batch-size", type=int, default=64, help="Lote interno do modelo")
+    args = parser.parse_args()
+
+    documents = open_documents(args.data_dir)
+    if not documents:
+        print(f"Nenhum documento em {args.data_dir}.")
+        return
+    # Uma passada só para os tamanhos; os textos de cada lote são lidos quando ele é enviado
+    lengths = np.fromiter((len(doc["content"]) for doc in documents), dtype=np.int64, count=len(documents))
+    batches = plan_batches(lengths, args.batch_size)
+    threads = args.threads or max(1, (os.cpu_count() or 1) // max(1, args.workers))
+    work_dir = os.path.join(args.data_dir, WORK_DIR)
+    output_path = os.path.join(work_dir, OUTPUT_NAME)
+    meta = {
+        "documents": len(documents),
+        "total_chars": int(lengths.sum()),
+        "model": args.model,
+        "backend": args.backend,
+        "batch_size": args.batch_size,
+    }
+    done = load_progress(work_dir, meta, len(batches))
+    init_args = (args.model, args.backend, args.onnx_dir, threads, output_path)
+
+    if args.workers > 0:
+        executor = ProcessPoolExecutor(args.workers, mp_context=multiprocessing.get_context("spawn"),
+                                       initializer=init_worker, initargs=init_args)
+        dim = executor.submit(model_dimension).result()
+    else:
+        executor = None
+        init_worker(*init_args)
+        dim = model_dimension()
+    if not os.path.exists(output_path):
+        np.lib.format.open_memmap(output_path, mode="w+", dtype=np.float32, shape=(len(documents), dim)).flush()
+
+    pending = [i for i in range(len(batches)) if not done[i]]
+    remaining_docs = sum(len(batches[i]) for i in pending)
+    print(f"{len(documents)} documentos em {len(batches)} lotes ({len(batches) - len(pending)} já concluídos); "
+          f"{max(args.workers, 1)} processo(s) x {threads} thread(s), dimensão {dim}")
+
+    start = last_report = time.perf_counter()
+    encoded = 0
+    try:
+        if executor is None:
+            for batch_id in pending:
+                rows = batches[batch_id]
+                _, count = encode_batch(batch_id, rows, [documents[int(i)]["content"] for i in rows],
+                                        args.encode_batch_size)
+                done[batch_id] = True
+                encoded += count
+                save_progress(work_dir, done)
+                if time.perf_counter() - last_report > 10:
+                    last_report = time.perf_counter()
+                    print(f"  {encoded}/{remaining_docs} documentos, {encoded / (last_report - start):.1f} docs/s")
+        else:
+            # Janela limitada de lotes em voo: os textos não são todos carregados de uma vez
+            queue = iter(pending)
+            in_flight = set()
+            while True:
+                while len(in_flight) < 2 * args.workers:
+                    batch_id = next(queue, None)
+                    if batch_id is None:
+                        break
+                    rows = batches[batch_id]
+                    texts = [documents[int(i)]["content"] for i in rows]
+                    in_flight.add(executor.submit(encode_batch, batch_id, rows, texts, args.encode_batch_size))
+                if not in_flight:
+                    break
+                finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    batch_id, count = future.result()
+                    done[batch_id] = True
+                    encoded += count
+                save_progress(work_dir, done)
+                if time.perf_counter() - last_report > 10:
+                    last_report = time.perf_counter()
+                    print(f"  {encoded}/{remaining_docs} documentos, {encoded / (last_report - start):.1f} docs/s")
+    except KeyboardInterrupt:
+        print(f"\nInterrompido: {int(done.sum())}/{len(batches)} lotes salvos; rode de novo para retomar.")
+        sys.exit(130)
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+
+    elapsed = time.perf_counter() - start
+    manifest_path = install_segments(output_path, args.out_dir or args.data_dir)
+    shutil.rmtree(work_dir, ignore_errors=True)
+    rate = encoded / elapsed if elapsed > 0 else 0.0
+    print(f"{encoded} documentos codificados em {elapsed:.1f}s ({rate:.1f} docs/s); embeddings em {manifest_path}")
+    print("Reconstrua o índice com src/tools/build_faiss_index.py.")
+
+if __name__ == "__main__":
+    main()
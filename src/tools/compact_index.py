@@ -0,0 +1,55 @@
+"""
+Compactação offline: remove de vez as passagens marcadas como tombstone em registry.npz
+(documentos apagados ou substituídos por uma versão nova) e reconstrói o faiss.index.
+
+Os IDs estáveis das passagens vivas são preservados. Por padrão só compacta quando a
+fração de tombstones passa do threshold; --force compacta sempre.
+
+Uso:
+    python src/tools/compact_index.py --data-dir data
+    python src/tools/compact_index.py --data-dir data --threshold 0.1
+    python src/tools/compact_index.py --data-dir data --force
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from database.compaction import compact_data_dir
+from database.content_store import open_documents
+from database.document_registry import COMPACTION_THRESHOLD, load_registry
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data-dir", default="data")
+    parser.add_argument("--threshold", type=float, default=COMPACTION_THRESHOLD)
+    parser.add_argument("--force", action="store_true")
+    args = parser.parse_args()
+
+    documents = open_documents(args.data_dir)
+    if not documents:
+        print(f"Nenhum documento encontrado em {args.data_dir}.")
+        sys.exit(1)
+    registry = load_registry(args.data_dir, documents)
+    report = {
+        "passages": len(registry),
+        "tombstones": registry.deleted_count,
+        "tombstone_ratio": round(registry.tombstone_ratio, 4),
+    }
+    if not registry.deleted_count or (registry.tombstone_ratio < args.threshold and not args.force):
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+        print(f"Abaixo do threshold ({args.threshold:.0%}); nada a compactar.")
+        return
+    start = time.perf_counter()
+    try:
+        report.update(compact_data_dir(args.data_dir, registry.live_rows(), documents))
+    except ValueError as e:
+        print(f"⚠️ {e}")
+        sys.exit(1)
+    report["seconds"] = round(time.perf_counter() - start, 3)
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Compacta um diretório de dados já indexado removendo documentos duplicados.
+
+Reagrupa as passagens por documento de origem e passa cada documento pelo DedupIndex
+(URL canônica, hash do conteúdo e SimHash). URLs limpas são registradas antes das
+variantes (#fragmento, @@view), então a versão sem fragmento é a canônica. As passagens
+das duplicatas saem de content/, segments/, bm25.npz, attributes.npz e registry.npz; o faiss.index é
+reconstruído com os parâmetros do faiss_manifest.json. Os aliases ficam em data_dir/dedup.json.
+
+Uso:
+    python src/tools/dedup_index.py --data-dir data --dry-run
+    python src/tools/dedup_index.py --data-dir data
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from database.compaction import compact_data_dir
+from database.content_store import open_documents
+from ingestion.dedup import DedupIndex, canonical_url, dedup_path, document_text, group_by_parent, simhash
+
+def find_duplicates(documents):
+    """(linhas mantidas, índice de dedup, contagem de duplicatas por motivo)."""
+    groups = list(group_by_parent(documents).values())
+    urls = [documents[rows[0]].get("url", "") for rows in groups]
+    # URLs já canônicas primeiro; entre elas, a ordem original
+    order = sorted(range(len(groups)), key=lambda g: (canonical_url(urls[g]) != urls[g], g))
+    index = DedupIndex()
+    kept_groups = []
+    reasons = {"url": 0, "exact": 0, "near": 0}
+    for g in order:
+        text = document_text([documents[i] for i in groups[g]])
+        fingerprint = simhash(text)
+        canonical, reason = index.match(urls[g], text, fingerprint)
+        if canonical:
+            index.add_alias(urls[g], canonical)
+            reasons[reason] += 1
+        else:
+            index.add(urls[g], text, fingerprint)
+            kept_groups.append(g)
+    kept = np.sort(np.concatenate([np.asarray(groups[g], dtype=np.int64) for g in kept_groups])) \
+        if kept_groups else np.empty(0, dtype=np.int64)
+    return kept, index, reasons, len(groups)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data-dir", default="data")
+    parser.add_argument("--dry-run", action="store_true", help="Só reporta as duplicatas, sem regravar nada")
+    args = parser.parse_args()
+
+    documents = open_documents(args.data_dir)
+    if not documents:
+        print(f"Nenhum documento encontrado em {args.data_dir}.")
+        sys.exit(1)
+    start = time.perf_counter()
+    kept, index, reasons, n_groups = find_duplicates(documents)
+    report = {
+        "documents_before": n_groups,
+        "documents_after": len(index),
+        "duplicates": reasons,
+        "passages_before": len(documents),
+        "passages_after": int(len(kept)),
+        "scan_seconds": round(time.perf_counter() - start, 3),
+    }
+    if args.dry_run or len(kept) == len(documents):
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+        print("Nada regravado." if args.dry_run else "Nenhuma duplicata encontrada.")
+        return
+
+    try:
+        report.update(compact_data_dir(args.data_dir, kept, documents))
+    except ValueError as e:
+        print(f"⚠️ {e}")
+        sys.exit(1)
+    index.save(dedup_path(args.data_dir))
+    before, after = report["size_before_mb"], report["size_after_mb"]
+    report["reduction"] = f"{(1 - after / before) * 100:.1f}%" if before else "0%"
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    print(f"Aliases gravados em {dedup_path(args.data_dir)}")
+
+if __name__ == "__main__":
+    main()
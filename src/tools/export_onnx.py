@@ -0,0 +1,99 @@
+"""
+Exporta o modelo de embeddings (SentenceTransformer) para ONNX e gera a versão int8.
+
+Grava em --out-dir (padrão: models/<modelo>-onnx/):
+    model.onnx          transformer em float32 (eixos dinâmicos de lote e sequência)
+    model_int8.onnx     pesos int8 por quantização dinâmica (onnxruntime.quantization)
+    tokenizer.json      tokenizador rápido, lido pelo pacote tokenizers
+    onnx_manifest.json  modelo, dimensão, pooling, normalização e tamanho máximo da sequência
+
+Precisa de sentence-transformers (com torch), onnx e onnxruntime só aqui; a API servindo
+com LUMIA_EMBEDDING_BACKEND=onnx precisa apenas de onnxruntime e tokenizers.
+Depois de exportar, confira a paridade com benchmarks/bench_embedding_backends.py.
+
+Uso:
+    python src/tools/export_onnx.py
+    python src/tools/export_onnx.py --model paraphrase-multilingual-MiniLM-L12-v2 --out-dir models/minilm-onnx
+"""
+import argparse
+import json
+import os
+import sys
+from datetime import datetime
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from agents.embedding_backends import (
+    ONNX_INT8_MODEL_NAME, ONNX_MANIFEST_NAME, ONNX_MODEL_NAME, TOKENIZER_NAME, default_onnx_dir
+)
+
+def pooling_config(model) -> dict:
+    """Pooling e normalização lidos dos módulos do SentenceTransformer (Transformer, Pooling, Normalize)."""
+    pooling, normalize = "mean", False
+    for module in model:
+        name = type(module).__name__
+        if name == "Pooling":
+            config = module.get_config_dict()
+            if config.get("pooling_mode_cls_token"):
+                pooling = "cls"
+            elif not config.get("pooling_mode_mean_tokens", True):
+                raise ValueError(f"Unsupported pooling configuration: {config}")
+        elif name == "Normalize":
+            normalize = True
+        elif name not in ("Transformer",):
+            raise ValueError(f"Unsupported SentenceTransformer module: {name}")
+    return {"pooling": pooling, "normalize": normalize}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default="paraphrase-multilingual-MiniLM-L12-v2")
+    parser.add_argument("--out-dir")
+    parser.add_argument("--opset", type=int, default=14)
+    args = parser.parse_args()
+
+    import torch
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    from sentence_transformers import SentenceTransformer
+
+    out_dir = args.out_dir or default_onnx_dir(args.model)
+    os.makedirs(out_dir, exist_ok=True)
+    model = SentenceTransformer(args.model, device="cpu")
+    config = pooling_config(model)
+    transformer = model[0].auto_model.eval()
+    tokenizer = model.tokenizer
+
+    sample = tokenizer(["Qual o horário do RU?"], return_tensors="pt")
+    input_names = ["input_ids", "attention_mask"] + (["token_type_ids"] if "token_type_ids" in sample else [])
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["token_embeddings"] = {0: "batch", 1: "sequence"}
+    fp32_path = os.path.join(out_dir, ONNX_MODEL_NAME)
+    with torch.no_grad():
+        torch.onnx.export(
+            transformer, tuple(sample[name] for name in input_names), fp32_path,
+            input_names=input_names, output_names=["token_embeddings"], dynamic_axes=dynamic_axes,
+            opset_version=args.opset, do_constant_folding=True,
+        )
+    int8_path = os.path.join(out_dir, ONNX_INT8_MODEL_NAME)
+    # Pesos das camadas lineares em int8; ativações quantizadas em tempo de execução
+    quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+
+    tokenizer.backend_tokenizer.save(os.path.join(out_dir, TOKENIZER_NAME))
+    manifest = {
+        "model": args.model,
+        "dim": model.get_sentence_embedding_dimension(),
+        "max_seq_length": model.max_seq_length,
+        "pad_token": tokenizer.pad_token,
+        "pad_token_id": tokenizer.pad_token_id,
+        "inputs": input_names,
+        **config,
+        "opset": args.opset,
+        "exported_at": datetime.now().isoformat(),
+        "fp32_mb": round(os.path.getsize(fp32_path) / (1024 * 1024), 1),
+        "int8_mb": round(os.path.getsize(int8_path) / (1024 * 1024), 1),
+    }
+    with open(os.path.join(out_dir, ONNX_MANIFEST_NAME), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    print(f"Modelo exportado em {out_dir}")
+    print(json.dumps(manifest, ensure_ascii=False, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Migra data_dir/documents.json para o store de conteúdo binário (data_dir/content).
+
+O store tem um arquivo de dados append-only (content.bin) e um índice de offsets de
+largura fixa (offsets.bin). O documents.json original é mantido como backup; enquanto
+ele não for mais novo que o store, os loaders usam o store.
+
+Em seguida grava bm25.npz, attributes.npz e registry.npz (os que faltarem) a partir
+do store, para que o FaissIndexAgent abra sem decodificar todos os registros.
+
+Reporta tamanhos, tempo de migração e a comparação de abertura e leitura de top-k:
+json.load completo vs ContentStore sob demanda.
+
+Uso:
+    python src/tools/migrate_documents.py --data-dir data
+    python src/tools/migrate_documents.py --data-dir data --remove-json
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from database.content_store import (
+    DATA_NAME, DOCUMENTS_JSON, OFFSETS_NAME, ContentStore, content_dir, migrate_documents_json
+)
+from database.vector_store import load_sidecars
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data-dir", default="data")
+    parser.add_argument("--k", type=int, default=8, help="Documentos lidos por consulta simulada")
+    parser.add_argument("--remove-json", action="store_true", help="Apaga documents.json após verificar o store")
+    args = parser.parse_args()
+
+    json_path = os.path.join(args.data_dir, DOCUMENTS_JSON)
+    if not os.path.exists(json_path):
+        print(f"{json_path} não encontrado.")
+        sys.exit(1)
+
+    start = time.perf_counter()
+    with open(json_path, "r", encoding="utf-8") as f:
+        documents = json.load(f)
+    json_load_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    migrate_documents_json(args.data_dir)
+    migrate_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    store = ContentStore.open(content_dir(args.data_dir))
+    open_ms = (time.perf_counter() - start) * 1000
+
+    # Verificação: mesma contagem e registros idênticos numa amostra
+    if len(store) != len(documents):
+        print(f"⚠️ {len(documents)} documentos no JSON, {len(store)} no store.")
+        sys.exit(1)
+    rng = np.random.default_rng(0)
+    sample = rng.choice(len(store), size=min(1000, len(store)), replace=False) if len(store) else []
+    if any(store[i] != documents[i] for i in sample):
+        print("⚠️ Registros divergentes entre JSON e store.")
+        sys.exit(1)
+
+    start = time.perf_counter()
+    load_sidecars(args.data_dir, store)
+    sidecars_seconds = time.perf_counter() - start
+
+    latencies = []
+    for _ in range(200 if len(store) else 0):
+        ids = rng.choice(len(store), size=min(args.k, len(store)), replace=False)
+        begin = time.perf_counter()
+        store.take(ids)
+        latencies.append((time.perf_counter() - begin) * 1000)
+
+    directory = content_dir(args.data_dir)
+    report = {
+        "documents": len(store),
+        "json_mb": round(os.path.getsize(json_path) / (1024 * 1024), 2),
+        "store_mb": round((os.path.getsize(os.path.join(directory, DATA_NAME))
+                           + os.path.getsize(os.path.join(directory, OFFSETS_NAME))) / (1024 * 1024), 2),
+        "migrate_seconds": round(migrate_seconds, 3),
+        "sidecars_seconds": round(sidecars_seconds, 3),
+        "json_load_ms": round(json_load_seconds * 1000, 2),
+        "store_open_ms": round(open_ms, 3),
+    }
+    if latencies:
+        report[f"top{args.k}_fetch_p50_ms"] = round(float(np.percentile(latencies, 50)), 4)
+    print(f"Store gravado em {directory}")
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+    if args.remove_json:
+        os.remove(json_path)
+        print(f"{json_path} removido.")
+
+if __name__ == "__main__":
+    main()
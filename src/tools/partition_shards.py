@@ -0,0 +1,82 @@
+"""
+Particiona um diretório de dados em shards independentes para o ShardedVectorStore.
+
+Cada shard é um diretório de dados completo (data_dir/shards/<nome>/) com seu próprio
+faiss.index, BM25, atributos e registro (IDs estáveis preservados). O data_dir/shards.json
+lista os shards; com ele presente, o Agent passa a buscar em todos em paralelo.
+
+--by host: um shard por host (consultas filtradas por host só tocam os shards do host).
+--by hash: --shards partes de tamanho parecido pelo parent_id (passagens de um documento juntas).
+
+Uso:
+    python src/tools/partition_shards.py --data-dir data --by hash --shards 4 --metric ip
+    python src/tools/partition_shards.py --data-dir data --by host --index-type hnsw --metric ip
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import time
+from collections import defaultdict
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from database.content_store import open_documents
+from database.document_registry import load_registry
+from database.faiss_index import INDEX_TYPES, METRICS, read_manifest
+from database.segment_store import load_embeddings
+from database.sharded_store import PARTITIONS, SHARDS_DIR, build_shard, shard_key, write_shards
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data-dir", default="data")
+    parser.add_argument("--by", choices=PARTITIONS, default="hash")
+    parser.add_argument("--shards", type=int, default=4, help="Número de shards (só --by hash)")
+    parser.add_argument("--index-type", choices=INDEX_TYPES, default="flat")
+    parser.add_argument("--metric", choices=METRICS, default="ip")
+    parser.add_argument("--min-docs", type=int, default=1,
+                        help="Com --by host, hosts com menos passagens vão para o shard 'outros'")
+    args = parser.parse_args()
+
+    documents = open_documents(args.data_dir)
+    embeddings = load_embeddings(args.data_dir, mmap=True)
+    if not documents or embeddings is None:
+        print(f"Documentos ou embeddings não encontrados em {args.data_dir}.")
+        sys.exit(1)
+    if len(embeddings) != len(documents):
+        print(f"⚠️ {len(embeddings)} embeddings para {len(documents)} documentos; rode a ingestão novamente.")
+        sys.exit(1)
+    registry = load_registry(args.data_dir, documents)
+    model = read_manifest(args.data_dir).get("model")
+
+    # Só as linhas vivas: os tombstones não são copiados para os shards
+    groups = defaultdict(list)
+    for row in registry.live_rows():
+        groups[shard_key(documents[int(row)], args.by, args.shards)].append(int(row))
+    if args.by == "host" and args.min_docs > 1:
+        for host in [host for host, rows in groups.items() if len(rows) < args.min_docs]:
+            groups["outros"].extend(groups.pop(host))
+
+    shards_root = os.path.join(args.data_dir, SHARDS_DIR)
+    shutil.rmtree(shards_root, ignore_errors=True)
+    entries = []
+    start = time.perf_counter()
+    for name, rows in sorted(groups.items()):
+        rows.sort()
+        shard_dir = os.path.join(shards_root, name)
+        shard_docs = [documents[i] for i in rows]
+        build_shard(shard_dir, shard_docs, embeddings[rows], args.index_type, args.metric, model=model,
+                    registry=registry.subset(rows))
+        hosts = sorted({shard_key(doc, "host", 0) for doc in shard_docs}) if args.by == "host" else []
+        entries.append({"name": name, "dir": os.path.relpath(shard_dir, args.data_dir), "hosts": hosts})
+        print(f"  {name}: {len(rows)} passagens")
+    write_shards(args.data_dir, {"partition": args.by, "shards": entries})
+    print(json.dumps({
+        "partition": args.by,
+        "shards": len(entries),
+        "passages": sum(len(rows) for rows in groups.values()),
+        "seconds": round(time.perf_counter() - start, 2),
+    }, ensure_ascii=False, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Publica um diretório de dados pronto (crawl + índices) como um snapshot versionado.
+
+Copia o diretório para data_dir/snapshots/<versão>/, troca data_dir/CURRENT atomicamente e
+apaga as versões antigas além de --keep. A API carrega a versão nova sem reiniciar: pelo
+watcher (LUMIA_RELOAD_INTERVAL) ou por POST /qb/admin/reload (--reload-url).
+
+Uso:
+    python src/tools/publish_snapshot.py --data-dir data --source data_novo
+    python src/tools/publish_snapshot.py --data-dir data --source data_novo --move --keep 3 \\
+        --reload-url http://localhost:8000/qb/admin/reload
+    python src/tools/publish_snapshot.py --data-dir data --rollback 20250601-120000
+"""
+import argparse
+import json
+import os
+import sys
+import urllib.request
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from database.content_store import has_documents
+from database.snapshots import current_version, list_snapshots, prune_snapshots, publish_snapshot, set_current
+
+def request_reload(url: str, version: str):
+    request = urllib.request.Request(
+        url, data=json.dumps({"version": version}).encode("utf-8"), method="POST",
+        headers={"Content-Type": "application/json", "X-Admin-Token": os.getenv("LUMIA_ADMIN_TOKEN", "")},
+    )
+    with urllib.request.urlopen(request, timeout=300) as response:
+        print(f"API recarregada: {response.read().decode('utf-8')}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data-dir", default="data")
+    parser.add_argument("--source", help="Diretório de dados a publicar")
+    parser.add_argument("--version", help="Nome da versão (padrão: timestamp)")
+    parser.add_argument("--move", action="store_true", help="Move em vez de copiar (mesmo sistema de arquivos)")
+    parser.add_argument("--keep", type=int, default=2, help="Versões mantidas em disco")
+    parser.add_argument("--rollback", metavar="VERSION", help="Só aponta CURRENT para uma versão já publicada")
+    parser.add_argument("--reload-url", help="POST /qb/admin/reload da API após publicar")
+    args = parser.parse_args()
+
+    previous = current_version(args.data_dir)
+    try:
+        if args.rollback:
+            set_current(args.data_dir, args.rollback)
+            version = args.rollback
+        else:
+            if not args.source or not has_documents(args.source):
+                print(f"Nenhum documento encontrado em {args.source}.")
+                sys.exit(1)
+            version = publish_snapshot(args.data_dir, args.source, args.version, move=args.move)
+    except ValueError as e:
+        print(f"⚠️ {e}")
+        sys.exit(1)
+    removed = prune_snapshots(args.data_dir, keep=args.keep) if not args.rollback else []
+    print(json.dumps({
+        "previous_version": previous,
+        "index_version": version,
+        "snapshots": list_snapshots(args.data_dir),
+        "removed": removed,
+    }, ensure_ascii=False, indent=2))
+    if args.reload_url:
+        request_reload(args.reload_url, version)
+
+if __name__ == "__main__":
+    main()
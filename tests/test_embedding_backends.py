@@ -0,0 +1,47 @@
+"""
+Paridade do backend ONNX com o SentenceTransformer (PyTorch): os embeddings das perguntas
+rotuladas do roteador de intenção devem ter cosseno >= 0.98 com os do modelo original.
+
+Pulado quando torch, sentence-transformers, onnxruntime ou tokenizers não estão instalados,
+ou quando o export (src/tools/export_onnx.py) não existe. LUMIA_ONNX_DIR aponta para outro export.
+
+Uso:
+    python -m pytest -q tests/test_embedding_backends.py
+"""
+import os
+import sys
+import numpy as np
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+from agents.embedding_backends import ONNX_MANIFEST_NAME, default_onnx_dir, load_embedding_backend
+from agents.intent_router import load_examples
+from database.segment_store import normalize_rows
+
+MODEL_NAME = "paraphrase-multilingual-MiniLM-L12-v2"
+MIN_COSINE = 0.98
+
+@pytest.fixture(scope="module")
+def onnx_dir():
+    for module in ("torch", "sentence_transformers", "onnxruntime", "tokenizers"):
+        pytest.importorskip(module)
+    directory = os.getenv("LUMIA_ONNX_DIR") or default_onnx_dir(MODEL_NAME)
+    if not os.path.exists(os.path.join(directory, ONNX_MANIFEST_NAME)):
+        pytest.skip(f"Sem export ONNX em {directory} (rode src/tools/export_onnx.py)")
+    return directory
+
+@pytest.fixture(scope="module")
+def texts():
+    return [text for text, _ in load_examples()]
+
+@pytest.fixture(scope="module")
+def reference(onnx_dir, texts):
+    return load_embedding_backend(MODEL_NAME, "torch").encode(texts, convert_to_numpy=True)
+
+@pytest.mark.parametrize("backend", ["onnx", "onnx-fp32"])
+def test_onnx_matches_torch(backend, onnx_dir, texts, reference):
+    embeddings = load_embedding_backend(MODEL_NAME, backend, onnx_dir=onnx_dir).encode(texts, convert_to_numpy=True)
+    assert embeddings.shape == reference.shape
+    cosines = np.sum(normalize_rows(reference) * normalize_rows(embeddings), axis=1)
+    worst = int(np.argmin(cosines))
+    assert cosines[worst] >= MIN_COSINE, f"{backend}: cosseno {cosines[worst]:.4f} em {texts[worst]!r}"
@@ -1,12 +1,17 @@
 import streamlit as st
 import requests
+import json
 import time
 import uuid # Usar UUID para IDs mais robustos
 
 # --- Configuration --- A API URL é configurada aqui
 # Aponta para o serviço backend local
 API_URL = "http://localhost:8000/ask"
+# Mesma rota em server-sent events: fontes primeiro, depois a resposta trecho a trecho
+STREAM_URL = "http://localhost:8000/ask/stream"
 PAGE_TITLE = "LumIA Chat UFPB"
+# Selo das respostas servidas pelo cache semântico da API (campo "cached")
+CACHED_BADGE = "⚡ Resposta do cache"
 # LOGO_PLACEHOLDER = "🎓 LumIA" # Removido
 
 # --- Initialization ---
@@ -37,8 +42,60 @@ def get_api_response(chat_id: str, user_prompt: str):
     st.session_state.prompt_to_process = {"chat_id": chat_id, "prompt": user_prompt, "loading_id": loading_id}
     st.rerun()
 
-def process_api_call():
-    "Processa a chamada à API que foi agendada no rerun anterior."
+def iter_sse(response):
+    "Eventos (nome, dados) de uma resposta text/event-stream, conforme chegam."
+    event, data = "message", []
+    for line in response.iter_lines(decode_unicode=True):
+        if not line:
+            if data:
+                yield event, json.loads("\n".join(data))
+            event, data = "message", []
+        elif line.startswith("event:"):
+            event = line[len("event:"):].strip()
+        elif line.startswith("data:"):
+            data.append(line[len("data:"):].strip())
+
+def format_answer(answer: str, sources: list) -> str:
+    if not sources:
+        return answer
+    return answer + "\n\n**Fontes:**\n" + "\n".join(f"- {source}" for source in sources)
+
+def stream_api_response(user_prompt: str, placeholder) -> dict:
+    "Lê a resposta do /ask/stream desenhando cada trecho no placeholder; retorna a mensagem final."
+    start = time.perf_counter()
+    answer, sources, first_token, cached = "", [], None, False
+    with requests.post(STREAM_URL, json={"text": user_prompt}, stream=True, timeout=60) as response:
+        response.raise_for_status()
+        for event, data in iter_sse(response):
+            if event == "sources":
+                sources = data.get("sources", [])
+                cached = data.get("cached", False)
+                placeholder.markdown(format_answer("...", sources))
+            elif event == "token":
+                if first_token is None:
+                    first_token = time.perf_counter() - start
+                answer += data.get("text", "")
+                placeholder.markdown(format_answer(answer + "▌", sources))
+            elif event == "done":
+                answer = data.get("answer", answer)
+            elif event == "error":
+                raise requests.exceptions.RequestException(data.get("detail", "falha no streaming"))
+    answer = answer or "Desculpe, não recebi uma resposta válida."
+    message = {"role": "assistant", "content": format_answer(answer, sources), "message_id": generate_message_id("assistant")}
+    captions = [CACHED_BADGE] if cached else []
+    if first_token is not None:
+        # Tempo até o primeiro trecho visto pelo usuário (inclui rede e roteamento)
+        captions.append(f"Primeiro trecho em {first_token:.2f}s · resposta completa em {time.perf_counter() - start:.2f}s")
+    if captions:
+        message["caption"] = " · ".join(captions)
+    return message
+
+def process_api_call(placeholder=None):
+    """
+    Processa a chamada à API que foi agendada no rerun anterior. Com um placeholder (st.empty()
+    no lugar do "..."), a resposta é transmitida e desenhada conforme chega; sem ele, espera a
+    resposta completa do /ask.
+    """
     if "prompt_to_process" in st.session_state and st.session_state.prompt_to_process:
         call_data = st.session_state.prompt_to_process
         chat_id = call_data["chat_id"]
@@ -49,11 +106,16 @@ def process_api_call():
         st.session_state.prompt_to_process = None
 
         try:
-            response = requests.post(API_URL, json={"text": user_prompt}, timeout=60) # Timeout maior
-            response.raise_for_status()
-            data = response.json()
-            answer = data.get("answer", "Desculpe, não recebi uma resposta válida.")
-            final_message = {"role": "assistant", "content": answer, "message_id": generate_message_id("assistant")}
+            if placeholder is not None:
+                final_message = stream_api_response(user_prompt, placeholder)
+            else:
+                response = requests.post(API_URL, json={"text": user_prompt}, timeout=60) # Timeout maior
+                response.raise_for_status()
+                data = response.json()
+                answer = data.get("answer", "Desculpe, não recebi uma resposta válida.")
+                final_message = {"role": "assistant", "content": answer, "message_id": generate_message_id("assistant")}
+                if data.get("cached"):
+                    final_message["caption"] = CACHED_BADGE
 
         except requests.exceptions.Timeout:
              error_message = "Erro: Tempo limite excedido ao conectar com a LumIA."
@@ -78,7 +140,10 @@ def process_api_call():
         st.rerun()
 
 # --- Process API Call if scheduled ---
-process_api_call()
+# Com o chat da pergunta aberto, a resposta é transmitida no lugar do "..." (ver Main Chat Area)
+pending_call = st.session_state.get("prompt_to_process")
+if pending_call and pending_call["chat_id"] != st.session_state.active_chat_id:
+    process_api_call()
 
 # --- UI Rendering ---
 st.set_page_config(page_title=PAGE_TITLE, layout="wide")
@@ -144,7 +209,12 @@ else:
             # Garante que role seja 'user' ou 'assistant' para st.chat_message
             display_role = "user" if role == "user" else "assistant"
             with st.chat_message(display_role):
+                pending_call = st.session_state.get("prompt_to_process")
+                if pending_call and message.get("message_id") == pending_call["loading_id"]:
+                    process_api_call(st.empty())
                 st.markdown(message["content"])
+                if message.get("caption"):
+                    st.caption(message["caption"])
 
         # Chat input - Usar key única para cada chat garante que o estado do input resete ao mudar de chat
         prompt_key = f"input_{active_chat_id}"